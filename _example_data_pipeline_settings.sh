@@ -19,4 +19,5 @@ export COLIBRE_DATA_PIPLINE__COMPARISON_ALL_LABELS="" # "This Simulation;Other S
 export COLIBRE_DATA_PIPLINE__COMPARISON_CACHED_ENRICHMENT_DATA_DIRECTORY="" # "/folder/path/to/other/graphs;/folder/path/to/earlier/graphs"
 
 export COLIBRE_DATA_PIPLINE__MAP_COLOURMAP=""
+export COLIBRE_DATA_PIPLINE__MAP_PYRAMID_SIZE="" # "65536" - also render the surface density map as a Deep Zoom pyramid with this many pixels across
 export COLIBRE_DATA_PIPLINE__RHO_T_COLOURMAP="#125A56;#FD9A44;#A01813"
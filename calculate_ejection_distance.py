@@ -1,14 +1,11 @@
-raise DeprecationWarning("This dosen't work and is not up-to-date!")
-
 AUTHOR = "Christopher Rowe"
-VERSION = "1.1.0"
-DATE = "24/04/2023"
+VERSION = "1.3.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Finds the distance at present day between the ejected gas particles and their last host haloes."
 
 import h5py
 import numpy as np
 import os
-import pickle
 from QuasarCode import source_file_relitive_add_to_path
 #from QuasarCode.IO.Text.console import print_info, Console.print_verbose_info, print_warning, print_debug
 from QuasarCode import Console
@@ -19,7 +16,9 @@ from unyt import unyt_array
 import velociraptor as vr
 
 source_file_relitive_add_to_path(__file__)
-from save_swift_snap_field import save_particle_fields, get_cgs_conversions, PartType, SIGNED_FLOAT_64
+from contra.io import save_particle_fields, get_cgs_conversions, PartType
+from contra.io.save_swift_snap_field import SIGNED_FLOAT_64
+from contra.calculations import halo_centres_by_particle, wrap_displacements, displacement_magnitudes
 
 Mpc_cgs = 3.0857E24#1E6 * 3.0857E16 * 100
 
@@ -47,55 +46,31 @@ def __main(data: str, present_day_snap_number: str, cat_directory: str, cat_file
     halo_ids = catalogue.ids.id
     potential_centres = unyt_array(np.stack((catalogue.positions.xcminpot.to("Mpc").v, catalogue.positions.ycminpot.to("Mpc").v, catalogue.positions.zcminpot.to("Mpc").v), axis = -1), "Mpc")
 
-    unique_halo_ids = np.unique(traced_halo_ids[traced_halo_ids != -1])
-
     Console.print_verbose_info("Calculating particle displacement from last halo.")
-    #halo_position_deltas = unyt_array(np.full(gas_coords.shape, 0), "Mpc")
-    halo_centre_by_particle = unyt_array(np.full(gas_coords.shape, 0), "Mpc")
-    output_ids = [unique_halo_ids[unique_halo_ids >= value][0] for value in np.percentile(unique_halo_ids, [5, 10, 15, 20, 25, 30, 35, 40, 45, 50, 55, 60, 65, 70, 75, 80, 85, 90, 95])]
-    n_unique_halos = len(unique_halo_ids)
-    for i, halo_id in enumerate(unique_halo_ids):
-        try:
-            if halo_id in output_ids:
-                Console.print_verbose_info(f"Doing halo {i + 1} out of {n_unique_halos}")
-        except Exception as e:
-            Console.print_debug(i, halo_id)
-            Console.print_debug(output_ids)
-            raise e
-        #snap_filter = traced_halo_ids == halo_id
-        #halo_position_deltas[snap_filter, :] = gas_coords[snap_filter, :] - potential_centres[halo_ids == halo_id][0]
-        halo_centre_by_particle[traced_halo_ids == halo_id, :] = potential_centres[halo_ids == halo_id][0]
-    halo_position_deltas = gas_coords - halo_centre_by_particle
+    tracked_filter = traced_halo_ids.value != -1
+    halo_centre_by_particle, matched_filter = halo_centres_by_particle(traced_halo_ids.value, halo_ids.value, potential_centres.value)
+    if (tracked_filter & ~matched_filter).sum() > 0:
+        Console.print_warning(f"{(tracked_filter & ~matched_filter).sum()} particles have a traced halo ID not present in the catalogue. These will be treated as untracked.")
+    halo_position_deltas = gas_coords.to("Mpc").value
+    halo_position_deltas -= halo_centre_by_particle
+    del halo_centre_by_particle
 
     # Wrap the coordinates in each dimension
     Console.print_verbose_info("Box wrapping vectors.")
-    halo_ejection_vectors = halo_position_deltas.copy()
-    box_size = unyt_array(snap_data.metadata.header["BoxSize"], "Mpc")
-    half_box_size = box_size / 2
-
-    #Console.print_debug(np.abs(halo_ejection_vectors[:, :]) > np.tile(half_box_size, (halo_ejection_vectors.shape[0], 1)))
-
-    halo_ejection_vectors = np.where(np.abs(halo_ejection_vectors[:, :]) > np.tile(half_box_size, (halo_ejection_vectors.shape[0], 1)),
-                                     halo_ejection_vectors[:, :] - ((halo_ejection_vectors[:, :] / np.abs(halo_ejection_vectors[:, :])) * np.tile(box_size, (halo_ejection_vectors.shape[0], 1))),
-                                     halo_ejection_vectors)
+    halo_ejection_vectors = wrap_displacements(halo_position_deltas.copy(), snap_data.metadata.boxsize.to("Mpc").value)
     
     # Calculate radii
     Console.print_verbose_info("Calculating radii.")
-    halo_position_radii = np.sqrt((halo_ejection_vectors**2).sum(axis = 1))
-    halo_position_radii[traced_halo_ids == -1] = -1
-        
-
+    halo_position_radii = displacement_magnitudes(halo_ejection_vectors)
+    halo_position_radii[~matched_filter] = -1
 
-    # Write data to temp files and append to the modified snapshot
+    halo_position_deltas = unyt_array(halo_position_deltas, "Mpc")
+    halo_ejection_vectors = unyt_array(halo_ejection_vectors, "Mpc")
+    halo_position_radii = unyt_array(halo_position_radii, "Mpc")
+        
 
-    Console.print_verbose_info("Saving data to serialised file.")
 
-    with open("gas_particle_ejection_tracking__present_day_ejection_displacement.pickle", "wb") as file:
-        pickle.dump(halo_position_deltas[:, :], file)
-    with open("gas_particle_ejection_tracking__present_day_ejection_vector.pickle", "wb") as file:
-        pickle.dump(halo_ejection_vectors[:, :], file)
-    with open("gas_particle_ejection_tracking__present_day_ejection_distance.pickle", "wb") as file:
-        pickle.dump(halo_position_radii[:], file)
+    # Append to the modified snapshot
 
     Console.print_verbose_info("Appending to modified snapshot file.")
 
@@ -134,7 +109,7 @@ if __name__ == "__main__":
                            VERSION,
                            DATE,
                            DESCRIPTION,
-                           ["numpy", "os", "pickle", "QuasarCode", "save_swift_snap_field (local file)", "swiftsimio", "unyt"],
+                           ["contra", "numpy", "os", "QuasarCode", "swiftsimio", "unyt", "velociraptor"],
                            ["/storage/simulations/COLIBRE_ZOOMS/COLIBRE/five_spheres_20211006/volume04/l0/snapshots/snapshot_0007.hdf5"],
                            args_info,
                            kwargs_info)
@@ -1,2 +1,4 @@
 from .match_particles import reorder_data
-from ._reverse_search import reverse_search
\ No newline at end of file
+from ._reverse_search import reverse_search
+from .halo_spatial_index import HaloSpatialIndex
+from .sph_projection import SPHProjection
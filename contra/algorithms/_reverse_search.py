@@ -5,6 +5,7 @@ from QuasarCode import Console
 
 from ..io.swift_parttype_enum import PartType
 from ..io.velociraptor_multi_load import Multifile_VR_Catalogue
+from ..io.halo_tracking_results import NO_HALO_SNAPSHOT_NUMBER
 from .match_particles import reorder_data
 from ..tools import Stopwatch
 from ..calculations.simple_fields import get_redshift
@@ -123,6 +124,8 @@ def reverse_search(snapshot__present_day: sw.SWIFTDataset, snap_numbers, catalog
 
         if allow_printing: Console.print_info("Completed snapshot {} with {} / {} {} particles identified leaving {} unacounted for\n".format(snap_numbers[i], (~ids_to_check_filter).sum(), n_particles_at_present_day, particle_type, ids_to_check_filter.sum()))
 
-    final_halo_snap_numbers = np.array([snap_numbers[i] if i != -1 else "-999" for i in final_halo_snap_number_index], dtype = str)
+    # Index -1 (no halo found) selects the trailing missing value
+    snap_number_lookup = np.array([int(snap_number) for snap_number in snap_numbers] + [NO_HALO_SNAPSHOT_NUMBER], dtype = np.int16)
+    final_halo_snap_numbers = snap_number_lookup[final_halo_snap_number_index]
 
     return final_halo_snap_number_index, final_halo_snap_numbers, final_halo_ids, final_halo_masses
\ No newline at end of file
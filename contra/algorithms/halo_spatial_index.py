@@ -0,0 +1,202 @@
+"""
+File: halo_spatial_index.py
+
+Author: Christopher Rowe
+Vesion: 1.0.1
+Date:   19/10/2026
+
+Periodic KD-tree index over halo centres for batched proximity queries.
+
+Public API:
+
+    class HaloSpatialIndex
+    HaloSpatialIndex.from_catalogue(Multifile_VR_Catalogue, float|numpy.ndarray|unyt.unyt_array)
+    HaloSpatialIndex.load(str)
+
+Dependancies:
+
+    h5py
+    numpy
+    os
+    scipy
+    typing
+    unyt
+"""
+
+import h5py
+import numpy as np
+import os
+from scipy.spatial import cKDTree
+from typing import Union, Tuple
+from unyt import unyt_array
+
+from ..io.velociraptor_multi_load import Multifile_VR_Catalogue
+from ..calculations.periodic_geometry import periodic_displacements, displacement_magnitudes, wrap_positions
+
+# Number of query positions processed at once
+DEFAULT_QUERY_BLOCK_SIZE = 2**22
+
+class HaloSpatialIndex(object):
+    """
+    Periodic spatial index over the centres of a set of haloes.
+
+    All positions and radii are plain arrays in the unit the index was built with (Mpc by default).
+    Query results are catalogue rows, with -1 indicating no match.
+    """
+
+    HALO_IDS = "HaloIDs"
+    CENTRES = "Centres"
+    R_200 = "R200"
+
+    def __init__(self, halo_ids: np.ndarray, centres: np.ndarray, r_200: np.ndarray, box_size: Union[float, np.ndarray], unit: str = "Mpc"):
+        if centres.shape[0] != halo_ids.shape[0] or r_200.shape[0] != halo_ids.shape[0]:
+            raise ValueError("Halo IDs, centres and radii must have the same length.")
+
+        self.__box_size = np.asarray(box_size, dtype = np.float64)
+        if self.__box_size.ndim == 0:
+            self.__box_size = np.full(3, float(self.__box_size))
+
+        self.__halo_ids = np.asarray(halo_ids)
+        self.__centres = wrap_positions(np.asarray(centres, dtype = np.float64), self.__box_size)
+        self.__r_200 = np.asarray(r_200, dtype = np.float64)
+        self.__unit = unit
+
+        self.__tree = cKDTree(self.__centres, boxsize = self.__box_size)
+
+    def __len__(self):
+        return self.__halo_ids.shape[0]
+
+    @property
+    def halo_ids(self) -> np.ndarray:
+        return self.__halo_ids
+
+    @property
+    def centres(self) -> np.ndarray:
+        return self.__centres
+
+    @property
+    def r_200(self) -> np.ndarray:
+        return self.__r_200
+
+    @property
+    def box_size(self) -> np.ndarray:
+        return self.__box_size
+
+    @property
+    def unit(self) -> str:
+        return self.__unit
+
+    def nearest(self, positions: np.ndarray, block_size: int = DEFAULT_QUERY_BLOCK_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the nearest halo centre to each position.
+
+        Returns (distances, halo_rows).
+        """
+        n_positions = positions.shape[0]
+        distances = np.empty(n_positions, dtype = np.float64)
+        halo_rows = np.full(n_positions, -1, dtype = np.int64)
+        if len(self) == 0:
+            distances[:] = np.inf
+            return distances, halo_rows
+
+        for start in range(0, n_positions, block_size):
+            end = min(start + block_size, n_positions)
+            block_distances, block_rows = self.__tree.query(wrap_positions(positions[start : end], self.__box_size))
+            distances[start : end] = block_distances
+            halo_rows[start : end] = block_rows
+
+        return distances, halo_rows
+
+    def within_r_200(self, positions: np.ndarray, block_size: int = DEFAULT_QUERY_BLOCK_SIZE) -> np.ndarray:
+        """
+        Find the halo whose R200 contains each position.
+
+        Where a position lies within more than one halo, the halo with the smallest distance as a fraction of R200 is chosen.
+        Returns the halo row for each position.
+        """
+        n_positions = positions.shape[0]
+        halo_rows = np.full(n_positions, -1, dtype = np.int64)
+        searchable_haloes = np.where(self.__r_200 > 0)[0]
+        if searchable_haloes.shape[0] == 0:
+            return halo_rows
+
+        for start in range(0, n_positions, block_size):
+            end = min(start + block_size, n_positions)
+            block_positions = wrap_positions(positions[start : end], self.__box_size)
+
+            # Search around each halo in a tree of this block's positions - the number of Python objects scales with the number of haloes, not positions
+            block_tree = cKDTree(block_positions, boxsize = self.__box_size)
+            matches = block_tree.query_ball_point(self.__centres[searchable_haloes], self.__r_200[searchable_haloes], return_sorted = False)
+
+            n_matches = np.fromiter((len(match) for match in matches), dtype = np.int64, count = searchable_haloes.shape[0])
+            if n_matches.sum() == 0:
+                continue
+            match_positions = np.concatenate([np.asarray(match, dtype = np.int64) for match in matches])
+            match_haloes = np.repeat(searchable_haloes, n_matches)
+
+            # Resolve positions inside multiple haloes
+            scaled_distances = displacement_magnitudes(periodic_displacements(block_positions[match_positions], self.__centres[match_haloes], self.__box_size))
+            scaled_distances /= self.__r_200[match_haloes]
+            order = np.lexsort((scaled_distances, match_positions))
+            unique_positions, first_indexes = np.unique(match_positions[order], return_index = True)
+
+            halo_rows[start + unique_positions] = match_haloes[order][first_indexes]
+
+        return halo_rows
+
+    def save(self, filepath: str, source_files: Union[list, None] = None):
+        """
+        Write the index arrays to an HDF5 file. The tree is rebuilt when loaded.
+        """
+        with h5py.File(filepath, "w") as file:
+            file.create_dataset(HaloSpatialIndex.HALO_IDS, data = self.__halo_ids)
+            file.create_dataset(HaloSpatialIndex.CENTRES, data = self.__centres)
+            file.create_dataset(HaloSpatialIndex.R_200, data = self.__r_200)
+            file.attrs["BoxSize"] = self.__box_size
+            file.attrs["Unit"] = self.__unit
+            if source_files is not None:
+                file.attrs["SourceFiles"] = [os.path.abspath(path) for path in source_files]
+                file.attrs["SourceModificationTimes"] = [os.path.getmtime(path) for path in source_files]
+
+    @staticmethod
+    def load(filepath: str) -> "HaloSpatialIndex":
+        with h5py.File(filepath, "r") as file:
+            return HaloSpatialIndex(file[HaloSpatialIndex.HALO_IDS][...], file[HaloSpatialIndex.CENTRES][...], file[HaloSpatialIndex.R_200][...], file.attrs["BoxSize"], str(file.attrs["Unit"]))
+
+    @staticmethod
+    def cache_is_valid(filepath: str, source_files: list, unit: Union[str, None] = None) -> bool:
+        """
+        Check that a cached index exists and was built from the current versions of the source files.
+        """
+        if not os.path.isfile(filepath):
+            return False
+        with h5py.File(filepath, "r") as file:
+            if "SourceFiles" not in file.attrs or (unit is not None and str(file.attrs["Unit"]) != unit):
+                return False
+            cached_files = [path.decode() if isinstance(path, bytes) else str(path) for path in file.attrs["SourceFiles"]]
+            cached_times = list(file.attrs["SourceModificationTimes"])
+        return sorted(zip(cached_files, cached_times)) == sorted((os.path.abspath(path), os.path.getmtime(path)) for path in source_files)
+
+    @staticmethod
+    def from_catalogue(catalogue: Multifile_VR_Catalogue, box_size: Union[float, np.ndarray, unyt_array], unit: str = "Mpc", cache_filepath: Union[str, None] = None) -> "HaloSpatialIndex":
+        """
+        Build an index from the centres and R200 radii of a catalogue.
+
+        If a cache file path is provided, a valid cache is loaded instead of reading the catalogue and a new cache is written otherwise.
+        """
+        source_files = catalogue.properties_filepaths
+        if cache_filepath is not None and HaloSpatialIndex.cache_is_valid(cache_filepath, source_files, unit):
+            return HaloSpatialIndex.load(cache_filepath)
+
+        if isinstance(box_size, unyt_array):
+            box_size = box_size.to(unit).value
+
+        centres = np.stack((catalogue.positions.xc.value.to(unit).value,
+                            catalogue.positions.yc.value.to(unit).value,
+                            catalogue.positions.zc.value.to(unit).value), axis = 1)
+        index = HaloSpatialIndex(catalogue.ids.id.value, centres, catalogue.radii.r_200crit.value.to(unit).value, box_size, unit)
+
+        if cache_filepath is not None:
+            index.save(cache_filepath, source_files)
+
+        return index
@@ -0,0 +1,336 @@
+"""
+File: sph_projection.py
+
+Author: Christopher Rowe
+Vesion: 1.4.0
+Date:   19/10/2026
+
+Projection of SPH particles onto a regular grid of pixels.
+
+The projected position and kernel footprint of each particle is
+calculated once when the projection is created, so any number of
+quantities may then be rendered for the same particles without
+repeating that work. Several quantities can also be rendered together,
+sharing a single evaluation of each kernel footprint.
+
+Large images may be rendered as tiles, optionally in parallel. Each tile
+only evaluates the particles whose footprint overlaps it, and the
+pixels of a tiled image are identical to those rendered in one piece.
+Tiles can also be retrieved one at a time, so images too large to hold
+in memory can be written out as they are rendered.
+
+Each particle's contribution is spread over the pixel centres within its
+smoothing length using the 2D cubic spline kernel, normalised so that
+the total deposited equals the particle's value. Particles smaller than
+a pixel are deposited into the nearest pixel.
+
+Every particle is rendered exactly by default. To bound the cost of
+particles much larger than a pixel, a limit on the footprint radius can
+be set, above which particles are deposited onto a coarser grid (by a
+power of two) and spread evenly over the pixels of each coarse pixel.
+This conserves the total but is lossy, leaving visible blocks where
+such particles dominate (e.g. in voids).
+
+Public API:
+
+    class SPHProjection
+
+Dependancies:
+
+    collections
+    concurrent
+    itertools
+    numpy
+    typing
+"""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import itertools
+import numpy as np
+from typing import Iterator, List, Tuple, Union
+
+# Maximum number of (particle, pixel) pairs evaluated at once
+DEFAULT_ENTRY_BLOCK_SIZE = 2**22
+
+# Largest footprint radius (in pixels) evaluated at the full resolution of the image (None for no limit)
+DEFAULT_MAX_FOOTPRINT_RADIUS = None
+
+def _cubic_spline_kernel_2d(q: np.ndarray) -> np.ndarray:
+    """
+    Unnormalised 2D cubic spline kernel for q = r / h (compact support at q = 1).
+    """
+    outer = np.clip(1.0 - q, 0.0, None)
+    result = 2 * outer**3
+    inner = q < 0.5
+    result[inner] = 1 - 6 * q[inner]**2 + 6 * q[inner]**3
+    return result
+
+class SPHProjection(object):
+    """
+    Projects particles along one axis onto an image with the specified ranges (in the same units as the positions).
+
+    Images have shape (y_pixels, x_pixels) with the row index increasing with the y coordinate.
+    Rendered values are per unit area.
+    If max_footprint_radius is set, particles with a footprint radius of more than that many pixels are rendered
+    at a coarser resolution (an approximation that trades accuracy for speed). By default every particle is rendered exactly.
+    """
+
+    def __init__(self, positions: np.ndarray, smoothing_lengths: np.ndarray, x_range: Tuple[float, float], y_range: Tuple[float, float], resolution: Union[int, Tuple[int, int]], axes: Tuple[int, int] = (0, 1), entry_block_size: int = DEFAULT_ENTRY_BLOCK_SIZE, max_footprint_radius: Union[int, None] = DEFAULT_MAX_FOOTPRINT_RADIUS):
+        if np.ndim(resolution) == 0:
+            resolution = (int(resolution), int(resolution))
+        self.__x_pixels, self.__y_pixels = int(resolution[0]), int(resolution[1])
+        self.__x_range = (float(x_range[0]), float(x_range[1]))
+        self.__y_range = (float(y_range[0]), float(y_range[1]))
+        self.__pixel_width = (self.__x_range[1] - self.__x_range[0]) / self.__x_pixels
+        self.__pixel_height = (self.__y_range[1] - self.__y_range[0]) / self.__y_pixels
+        self.__entry_block_size = entry_block_size
+
+        positions = np.asarray(positions)
+        smoothing_lengths = np.asarray(smoothing_lengths, dtype = np.float64)
+        self.__n_particles = positions.shape[0]
+
+        # Position in units of pixels, with pixel centres at integer values
+        pixel_x = (positions[:, axes[0]] - self.__x_range[0]) / self.__pixel_width - 0.5
+        pixel_y = (positions[:, axes[1]] - self.__y_range[0]) / self.__pixel_height - 0.5
+        pixel_radius = np.ceil(np.maximum(smoothing_lengths / self.__pixel_width, smoothing_lengths / self.__pixel_height)).astype(np.int64)
+
+        # Discard particles with no overlap with the image
+        centre_x = np.rint(pixel_x).astype(np.int64)
+        centre_y = np.rint(pixel_y).astype(np.int64)
+        visible = (centre_x + pixel_radius >= 0) & (centre_x - pixel_radius < self.__x_pixels) & (centre_y + pixel_radius >= 0) & (centre_y - pixel_radius < self.__y_pixels)
+        self.__particle_indexes = np.where(visible)[0]
+
+        pixel_x = pixel_x[self.__particle_indexes]
+        pixel_y = pixel_y[self.__particle_indexes]
+        smoothing_lengths = smoothing_lengths[self.__particle_indexes]
+        pixel_radius = pixel_radius[self.__particle_indexes]
+
+        # Number of pixels along each side of the coarse pixels used for each particle
+        factors = np.ones(self.__particle_indexes.shape[0], dtype = np.int64)
+        if max_footprint_radius is not None:
+            large = pixel_radius > max_footprint_radius
+            factors[large] = 2**np.ceil(np.log2(pixel_radius[large] / max_footprint_radius)).astype(np.int64)
+
+        # Positions and footprint sizes in units of each particle's coarse pixels
+        pixel_x = (pixel_x + 0.5) / factors - 0.5
+        pixel_y = (pixel_y + 0.5) / factors - 0.5
+        pixel_radius = np.ceil(np.maximum(smoothing_lengths / (self.__pixel_width * factors), smoothing_lengths / (self.__pixel_height * factors))).astype(np.int64)
+
+        # Group particles by resolution and footprint size so that each group can be evaluated as a single array operation
+        order = np.lexsort((pixel_radius, factors))
+        self.__particle_indexes = self.__particle_indexes[order]
+        self.__pixel_x = pixel_x[order]
+        self.__pixel_y = pixel_y[order]
+        self.__centre_x = np.rint(self.__pixel_x).astype(np.int64)
+        self.__centre_y = np.rint(self.__pixel_y).astype(np.int64)
+        self.__smoothing_lengths = smoothing_lengths[order]
+        self.__pixel_radius = pixel_radius[order]
+        self.__factors = factors[order]
+        group_changes = np.where((np.diff(self.__pixel_radius) != 0) | (np.diff(self.__factors) != 0))[0] + 1
+        self.__group_starts = np.append(0, group_changes) if self.__particle_indexes.shape[0] > 0 else np.empty(0, dtype = np.int64)
+        self.__group_ends = np.append(self.__group_starts[1:], self.__particle_indexes.shape[0])
+        self.__group_radii = self.__pixel_radius[self.__group_starts]
+        self.__group_factors = self.__factors[self.__group_starts]
+
+    @property
+    def resolution(self) -> Tuple[int, int]:
+        return self.__x_pixels, self.__y_pixels
+
+    @property
+    def x_range(self) -> Tuple[float, float]:
+        return self.__x_range
+
+    @property
+    def y_range(self) -> Tuple[float, float]:
+        return self.__y_range
+
+    @property
+    def pixel_area(self) -> float:
+        return self.__pixel_width * self.__pixel_height
+
+    @property
+    def n_particles(self) -> int:
+        return self.__n_particles
+
+    @property
+    def n_visible_particles(self) -> int:
+        return self.__particle_indexes.shape[0]
+
+    def _blocks(self):
+        """
+        Iterate over blocks of projected particles with the same resolution and footprint size.
+
+        Yields (start, end, pixel radius, coarse pixel factor).
+        """
+        for radius, factor, group_start, group_end in zip(self.__group_radii, self.__group_factors, self.__group_starts, self.__group_ends):
+            footprint_size = (2 * int(radius) + 1)**2
+            block_length = max(1, self.__entry_block_size // footprint_size)
+            for start in range(group_start, group_end, block_length):
+                yield start, min(start + block_length, group_end), int(radius), int(factor)
+
+    def _footprints(self, particles: Union[slice, np.ndarray], radius: int, x_pixels: Tuple[int, int], y_pixels: Tuple[int, int], factor: int = 1) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Pixel indices and normalised kernel weights for some of the projected particles with the same resolution and footprint size.
+
+        Pixels are coarse pixels of factor x factor image pixels, and only entries within the (coarse) pixel ranges
+        [x_pixels[0], x_pixels[1]) and [y_pixels[0], y_pixels[1]) are returned, with flat pixel indices relative to the start of those ranges.
+        Returns (flat pixel indices, weights, row of each entry within the particles).
+        """
+        offsets = np.arange(-radius, radius + 1)
+        n_offsets = offsets.shape[0]
+        smoothing_lengths = self.__smoothing_lengths[particles]
+        n_rows = smoothing_lengths.shape[0]
+
+        # Distances are separable, so are calculated per axis before being combined
+        pixel_x = self.__centre_x[particles][:, None] + offsets[None, :]
+        pixel_y = self.__centre_y[particles][:, None] + offsets[None, :]
+        inverse_smoothing_lengths = np.zeros(n_rows)
+        np.divide(1.0, smoothing_lengths, out = inverse_smoothing_lengths, where = smoothing_lengths > 0)
+        scaled_distance_x = np.square((pixel_x - self.__pixel_x[particles][:, None]) * (self.__pixel_width * factor * inverse_smoothing_lengths[:, None]))
+        scaled_distance_y = np.square((pixel_y - self.__pixel_y[particles][:, None]) * (self.__pixel_height * factor * inverse_smoothing_lengths[:, None]))
+        q = np.sqrt((scaled_distance_y[:, :, None] + scaled_distance_x[:, None, :]).reshape((n_rows, n_offsets**2)))
+        q[smoothing_lengths <= 0] = np.inf
+        kernel = _cubic_spline_kernel_2d(q)
+        del q, scaled_distance_x, scaled_distance_y
+
+        # Normalise over the whole footprint (including any part outside of the image)
+        kernel_totals = kernel.sum(axis = 1)
+        unresolved = kernel_totals == 0
+        if unresolved.any():
+            # Particles that don't cover a pixel centre are placed in the nearest pixel
+            kernel[unresolved, n_offsets**2 // 2] = 1.0
+            kernel_totals[unresolved] = 1.0
+        kernel /= kernel_totals[:, None]
+
+        pixel_x -= x_pixels[0]
+        pixel_y -= y_pixels[0]
+        x_in_range = (pixel_x >= 0) & (pixel_x < x_pixels[1] - x_pixels[0])
+        y_in_range = (pixel_y >= 0) & (pixel_y < y_pixels[1] - y_pixels[0])
+        in_range = (y_in_range[:, :, None] & x_in_range[:, None, :]).reshape((n_rows, n_offsets**2))
+        pixel_indexes = (pixel_y[:, :, None] * (x_pixels[1] - x_pixels[0]) + pixel_x[:, None, :]).reshape((n_rows, n_offsets**2))
+        rows = np.broadcast_to(np.arange(n_rows)[:, None], in_range.shape)[in_range]
+        return pixel_indexes[in_range], kernel[in_range], rows
+
+    def _select_weights(self, channels: List[np.ndarray]) -> np.ndarray:
+        weights = np.empty((len(channels), self.__particle_indexes.shape[0]), dtype = np.float64)
+        for i, channel in enumerate(channels):
+            channel = np.asarray(channel, dtype = np.float64)
+            if channel.shape[0] != self.__n_particles:
+                raise ValueError(f"Expected {self.__n_particles} weights but got {channel.shape[0]}.")
+            weights[i] = channel[self.__particle_indexes]
+        return weights
+
+    def _render_tile(self, weights: np.ndarray, x_pixels: Tuple[int, int], y_pixels: Tuple[int, int]) -> np.ndarray:
+        """
+        Render the pixels in the specified ranges for each channel of the (projected particle ordered) weights.
+
+        Every tile visits the same blocks of particles in the same order, skipping only the particles that don't overlap it,
+        so each pixel's sum is accumulated in exactly the same order however the image is divided.
+        Coarse pixels are aligned with the whole image, so those on the edge of a tile are the same in each tile they overlap.
+        Returns an array of shape (channels, y pixels, x pixels) that has not yet been divided by the pixel area.
+        """
+        tile_width = x_pixels[1] - x_pixels[0]
+        tile_height = y_pixels[1] - y_pixels[0]
+        whole_image = x_pixels == (0, self.__x_pixels) and y_pixels == (0, self.__y_pixels)
+
+        # Images for each coarse pixel factor, covering the coarse pixels that overlap the tile
+        images = {}
+        for start, end, radius, factor in self._blocks():
+            coarse_x_pixels = (x_pixels[0] // factor, -(-x_pixels[1] // factor))
+            coarse_y_pixels = (y_pixels[0] // factor, -(-y_pixels[1] // factor))
+            if factor not in images:
+                images[factor] = np.zeros((weights.shape[0], (coarse_x_pixels[1] - coarse_x_pixels[0]) * (coarse_y_pixels[1] - coarse_y_pixels[0])), dtype = np.float64)
+            if whole_image and factor == 1:
+                particles = slice(start, end)
+            else:
+                # Only particles with a footprint overlapping the tile are needed
+                centre_x = self.__centre_x[start : end]
+                centre_y = self.__centre_y[start : end]
+                overlapping = (centre_x + radius >= coarse_x_pixels[0]) & (centre_x - radius < coarse_x_pixels[1]) & (centre_y + radius >= coarse_y_pixels[0]) & (centre_y - radius < coarse_y_pixels[1])
+                particles = start + np.where(overlapping)[0]
+                if particles.shape[0] == 0:
+                    continue
+            pixel_indexes, kernel, rows = self._footprints(particles, radius, coarse_x_pixels, coarse_y_pixels, factor)
+            for i in range(weights.shape[0]):
+                images[factor][i] += np.bincount(pixel_indexes, weights = kernel * weights[i, particles][rows], minlength = images[factor].shape[1])
+
+        result = np.zeros((weights.shape[0], tile_height, tile_width), dtype = np.float64)
+        for factor, coarse_images in images.items():
+            coarse_x_start = x_pixels[0] // factor
+            coarse_y_start = y_pixels[0] // factor
+            coarse_images = coarse_images.reshape((weights.shape[0], -(-y_pixels[1] // factor) - coarse_y_start, -(-x_pixels[1] // factor) - coarse_x_start))
+            if factor > 1:
+                # Spread each coarse pixel evenly over its pixels
+                coarse_images = np.repeat(np.repeat(coarse_images / factor**2, factor, axis = 1), factor, axis = 2)
+            x_offset = x_pixels[0] - coarse_x_start * factor
+            y_offset = y_pixels[0] - coarse_y_start * factor
+            result += coarse_images[:, y_offset : y_offset + tile_height, x_offset : x_offset + tile_width]
+
+        return result
+
+    def tile_pixel_ranges(self, tiles: int) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """
+        Divide the image into a grid of (up to) tiles x tiles rectangles.
+
+        Returns a list of (x pixel range, y pixel range) pairs.
+        """
+        x_edges = np.unique(np.linspace(0, self.__x_pixels, tiles + 1).astype(np.int64))
+        y_edges = np.unique(np.linspace(0, self.__y_pixels, tiles + 1).astype(np.int64))
+        return [((int(x_edges[i]), int(x_edges[i + 1])), (int(y_edges[j]), int(y_edges[j + 1]))) for j in range(y_edges.shape[0] - 1) for i in range(x_edges.shape[0] - 1)]
+
+    def render(self, weights: np.ndarray, tiles: int = 1, workers: int = 1) -> np.ndarray:
+        """
+        Project a quantity with one value per particle (in the order the particles were given).
+        """
+        return self.render_channels([weights], tiles, workers)[0]
+
+    def render_channels(self, channels: List[np.ndarray], tiles: int = 1, workers: int = 1) -> List[np.ndarray]:
+        """
+        Project several quantities (such as a weighted quantity and its weights) in a single pass over the particles.
+
+        Each kernel footprint is evaluated once and deposited into every channel.
+        If tiles > 1, the image is divided into a grid of tiles x tiles which are rendered separately,
+        using a pool of worker processes if workers > 1. The result is identical to rendering the image whole.
+        """
+        images = np.empty((len(channels), self.__y_pixels, self.__x_pixels), dtype = np.float64)
+        for (x_pixels, y_pixels), tile_images in self.render_tiles(channels, self.tile_pixel_ranges(tiles), workers):
+            images[:, y_pixels[0] : y_pixels[1], x_pixels[0] : x_pixels[1]] = tile_images
+        return list(images)
+
+    def render_tiles(self, channels: List[np.ndarray], tile_ranges: List[Tuple[Tuple[int, int], Tuple[int, int]]], workers: int = 1) -> Iterator[Tuple[Tuple[Tuple[int, int], Tuple[int, int]], np.ndarray]]:
+        """
+        Render several quantities for each of a list of (x pixel range, y pixel range) tiles, such as those from tile_pixel_ranges.
+
+        Yields ((x pixel range, y pixel range), images) in the order of the tiles, where images has shape (channels, y pixels, x pixels).
+        Tiles are rendered by a pool of worker processes if workers > 1. At most one tile per worker is rendered ahead of the
+        tile last yielded, so only that many finished tiles are held in memory at once.
+        """
+        weights = self._select_weights(channels)
+
+        if workers > 1 and len(tile_ranges) > 1:
+            with ProcessPoolExecutor(max_workers = workers, initializer = _initialise_tile_worker, initargs = (self, weights)) as executor:
+                remaining_tiles = iter(tile_ranges)
+                pending = deque((pixel_ranges, executor.submit(_render_worker_tile, pixel_ranges)) for pixel_ranges in itertools.islice(remaining_tiles, workers))
+                while len(pending) > 0:
+                    pixel_ranges, future = pending.popleft()
+                    tile_images = future.result()
+                    del future
+                    # Replace the finished tile before it is yielded, so the workers are kept busy while it is used
+                    for next_pixel_ranges in itertools.islice(remaining_tiles, 1):
+                        pending.append((next_pixel_ranges, executor.submit(_render_worker_tile, next_pixel_ranges)))
+                    yield pixel_ranges, tile_images / self.pixel_area
+        else:
+            for x_pixels, y_pixels in tile_ranges:
+                yield (x_pixels, y_pixels), self._render_tile(weights, x_pixels, y_pixels) / self.pixel_area
+
+# Projection and weights used by each worker process when rendering tiles in parallel
+_tile_worker_state = None
+
+def _initialise_tile_worker(projection: SPHProjection, weights: np.ndarray):
+    global _tile_worker_state
+    _tile_worker_state = (projection, weights)
+
+def _render_worker_tile(pixel_ranges: Tuple[Tuple[int, int], Tuple[int, int]]) -> np.ndarray:
+    projection, weights = _tile_worker_state
+    return projection._render_tile(weights, *pixel_ranges)
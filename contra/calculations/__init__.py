@@ -1 +1,7 @@
-from .simple_fields import get_redshift, get_critical_gas_density
\ No newline at end of file
+from .simple_fields import get_redshift, get_critical_gas_density
+from .periodic_geometry import wrap_positions, wrap_displacements, periodic_displacements, displacement_magnitudes, wrapped_bounding_boxes, match_halo_rows, halo_centres_by_particle
+from .smoothing_lengths import calculate_kernel_gamma, generate_smoothing_lengths
+from .binned_statistics import RegularGrid, HexagonalGrid, binned_statistic
+from .histograms import Histogram, update_range
+from .cumulative_distributions import CumulativeDistribution, distinct_key_indices, decimate_monotonic_curve
+from .threshold_sweep import ThresholdSweep
@@ -0,0 +1,229 @@
+"""
+File: binned_statistics.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Vectorised statistics of particle values on 2D regular or hexagonal
+grids.
+
+Each particle's bin is found once as an index into the flattened grid,
+then every statistic is a bincount over those indices, so no Python
+function is called per bin. The hexagonal grid is the same as the one
+used by matplotlib's hexbin, so the results can be drawn in its place.
+
+Public API:
+
+    class RegularGrid
+    class HexagonalGrid
+    binned_statistic(numpy.ndarray, int, str, numpy.ndarray, numpy.ndarray, float, bool)
+
+Dependancies:
+
+    math
+    numpy
+    typing
+"""
+
+import math
+import numpy as np
+from typing import Tuple, Union
+
+BINNED_STATISTICS = ("count", "sum", "mean", "fraction")
+
+def _nonsingular(value_min: float, value_max: float, expander: float = 0.1) -> Tuple[float, float]:
+    """
+    Widen a range with no (or negligible) width, in the same way as matplotlib.
+    """
+    if not (np.isfinite(value_min) and np.isfinite(value_max)):
+        return -expander, expander
+    if value_max < value_min:
+        value_min, value_max = value_max, value_min
+    tiny = 1e-15
+    max_abs_value = max(abs(value_min), abs(value_max))
+    if max_abs_value < (1e6 / tiny) * np.finfo(float).tiny:
+        return -expander, expander
+    if value_max - value_min <= max_abs_value * tiny:
+        if value_max == 0 and value_min == 0:
+            return -expander, expander
+        return value_min - expander * abs(value_min), value_max + expander * abs(value_max)
+    return value_min, value_max
+
+class RegularGrid(object):
+    """
+    Rectangular bins with the specified edges. Bins are flattened with the y index varying fastest.
+    """
+
+    def __init__(self, x_edges: np.ndarray, y_edges: np.ndarray):
+        self.__x_edges = np.asarray(x_edges, dtype = np.float64)
+        self.__y_edges = np.asarray(y_edges, dtype = np.float64)
+
+    @staticmethod
+    def from_data(x: np.ndarray, y: np.ndarray, bins: Union[int, Tuple[int, int]] = 10, log: bool = False) -> "RegularGrid":
+        """
+        Grid spanning the range of the data, with linearly (or logarithmically) spaced edges.
+        """
+        x_bins, y_bins = (bins, bins) if np.ndim(bins) == 0 else bins
+        make_edges = (lambda low, high, n: np.logspace(np.log10(low), np.log10(high), n + 1)) if log else (lambda low, high, n: np.linspace(low, high, n + 1))
+        return RegularGrid(make_edges(*_nonsingular(np.min(x), np.max(x)), x_bins), make_edges(*_nonsingular(np.min(y), np.max(y)), y_bins))
+
+    @property
+    def x_edges(self) -> np.ndarray:
+        return self.__x_edges
+
+    @property
+    def y_edges(self) -> np.ndarray:
+        return self.__y_edges
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.__x_edges.shape[0] - 1, self.__y_edges.shape[0] - 1
+
+    @property
+    def n_bins(self) -> int:
+        return self.shape[0] * self.shape[1]
+
+    def bin_indices(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Flat bin index of each point (-1 for points outside the grid). The final edges are inclusive, as with numpy.histogram2d.
+        """
+        x_index = np.searchsorted(self.__x_edges, x, side = "right") - 1
+        y_index = np.searchsorted(self.__y_edges, y, side = "right") - 1
+        x_index[x == self.__x_edges[-1]] = self.shape[0] - 1
+        y_index[y == self.__y_edges[-1]] = self.shape[1] - 1
+        inside = (x_index >= 0) & (x_index < self.shape[0]) & (y_index >= 0) & (y_index < self.shape[1])
+        return np.where(inside, x_index * self.shape[1] + y_index, -1)
+
+    def reshape(self, values: np.ndarray) -> np.ndarray:
+        """
+        Flat bin values as an (x bins, y bins) array.
+        """
+        return values.reshape(self.shape)
+
+class HexagonalGrid(object):
+    """
+    Grid of hexagons with gridsize hexagons in the x direction, covering the extent (x_min, x_max, y_min, y_max).
+
+    This is the grid used by matplotlib's hexbin (with linear axes), including the order of the bins.
+    """
+
+    def __init__(self, gridsize: Union[int, Tuple[int, int]], extent: Tuple[float, float, float, float]):
+        if np.ndim(gridsize) == 0:
+            self.__nx = int(gridsize)
+            self.__ny = int(self.__nx / math.sqrt(3))
+        else:
+            self.__nx, self.__ny = int(gridsize[0]), int(gridsize[1])
+        x_min, x_max, y_min, y_max = (float(value) for value in extent)
+        # As with hexbin, prevent points on the edge of the extent being lost to rounding
+        padding = 1.e-9 * (x_max - x_min)
+        self.__x_min = x_min - padding
+        self.__x_max = x_max + padding
+        self.__y_min = y_min
+        self.__y_max = y_max
+        self.__sx = (self.__x_max - self.__x_min) / self.__nx
+        self.__sy = (self.__y_max - self.__y_min) / self.__ny
+
+    @staticmethod
+    def from_data(x: np.ndarray, y: np.ndarray, gridsize: Union[int, Tuple[int, int]] = 100) -> "HexagonalGrid":
+        """
+        Grid spanning the range of the data, as chosen by hexbin when no extent is given.
+        """
+        x_range = (np.min(x), np.max(x)) if len(x) > 0 else (0, 1)
+        y_range = (np.min(y), np.max(y)) if len(y) > 0 else (0, 1)
+        return HexagonalGrid(gridsize, (*_nonsingular(*x_range), *_nonsingular(*y_range)))
+
+    @property
+    def extent(self) -> Tuple[float, float, float, float]:
+        return self.__x_min, self.__x_max, self.__y_min, self.__y_max
+
+    @property
+    def n_bins(self) -> int:
+        return (self.__nx + 1) * (self.__ny + 1) + self.__nx * self.__ny
+
+    @property
+    def centres(self) -> np.ndarray:
+        """
+        (n_bins, 2) array of the (x, y) centre of each hexagon.
+        """
+        nx1, ny1 = self.__nx + 1, self.__ny + 1
+        centres = np.zeros((self.n_bins, 2), dtype = np.float64)
+        centres[: nx1 * ny1, 0] = np.repeat(np.arange(nx1), ny1)
+        centres[: nx1 * ny1, 1] = np.tile(np.arange(ny1), nx1)
+        centres[nx1 * ny1 :, 0] = np.repeat(np.arange(self.__nx) + 0.5, self.__ny)
+        centres[nx1 * ny1 :, 1] = np.tile(np.arange(self.__ny), self.__nx) + 0.5
+        centres[:, 0] = centres[:, 0] * self.__sx + self.__x_min
+        centres[:, 1] = centres[:, 1] * self.__sy + self.__y_min
+        return centres
+
+    @property
+    def polygon(self) -> np.ndarray:
+        """
+        (6, 2) array of the vertices of a hexagon relative to its centre.
+        """
+        return np.array([self.__sx, self.__sy / 3]) * np.array([[0.5, -0.5], [0.5, 0.5], [0.0, 1.0], [-0.5, 0.5], [-0.5, -0.5], [0.0, -1.0]])
+
+    def bin_indices(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Flat bin index of each point (-1 for points outside the grid).
+        """
+        nx1, ny1 = self.__nx + 1, self.__ny + 1
+        ix = (np.asarray(x, dtype = np.float64) - self.__x_min) / self.__sx
+        iy = (np.asarray(y, dtype = np.float64) - self.__y_min) / self.__sy
+
+        # Each point is in the nearer of the hexagons from the two offset lattices
+        ix1 = np.round(ix).astype(np.int64)
+        iy1 = np.round(iy).astype(np.int64)
+        ix2 = np.floor(ix).astype(np.int64)
+        iy2 = np.floor(iy).astype(np.int64)
+        i1 = np.where((0 <= ix1) & (ix1 < nx1) & (0 <= iy1) & (iy1 < ny1), ix1 * ny1 + iy1, -1)
+        i2 = np.where((0 <= ix2) & (ix2 < self.__nx) & (0 <= iy2) & (iy2 < self.__ny), nx1 * ny1 + ix2 * self.__ny + iy2, -1)
+        d1 = (ix - ix1)**2 + 3.0 * (iy - iy1)**2
+        d2 = (ix - ix2 - 0.5)**2 + 3.0 * (iy - iy2 - 0.5)**2
+        return np.where(d1 < d2, i1, i2)
+
+def binned_statistic(bin_indices: np.ndarray, n_bins: int, statistic: str = "count", values: Union[np.ndarray, None] = None, weights: Union[np.ndarray, None] = None, divisor: Union[float, None] = None, log: bool = False) -> np.ndarray:
+    """
+    Calculate a statistic of the values in each bin from the bin index of each value (points with negative indices are ignored).
+
+    Statistics are:
+        "count"    - number of points (or sum of the weights)
+        "sum"      - sum of the values (weighted if weights are given)
+        "mean"     - mean of the values (weighted if weights are given)
+        "fraction" - sum of the values (weighted if weights are given) as a fraction of the total over all bins
+
+    The result is then divided by the divisor (if specified) and logged (if log is set).
+    Returns an array of n_bins values, which are NaN for empty bins (other than for counts).
+    """
+    if statistic not in BINNED_STATISTICS:
+        raise ValueError(f"Unknown statistic \"{statistic}\". Valid statistics are: {', '.join(BINNED_STATISTICS)}.")
+    if statistic != "count" and values is None:
+        raise ValueError(f"Values must be specified for the \"{statistic}\" statistic.")
+
+    inside = bin_indices >= 0
+    indices = bin_indices[inside]
+    weights = np.asarray(weights, dtype = np.float64)[inside] if weights is not None else None
+
+    counts = np.bincount(indices, weights = weights, minlength = n_bins).astype(np.float64)
+    if statistic == "count":
+        result = counts
+    else:
+        weighted_values = np.asarray(values, dtype = np.float64)[inside]
+        if weights is not None:
+            weighted_values = weighted_values * weights
+        sums = np.bincount(indices, weights = weighted_values, minlength = n_bins)
+        occupied = np.bincount(indices, minlength = n_bins) > 0
+        result = np.full(n_bins, np.nan)
+        if statistic == "sum":
+            result[occupied] = sums[occupied]
+        elif statistic == "mean":
+            result[occupied] = sums[occupied] / counts[occupied]
+        else:
+            result[occupied] = sums[occupied] / sums.sum()
+
+    if divisor is not None:
+        result = result / divisor
+    if log:
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            result = np.log10(result)
+    return result
@@ -0,0 +1,145 @@
+"""
+File: cumulative_distributions.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Cumulative sums of a quantity in ascending order of a key (e.g. the mass
+of each particle's last halo) without sorting the particles.
+
+Keys that take relatively few distinct values are matched against a
+sorted list of those values, found from a sample of the keys and
+extended with any keys not yet seen. The quantity is then summed for
+each distinct value with a bincount (for any number of filters at
+once), so the cumulative sums only need to be taken over the distinct
+values. Curves for plotting can be reduced to a bounded number of
+points.
+
+Public API:
+
+    class CumulativeDistribution
+    distinct_key_indices(numpy.ndarray)
+    decimate_monotonic_curve(numpy.ndarray, numpy.ndarray, int)
+
+Dependancies:
+
+    numpy
+    typing
+"""
+
+import numpy as np
+from typing import Dict, Tuple, Union
+
+# Number of keys used to find an initial set of distinct values
+DISTINCT_KEY_SAMPLE_SIZE = 2**16
+
+# Maximum number of points in a curve returned for plotting
+DEFAULT_MAX_CURVE_POINTS = 4096
+
+def distinct_key_indices(keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Find the sorted distinct values of an array and the index of each element's value in them (-1 for NaNs).
+
+    This takes O(N log K) time for K distinct values, so is much faster than sorting when K is small.
+    """
+    keys = np.asarray(keys)
+    valid = ~np.isnan(keys) if np.issubdtype(keys.dtype, np.floating) else np.full(keys.shape, True)
+    distinct = np.unique(keys[valid][: DISTINCT_KEY_SAMPLE_SIZE])
+    while True:
+        indices = np.minimum(np.searchsorted(distinct, keys), max(distinct.shape[0] - 1, 0))
+        missing = valid & ((distinct[indices] != keys) if distinct.shape[0] > 0 else valid)
+        if not missing.any():
+            break
+        distinct = np.union1d(distinct, np.unique(keys[missing]))
+    indices[~valid] = -1
+    return distinct, indices
+
+def decimate_monotonic_curve(x: np.ndarray, y: np.ndarray, max_points: int = DEFAULT_MAX_CURVE_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce a curve with non-decreasing x and y values to at most max_points points.
+
+    Points are kept at evenly spaced intervals along both axes (as well as the end points),
+    so the curve drawn through them is within one interval of the original everywhere.
+    """
+    n_points = x.shape[0]
+    if n_points <= max_points:
+        return x, y
+    n_intervals = max(1, (max_points - 2) // 2)
+    x_indices = np.searchsorted(x, np.linspace(x[0], x[-1], n_intervals), side = "left")
+    y_indices = np.searchsorted(y, np.linspace(y[0], y[-1], n_intervals), side = "left")
+    indices = np.unique(np.minimum(np.concatenate(([0, n_points - 1], x_indices, y_indices)), n_points - 1))
+    return x[indices], y[indices]
+
+class CumulativeDistribution(object):
+    """
+    Sums of a quantity (weights, or the number of items if not specified) for each distinct key, in ascending key order.
+
+    Filters are boolean arrays (one element per item) identified by name. Each is summed separately
+    along with the unfiltered data (identified by None).
+    """
+
+    def __init__(self, keys: np.ndarray, weights: Union[np.ndarray, None] = None, filters: Union[Dict[str, np.ndarray], None] = None):
+        self.__keys, indices = distinct_key_indices(keys)
+        valid = indices >= 0
+        weights = np.asarray(weights, dtype = np.float64) if weights is not None else None
+        n_keys = self.__keys.shape[0]
+
+        self.__sums: Dict[Union[str, None], np.ndarray] = {}
+        self.__counts: Dict[Union[str, None], np.ndarray] = {}
+        for name, item_filter in [(None, valid), *((name, valid & np.asarray(item_filter, dtype = bool)) for name, item_filter in (filters if filters is not None else {}).items())]:
+            self.__counts[name] = np.bincount(indices[item_filter], minlength = n_keys)
+            self.__sums[name] = np.bincount(indices[item_filter], weights = weights[item_filter] if weights is not None else None, minlength = n_keys).astype(np.float64)
+
+    @property
+    def keys(self) -> np.ndarray:
+        """
+        Sorted distinct keys.
+        """
+        return self.__keys
+
+    @property
+    def filters(self):
+        return [name for name in self.__sums if name is not None]
+
+    def count(self, name: Union[str, None] = None) -> int:
+        """
+        Number of items (passing the named filter).
+        """
+        return int(self.__counts[name].sum())
+
+    def total(self, name: Union[str, None] = None) -> float:
+        """
+        Sum over every item (passing the named filter).
+        """
+        return float(self.__sums[name].sum())
+
+    def cumulative(self, name: Union[str, None] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Cumulative sum (of the items passing the named filter) up to and including each key that has any such items.
+        """
+        present = self.__counts[name] > 0
+        return self.__keys[present], np.cumsum(self.__sums[name])[present]
+
+    def curve(self, name: Union[str, None] = None, normalisation: Union[float, None] = None, max_points: Union[int, None] = DEFAULT_MAX_CURVE_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Points of the cumulative sum for plotting, divided by the normalisation (if specified).
+
+        The sum rises vertically at each key, as it would if every item were plotted in key order.
+        Unless max_points is None, the curve is decimated to at most that many points.
+        """
+        keys, cumulative_sums = self.cumulative(name)
+        x = np.repeat(keys, 2)
+        y = np.empty(x.shape[0], dtype = np.float64)
+        y[0::2] = np.append(0.0, cumulative_sums[:-1])
+        y[1::2] = cumulative_sums
+        if normalisation is not None:
+            y /= normalisation
+        return decimate_monotonic_curve(x, y, max_points) if max_points is not None else (x, y)
+
+    def key_at(self, value: float, name: Union[str, None] = None) -> float:
+        """
+        First key at which the cumulative sum (of the items passing the named filter) reaches the specified value.
+        """
+        keys, cumulative_sums = self.cumulative(name)
+        return keys[min(int(np.searchsorted(cumulative_sums, value, side = "left")), keys.shape[0] - 1)]
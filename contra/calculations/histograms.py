@@ -0,0 +1,311 @@
+"""
+File: histograms.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Histograms with fixed bins that are filled a chunk of data at a time.
+
+Each bin keeps the number of values, the sum of their weights and
+(optionally) the weighted mean, mean and variance of a second quantity,
+all of which can be combined exactly. Histograms filled from different
+chunks, files, processes or MPI ranks can therefore be merged, and a
+histogram can be saved to an HDF5 file and loaded again later.
+
+Bin edges follow numpy.histogram: each bin includes its lower edge and
+the last bin also includes its upper edge. Values outside the edges
+(including NaNs) are ignored.
+
+Public API:
+
+    class Histogram
+    update_range(Tuple[float, float], numpy.ndarray)
+
+Dependancies:
+
+    h5py
+    numpy
+    typing
+"""
+
+import h5py
+import numpy as np
+from typing import Dict, Iterable, List, Tuple, Union
+
+def update_range(value_range: Union[Tuple[float, float], None], values: np.ndarray) -> Union[Tuple[float, float], None]:
+    """
+    Extend a (min, max) range (or None if no values have been seen yet) to include the finite values of an array.
+    """
+    values = np.asarray(values)
+    values = values[np.isfinite(values)]
+    if values.shape[0] == 0:
+        return value_range
+    if value_range is None:
+        return float(values.min()), float(values.max())
+    return min(value_range[0], float(values.min())), max(value_range[1], float(values.max()))
+
+def _bin_indices(edges: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Index of the bin containing each value (-1 for values outside the edges).
+    """
+    n_bins = edges.shape[0] - 1
+    indices = np.searchsorted(edges, values, side = "right") - 1
+    indices[values == edges[-1]] = n_bins - 1
+    indices[(indices < 0) | (indices >= n_bins)] = -1
+    return indices
+
+class Histogram(object):
+    """
+    1D or 2D histogram with fixed bin edges (one array of edges per dimension).
+
+    If track_values is set, each bin also accumulates the values of a quantity passed to add,
+    so that the weighted mean and the standard deviation of the quantity in each bin can be found.
+    """
+
+    def __init__(self, *edges: np.ndarray, track_values: bool = False):
+        if len(edges) not in (1, 2):
+            raise ValueError(f"Histograms must have 1 or 2 dimensions, not {len(edges)}.")
+        self.__edges = tuple(np.asarray(axis_edges, dtype = np.float64) for axis_edges in edges)
+        for axis_edges in self.__edges:
+            if axis_edges.ndim != 1 or axis_edges.shape[0] < 2 or np.any(np.diff(axis_edges) <= 0):
+                raise ValueError("Bin edges must be a monotonically increasing array with at least two values.")
+        self.__track_values = track_values
+
+        n_bins = self.n_bins
+        self.__counts = np.zeros(n_bins, dtype = np.int64)
+        self.__totals = np.zeros(n_bins, dtype = np.float64)
+        if track_values:
+            self.__weighted_value_sums = np.zeros(n_bins, dtype = np.float64)
+            self.__value_means = np.zeros(n_bins, dtype = np.float64)
+            self.__value_squared_deviations = np.zeros(n_bins, dtype = np.float64)
+
+    @staticmethod
+    def from_range(n_bins: Union[int, Tuple[int, int]], *ranges: Tuple[float, float], log: Union[bool, Tuple[bool, bool]] = False, track_values: bool = False) -> "Histogram":
+        """
+        Histogram with n_bins (per dimension) equally spaced (or logarithmically spaced) bins spanning each (min, max) range.
+
+        As with numpy.histogram, a range with no width is widened by 0.5 either side.
+        """
+        n_bins = (n_bins,) * len(ranges) if np.ndim(n_bins) == 0 else tuple(n_bins)
+        log = (log,) * len(ranges) if np.ndim(log) == 0 else tuple(log)
+        edges = []
+        for axis_bins, (value_min, value_max), axis_log in zip(n_bins, ranges, log):
+            if axis_log:
+                if value_min <= 0:
+                    raise ValueError("Logarithmic bins require a range of positive values.")
+                if value_min == value_max:
+                    value_min, value_max = value_min / 10**0.5, value_max * 10**0.5
+                edges.append(np.logspace(np.log10(value_min), np.log10(value_max), axis_bins + 1))
+            else:
+                if value_min == value_max:
+                    value_min, value_max = value_min - 0.5, value_max + 0.5
+                edges.append(np.linspace(value_min, value_max, axis_bins + 1))
+        return Histogram(*edges, track_values = track_values)
+
+    @property
+    def ndim(self) -> int:
+        return len(self.__edges)
+
+    @property
+    def edges(self) -> Tuple[np.ndarray, ...]:
+        return self.__edges
+
+    @property
+    def centres(self) -> Tuple[np.ndarray, ...]:
+        return tuple((axis_edges[:-1] + axis_edges[1:]) / 2 for axis_edges in self.__edges)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return tuple(axis_edges.shape[0] - 1 for axis_edges in self.__edges)
+
+    @property
+    def n_bins(self) -> int:
+        return int(np.prod(self.shape))
+
+    @property
+    def track_values(self) -> bool:
+        return self.__track_values
+
+    @property
+    def counts(self) -> np.ndarray:
+        """
+        Number of values in each bin.
+        """
+        return self.__counts.reshape(self.shape)
+
+    @property
+    def totals(self) -> np.ndarray:
+        """
+        Sum of the weights in each bin (the same as the counts if no weights have been given).
+        """
+        return self.__totals.reshape(self.shape)
+
+    def bin_indices(self, *coordinates: np.ndarray) -> np.ndarray:
+        """
+        Flat index of the bin containing each point (-1 for points outside the histogram).
+        """
+        if len(coordinates) != self.ndim:
+            raise ValueError(f"{len(coordinates)} coordinates given for a {self.ndim}D histogram.")
+        indices = _bin_indices(self.__edges[0], np.asarray(coordinates[0], dtype = np.float64))
+        if self.ndim == 2:
+            y_indices = _bin_indices(self.__edges[1], np.asarray(coordinates[1], dtype = np.float64))
+            indices = np.where((indices >= 0) & (y_indices >= 0), indices * self.shape[1] + y_indices, -1)
+        return indices
+
+    def add(self, *coordinates: np.ndarray, weights: Union[np.ndarray, None] = None, values: Union[np.ndarray, None] = None):
+        """
+        Add a chunk of points, with optional weights and (if values are tracked) the value of the tracked quantity for each point.
+        """
+        if self.__track_values and values is None:
+            raise ValueError("Values must be given when adding to a histogram that tracks values.")
+        indices = self.bin_indices(*coordinates)
+        inside = indices >= 0
+        indices = indices[inside]
+        weights = np.asarray(weights, dtype = np.float64)[inside] if weights is not None else None
+
+        chunk_counts = np.bincount(indices, minlength = self.n_bins)
+        chunk_totals = np.bincount(indices, weights = weights, minlength = self.n_bins).astype(np.float64)
+
+        if not self.__track_values:
+            self.__counts += chunk_counts
+            self.__totals += chunk_totals
+        else:
+            values = np.asarray(values, dtype = np.float64)[inside]
+            occupied = chunk_counts > 0
+            chunk_weighted_value_sums = np.bincount(indices, weights = values * weights if weights is not None else values, minlength = self.n_bins)
+            chunk_means = np.zeros(self.n_bins, dtype = np.float64)
+            chunk_means[occupied] = np.bincount(indices, weights = values, minlength = self.n_bins)[occupied] / chunk_counts[occupied]
+            chunk_squared_deviations = np.bincount(indices, weights = (values - chunk_means[indices])**2, minlength = self.n_bins)
+            self.__combine(chunk_counts, chunk_totals, chunk_weighted_value_sums, chunk_means, chunk_squared_deviations)
+
+    def __combine(self, counts: np.ndarray, totals: np.ndarray, weighted_value_sums: np.ndarray = None, value_means: np.ndarray = None, value_squared_deviations: np.ndarray = None):
+        """
+        Add the accumulated values of another set of points.
+        Means and variances are combined using the method of Chan et al. so no precision is lost by summing squares.
+        """
+        if self.__track_values:
+            combined_counts = self.__counts + counts
+            occupied = combined_counts > 0
+            deltas = value_means - self.__value_means
+            self.__value_squared_deviations += value_squared_deviations
+            self.__value_squared_deviations[occupied] += deltas[occupied]**2 * self.__counts[occupied] * counts[occupied] / combined_counts[occupied]
+            self.__value_means[occupied] += deltas[occupied] * counts[occupied] / combined_counts[occupied]
+            self.__weighted_value_sums += weighted_value_sums
+        self.__counts += counts
+        self.__totals += totals
+
+    def mean(self, weighted: bool = True) -> np.ndarray:
+        """
+        Mean (weighted by default) of the tracked quantity in each bin. Empty bins are NaN.
+        """
+        if not self.__track_values:
+            raise ValueError("The histogram does not track values.")
+        result = np.full(self.n_bins, np.nan)
+        occupied = self.__counts > 0
+        if weighted:
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                result[occupied] = self.__weighted_value_sums[occupied] / self.__totals[occupied]
+        else:
+            result[occupied] = self.__value_means[occupied]
+        return result.reshape(self.shape)
+
+    def std(self) -> np.ndarray:
+        """
+        (Unweighted) standard deviation of the tracked quantity in each bin. Empty bins are NaN.
+        """
+        if not self.__track_values:
+            raise ValueError("The histogram does not track values.")
+        result = np.full(self.n_bins, np.nan)
+        occupied = self.__counts > 0
+        result[occupied] = np.sqrt(self.__value_squared_deviations[occupied] / self.__counts[occupied])
+        return result.reshape(self.shape)
+
+    def is_compatible(self, other: "Histogram") -> bool:
+        return self.ndim == other.ndim and self.__track_values == other.track_values and all(np.array_equal(a, b) for a, b in zip(self.__edges, other.edges))
+
+    def merge(self, other: "Histogram") -> "Histogram":
+        """
+        Add the contents of another histogram with the same bins to this one. Returns this histogram.
+        """
+        if not self.is_compatible(other):
+            raise ValueError("Histograms can only be merged if they have the same bins and both track (or don't track) values.")
+        state = other.to_dict()
+        self.__combine(state["counts"], state["totals"], state.get("weighted_value_sums"), state.get("value_means"), state.get("value_squared_deviations"))
+        return self
+
+    def copy(self) -> "Histogram":
+        return Histogram.from_dict(self.to_dict())
+
+    def __add__(self, other: "Histogram") -> "Histogram":
+        return self.copy().merge(other)
+
+    def __iadd__(self, other: "Histogram") -> "Histogram":
+        return self.merge(other)
+
+    @staticmethod
+    def merge_all(histograms: Iterable["Histogram"]) -> "Histogram":
+        """
+        Combine any number of compatible histograms into a new histogram.
+        """
+        histograms = list(histograms)
+        if len(histograms) == 0:
+            raise ValueError("No histograms to merge.")
+        result = histograms[0].copy()
+        for histogram in histograms[1:]:
+            result.merge(histogram)
+        return result
+
+    def allreduce(self, comm) -> "Histogram":
+        """
+        Combine the histograms from every rank of an MPI communicator (e.g. mpi4py's MPI.COMM_WORLD).
+
+        Every rank receives the same combined histogram, merged in rank order.
+        """
+        return Histogram.merge_all([Histogram.from_dict(state) for state in comm.allgather(self.to_dict())])
+
+    def to_dict(self) -> Dict[str, Union[bool, np.ndarray, List[np.ndarray]]]:
+        """
+        State of the histogram as a dictionary of arrays (e.g. for sending between processes).
+        """
+        state = { "edges": [axis_edges.copy() for axis_edges in self.__edges], "track_values": self.__track_values, "counts": self.__counts.copy(), "totals": self.__totals.copy() }
+        if self.__track_values:
+            state["weighted_value_sums"] = self.__weighted_value_sums.copy()
+            state["value_means"] = self.__value_means.copy()
+            state["value_squared_deviations"] = self.__value_squared_deviations.copy()
+        return state
+
+    @staticmethod
+    def from_dict(state: Dict[str, Union[bool, np.ndarray, List[np.ndarray]]]) -> "Histogram":
+        histogram = Histogram(*state["edges"], track_values = bool(state["track_values"]))
+        histogram.__combine(np.asarray(state["counts"], dtype = np.int64), np.asarray(state["totals"], dtype = np.float64), state.get("weighted_value_sums"), state.get("value_means"), state.get("value_squared_deviations"))
+        return histogram
+
+    def save(self, filepath: str, group: str = "histogram", mode: str = "a"):
+        """
+        Write the histogram to a group of an HDF5 file (replacing any existing group of the same name).
+        """
+        state = self.to_dict()
+        with h5py.File(filepath, mode) as file:
+            if group in file:
+                del file[group]
+            histogram_group = file.create_group(group)
+            histogram_group.attrs["ndim"] = self.ndim
+            histogram_group.attrs["track_values"] = self.__track_values
+            for i, axis_edges in enumerate(state.pop("edges")):
+                histogram_group.create_dataset(f"edges_{i}", data = axis_edges)
+            state.pop("track_values")
+            for name, array in state.items():
+                histogram_group.create_dataset(name, data = array)
+
+    @staticmethod
+    def load(filepath: str, group: str = "histogram") -> "Histogram":
+        """
+        Read a histogram written by save.
+        """
+        with h5py.File(filepath, "r") as file:
+            histogram_group = file[group]
+            state = { name: histogram_group[name][...] for name in histogram_group.keys() if not name.startswith("edges_") }
+            state["edges"] = [histogram_group[f"edges_{i}"][...] for i in range(int(histogram_group.attrs["ndim"]))]
+            state["track_values"] = bool(histogram_group.attrs["track_values"])
+        return Histogram.from_dict(state)
@@ -0,0 +1,142 @@
+"""
+File: periodic_geometry.py
+
+Author: Christopher Rowe
+Vesion: 1.2.0
+Date:   19/10/2026
+
+Minimum image displacements and distances within a periodic box, and
+joins from particles to the haloes they are associated with.
+
+All (N, 3) arrays are processed one axis at a time so no more than a
+single length N temporary is allocated. Values must be provided in
+consistent units.
+
+Public API:
+
+    wrap_positions(numpy.ndarray, float|numpy.ndarray)
+    wrap_displacements(numpy.ndarray, float|numpy.ndarray)
+    periodic_displacements(numpy.ndarray, numpy.ndarray, float|numpy.ndarray)
+    displacement_magnitudes(numpy.ndarray)
+    wrapped_bounding_boxes(numpy.ndarray, numpy.ndarray, float|numpy.ndarray)
+    match_halo_rows(numpy.ndarray, numpy.ndarray)
+    halo_centres_by_particle(numpy.ndarray, numpy.ndarray, numpy.ndarray)
+
+Dependancies:
+
+    itertools
+    numpy
+    typing
+"""
+
+import itertools
+import numpy as np
+from typing import List, Union, Tuple
+
+def _box_size_by_axis(box_size: Union[float, np.ndarray], n_axes: int) -> np.ndarray:
+    box_size = np.asarray(box_size, dtype = np.float64)
+    if box_size.ndim == 0:
+        return np.full(n_axes, float(box_size))
+    if box_size.shape[0] != n_axes:
+        raise ValueError(f"Box size has {box_size.shape[0]} elements but the vectors have {n_axes} axes.")
+    return box_size
+
+def wrap_positions(positions: np.ndarray, box_size: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    Copy of the (N, 3) positions wrapped into [0, box_size) along each axis, as required by cKDTree's boxsize.
+    """
+    box_size = _box_size_by_axis(box_size, positions.shape[1])
+    wrapped = np.mod(positions, box_size)
+    # Tiny negative values round to exactly the box size
+    wrapped[wrapped >= box_size] = 0.0
+    return wrapped
+
+def wrap_displacements(displacements: np.ndarray, box_size: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    Convert displacement vectors to their minimum image equivalent in place.
+
+    Returns the (modified) input array.
+    """
+    box_size = _box_size_by_axis(box_size, displacements.shape[1])
+    for axis in range(displacements.shape[1]):
+        column = displacements[:, axis]
+        box_shifts = np.round(column / box_size[axis])
+        box_shifts *= box_size[axis]
+        column -= box_shifts
+    return displacements
+
+def periodic_displacements(positions: np.ndarray, centres: np.ndarray, box_size: Union[float, np.ndarray], out: Union[np.ndarray, None] = None) -> np.ndarray:
+    """
+    Minimum image displacement of each position from its centre.
+
+    Centres may be a single (3,) vector or an (N, 3) array matching the positions.
+    Pass out = positions to overwrite the positions.
+    """
+    out = np.subtract(positions, centres, out = out)
+    return wrap_displacements(out, box_size)
+
+def displacement_magnitudes(displacements: np.ndarray) -> np.ndarray:
+    """
+    Length of each vector in an (N, 3) array.
+    """
+    magnitudes = np.square(displacements[:, 0])
+    for axis in range(1, displacements.shape[1]):
+        magnitudes += np.square(displacements[:, axis])
+    return np.sqrt(magnitudes, out = magnitudes)
+
+def wrapped_bounding_boxes(lower: np.ndarray, upper: np.ndarray, box_size: Union[float, np.ndarray]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Split an axis aligned box that may extend outside of the periodic box into boxes that lie within [0, box_size].
+
+    Infinite bounds and extents larger than the box cover the whole of that axis.
+    Returns a list of up to 8 (lower, upper) pairs.
+    """
+    box_size = _box_size_by_axis(box_size, len(lower))
+    axis_intervals = []
+    for axis in range(len(lower)):
+        width = upper[axis] - lower[axis]
+        if not np.isfinite(width) or width >= box_size[axis]:
+            axis_intervals.append([(0.0, box_size[axis])])
+            continue
+        start = np.mod(lower[axis], box_size[axis])
+        end = start + width
+        if end <= box_size[axis]:
+            axis_intervals.append([(start, end)])
+        else:
+            axis_intervals.append([(start, box_size[axis]), (0.0, end - box_size[axis])])
+
+    return [(np.array([interval[0] for interval in intervals]), np.array([interval[1] for interval in intervals])) for intervals in itertools.product(*axis_intervals)]
+
+def match_halo_rows(particle_halo_ids: np.ndarray, halo_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sorted join between the halo ID of each particle and a catalogue's halo IDs.
+
+    Returns the catalogue row for each particle and a boolean array indicating which particles were matched.
+    Rows for unmatched particles are set to -1.
+    Runs in O(N log N_halo) time.
+    """
+    sorted_order = np.argsort(halo_ids)
+    sorted_halo_ids = halo_ids[sorted_order]
+
+    if sorted_halo_ids.shape[0] == 0:
+        return np.full(particle_halo_ids.shape[0], -1, dtype = np.int64), np.full(particle_halo_ids.shape[0], False)
+
+    sorted_positions = np.searchsorted(sorted_halo_ids, particle_halo_ids)
+    sorted_positions[sorted_positions == sorted_halo_ids.shape[0]] = 0
+    matched = sorted_halo_ids[sorted_positions] == particle_halo_ids
+
+    halo_rows = sorted_order[sorted_positions]
+    halo_rows[~matched] = -1
+
+    return halo_rows, matched
+
+def halo_centres_by_particle(particle_halo_ids: np.ndarray, halo_ids: np.ndarray, halo_centres: np.ndarray, missing_value: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Look up the centre of the halo associated with each particle.
+
+    Returns an (N, 3) array of centres (missing_value where no halo was matched) and the matched filter.
+    """
+    halo_rows, matched = match_halo_rows(particle_halo_ids, halo_ids)
+    centres = np.full((particle_halo_ids.shape[0], halo_centres.shape[1]), missing_value, dtype = halo_centres.dtype)
+    centres[matched] = halo_centres[halo_rows[matched]]
+    return centres, matched
@@ -0,0 +1,72 @@
+"""
+File: smoothing_lengths.py
+
+Author: Christopher Rowe
+Vesion: 1.0.1
+Date:   19/10/2026
+
+Generation of approximate smoothing lengths for particle types that do
+not have them (e.g. dark matter).
+
+The method is the same as swiftsimio's generate_smoothing_lengths, but
+the neighbour search can be restricted to a subset of target particles,
+with the remaining particles only acting as neighbours. This allows
+smoothing lengths to be generated for a region using only the particles
+in and around it.
+
+Public API:
+
+    calculate_kernel_gamma(int, float)
+    generate_smoothing_lengths(numpy.ndarray, float|numpy.ndarray, float)
+
+Dependancies:
+
+    numpy
+    periodic_geometry.py (local file)
+    scipy
+    typing
+"""
+
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import Union
+
+from .periodic_geometry import wrap_positions, _box_size_by_axis
+
+# Number of particles queried at once (each query returns one distance per neighbour)
+DEFAULT_QUERY_BLOCK_SIZE = 65536
+
+def calculate_kernel_gamma(target_number_of_neighbours: int, kernel_eta: float) -> float:
+    """
+    Ratio of the kernel's support radius to the smoothing length, from the hydro scheme's "Kernel target N_ngb" and "Kernel eta" parameters.
+    """
+    return ((3.0 * target_number_of_neighbours) / (4.0 * 3.14159))**(1/3) / kernel_eta
+
+def generate_smoothing_lengths(coordinates: np.ndarray, box_size: Union[float, np.ndarray], kernel_gamma: float, neighbours: int = 32, speedup_factor: int = 2, targets: Union[np.ndarray, None] = None, block_size: int = DEFAULT_QUERY_BLOCK_SIZE) -> np.ndarray:
+    """
+    Smoothing lengths enclosing (approximately) the specified number of neighbours.
+
+    Only the particles indexed by targets (all particles if not specified) have their smoothing lengths calculated,
+    but all of the coordinates are used as neighbours. Targets should be far enough from the edge of the coordinates
+    provided (other than at the edges of the periodic box) that their neighbours are included.
+
+    Returns a float32 array with one value per target in the same units as the coordinates.
+    """
+    box_size = _box_size_by_axis(box_size, 3)
+    coordinates = wrap_positions(coordinates, box_size)
+    if targets is None:
+        targets = np.arange(coordinates.shape[0])
+
+    tree = cKDTree(coordinates, boxsize = box_size)
+
+    # Search for fewer neighbours and scale the distance to approximate the full number
+    neighbours_searched = neighbours // speedup_factor
+    speedup_correction = speedup_factor**(1 / 3)
+
+    smoothing_lengths = np.empty(targets.shape[0], dtype = np.float32)
+    for start in range(0, targets.shape[0], block_size):
+        end = min(start + block_size, targets.shape[0])
+        distances, _ = tree.query(coordinates[targets[start : end]], k = neighbours_searched, workers = -1)
+        smoothing_lengths[start : end] = distances[:, -1] if distances.ndim > 1 else distances
+
+    return smoothing_lengths * np.float32(speedup_correction / kernel_gamma)
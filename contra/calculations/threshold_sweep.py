@@ -0,0 +1,97 @@
+"""
+File: threshold_sweep.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Number (or total weight) of values above any number of thresholds.
+
+The values are sorted once, after which the number of values at or
+above each threshold is found by a binary search and the total weight
+from a cumulative sum. Subsets of the values (e.g. particles that are
+tracked) are identified by named filters, so fractions of the values
+above a threshold that pass a filter need only O(N) memory regardless
+of the number of thresholds.
+
+Public API:
+
+    class ThresholdSweep
+
+Dependancies:
+
+    numpy
+    typing
+"""
+
+import numpy as np
+from typing import Dict, Union
+
+class ThresholdSweep(object):
+    """
+    Sorted values (and optionally weights) for all items and for each named filter (boolean arrays with one element per item).
+
+    NaN values are ignored. The unfiltered values are identified by the name None.
+    """
+
+    def __init__(self, values: np.ndarray, weights: Union[np.ndarray, None] = None, filters: Union[Dict[str, np.ndarray], None] = None):
+        values = np.asarray(values)
+        valid = ~np.isnan(values) if np.issubdtype(values.dtype, np.floating) else np.full(values.shape, True)
+        weights = np.asarray(weights, dtype = np.float64) if weights is not None else None
+        self.__has_weights = weights is not None
+
+        self.__sorted_values: Dict[Union[str, None], np.ndarray] = {}
+        self.__cumulative_weights: Dict[Union[str, None], np.ndarray] = {}
+        for name, item_filter in [(None, valid), *((name, valid & np.asarray(item_filter, dtype = bool)) for name, item_filter in (filters if filters is not None else {}).items())]:
+            order = np.argsort(values[item_filter], kind = "stable")
+            self.__sorted_values[name] = values[item_filter][order]
+            if self.__has_weights:
+                self.__cumulative_weights[name] = np.append(0.0, np.cumsum(weights[item_filter][order]))
+
+    @property
+    def filters(self):
+        return [name for name in self.__sorted_values if name is not None]
+
+    def __n_below(self, thresholds: np.ndarray, name: Union[str, None], inclusive: bool) -> np.ndarray:
+        """
+        Number of sorted values below (or at, if inclusive) each threshold.
+        """
+        return np.searchsorted(self.__sorted_values[name], thresholds, side = "right" if inclusive else "left")
+
+    def count_above(self, thresholds: np.ndarray, name: Union[str, None] = None, inclusive: bool = True) -> np.ndarray:
+        """
+        Number of values at or above (or strictly above, if not inclusive) each threshold.
+        """
+        return self.__sorted_values[name].shape[0] - self.__n_below(thresholds, name, not inclusive)
+
+    def count_below(self, thresholds: np.ndarray, name: Union[str, None] = None, inclusive: bool = False) -> np.ndarray:
+        """
+        Number of values below (or at or below, if inclusive) each threshold.
+        """
+        return self.__n_below(thresholds, name, inclusive)
+
+    def total_above(self, thresholds: np.ndarray, name: Union[str, None] = None, inclusive: bool = True) -> np.ndarray:
+        """
+        Sum of the weights of the values at or above (or strictly above, if not inclusive) each threshold.
+        """
+        if not self.__has_weights:
+            raise ValueError("No weights were specified.")
+        cumulative_weights = self.__cumulative_weights[name]
+        return cumulative_weights[-1] - cumulative_weights[self.__n_below(thresholds, name, not inclusive)]
+
+    def fraction_above(self, thresholds: np.ndarray, name: str, of: Union[str, None] = None, inclusive: bool = True, weighted: bool = False) -> np.ndarray:
+        """
+        Fraction of the values above each threshold (from the filter named by of, or all values) that pass the named filter.
+
+        The fraction is NaN where there are no values above a threshold.
+        """
+        if weighted:
+            numerator = self.total_above(thresholds, name, inclusive)
+            denominator = self.total_above(thresholds, of, inclusive)
+        else:
+            numerator = self.count_above(thresholds, name, inclusive)
+            denominator = self.count_above(thresholds, of, inclusive)
+        result = np.full(np.shape(thresholds), np.nan)
+        non_zero = denominator != 0
+        result[non_zero] = numerator[non_zero] / denominator[non_zero]
+        return result
@@ -1,2 +1,5 @@
 from .box_region import BoxRegion
-from .swift_particle_filtering import ParticleFilter
\ No newline at end of file
+from .swift_particle_filtering import ParticleFilter
+from .particle_selection import ParticleSelection
+from .selection_store import SelectionStore
+from .spatial_regions import SpatialRegion, PeriodicBoxRegion, SlabRegion, SphereRegion, CylinderRegion, select_regions
@@ -2,11 +2,15 @@
 File: box_region.py
 
 Author: Christopher Rowe
-Vesion: 1.5.3
-Date:   27/03/2023
+Vesion: 1.9.1
+Date:   19/10/2026
 
 Convinence functions for handeling spatial regions within a cosmological box.
 
+Selections from a snapshot can be made using the top-level cell
+metadata, so that only particles in cells on the region's boundary need
+their coordinates read and tested.
+
 Public API:
 
     BoxRegion (class)
@@ -15,7 +19,12 @@ Public API:
 Dependancies:
 
     QuasarCode
+    h5py (optional)
     numpy
+    particle_selection.py (local file)
+    periodic_geometry.py (local file)
+    swift_cell_metadata.py (local file)
+    swift_parttype_enum.py (local file)
     swiftsimio (optional)
     typing
     unyt (optional)
@@ -24,14 +33,27 @@ Dependancies:
 import numpy as np
 from typing import Union, List
 
+from ..calculations.periodic_geometry import wrapped_bounding_boxes
+from ..io.swift_parttype_enum import PartType
+from .particle_selection import ParticleSelection
+
 SWIFTSIMIO_AVALIBLE = False
 try:
+    import h5py
     import swiftsimio as sw
     import unyt
     from unyt import unyt_quantity
+    from ..io.swift_cell_metadata import SWIFTCellMetadata
     SWIFTSIMIO_AVALIBLE = True
 except ImportError: pass
 
+def _bound_value(value, unit: str, default: float) -> float:
+    if value is None:
+        return default
+    if hasattr(value, "to"):
+        return float(value.to(unit).value)
+    return float(value)
+
 
 class BoxRegion(object):
     def __init__(self, centre_x_position = None, centre_y_position = None, centre_z_position = None, side_length = None, x_min = None, x_max = None, y_min = None, y_max = None, z_min = None, z_max = None, x_side_length = None, y_side_length = None, z_side_length = None, **kwargs):
@@ -93,32 +115,51 @@ class BoxRegion(object):
         if self.__side_length[0] == self.__side_length[1] and self.__side_length[1] == self.__side_length[2]:
             self.__side_length = self.__side_length[0]
 
-    def make_array_filter(self, coord_2d_arr: np.array):
+    def make_array_filter(self, coord_2d_arr: np.array, box_size = None):
+        """
+        Test which coordinates are within the region.
+
+        If the box size is specified, bounds that extend outside of the box wrap around to the other side.
+        """
         arr_filter = np.full(coord_2d_arr.shape[:-1], True, bool)
-        if self.__x_min is not None:
-            arr_filter = arr_filter & (coord_2d_arr[:, 0] >= self.__x_min)
-        if self.__x_max is not None:
-            arr_filter = arr_filter & (coord_2d_arr[:, 0] <= self.__x_max)
-        if self.__y_min is not None:
-            arr_filter = arr_filter & (coord_2d_arr[:, 1] >= self.__y_min)
-        if self.__y_max is not None:
-            arr_filter = arr_filter & (coord_2d_arr[:, 1] <= self.__y_max)
-        if self.__z_min is not None:
-            arr_filter = arr_filter & (coord_2d_arr[:, 2] >= self.__z_min)
-        if self.__z_max is not None:
-            arr_filter = arr_filter & (coord_2d_arr[:, 2] <= self.__z_max)
+        for axis, (lower, upper) in enumerate(((self.__x_min, self.__x_max), (self.__y_min, self.__y_max), (self.__z_min, self.__z_max))):
+            lower = lower if lower is not None and lower != -np.inf else None
+            upper = upper if upper is not None and upper != np.inf else None
+            if box_size is not None and lower is not None and upper is not None:
+                axis_box_size = box_size[axis] if np.ndim(box_size) > 0 else box_size
+                if upper - lower >= axis_box_size:
+                    continue
+                # Distance above the lower bound, measured periodically
+                offsets = coord_2d_arr[:, axis] - lower
+                offsets %= axis_box_size
+                arr_filter &= offsets <= upper - lower
+            else:
+                if lower is not None:
+                    arr_filter &= coord_2d_arr[:, axis] >= lower
+                if upper is not None:
+                    arr_filter &= coord_2d_arr[:, axis] <= upper
         return arr_filter
 
     def constrain_mask(self, mask):
+        """
+        Restrict a swiftsimio mask to the region. Bounds that extend outside of the box select the cells on the other side of the box.
+        """
         if not SWIFTSIMIO_AVALIBLE:
             raise NotImplementedError("The swiftsimio and unyt package is required to use this method.")
 
         box_size = mask.metadata.boxsize
-        box_size_units = box_size[0].units.__repr__()
-        
-        return mask.constrain_spatial([[unyt.unyt_quantity(self.__x_min if (self.__x_min is not None and self.__x_min != -np.inf) else 0, box_size[0].units.__repr__()), unyt.unyt_quantity(self.__x_max if (self.__x_max is not None and self.__x_max != np.inf) else box_size[0], box_size_units)],
-                                       [unyt.unyt_quantity(self.__y_min if (self.__y_min is not None and self.__y_min != -np.inf) else 0, box_size[1].units.__repr__()), unyt.unyt_quantity(self.__y_max if (self.__y_max is not None and self.__y_max != np.inf) else box_size[1], box_size_units)],
-                                       [unyt.unyt_quantity(self.__z_min if (self.__z_min is not None and self.__z_min != -np.inf) else 0, box_size[2].units.__repr__()), unyt.unyt_quantity(self.__z_max if (self.__z_max is not None and self.__z_max != np.inf) else box_size[2], box_size_units)]])
+        box_size_units = box_size.units
+        box_size_values = box_size.value
+        lower = [_bound_value(value, box_size_units, -np.inf) for value in (self.__x_min, self.__y_min, self.__z_min)]
+        upper = [_bound_value(value, box_size_units, np.inf) for value in (self.__x_max, self.__y_max, self.__z_max)]
+        for axis in range(3):
+            # Unbounded sides are limited by the edges of the box
+            if lower[axis] == -np.inf: lower[axis] = 0.0
+            if upper[axis] == np.inf: upper[axis] = box_size_values[axis]
+
+        for i, (box_lower, box_upper) in enumerate(wrapped_bounding_boxes(np.array(lower), np.array(upper), box_size_values)):
+            mask.constrain_spatial([[unyt.unyt_quantity(box_lower[axis], box_size_units), unyt.unyt_quantity(box_upper[axis], box_size_units)] for axis in range(3)], intersect = i > 0)
+        return mask
 
     def complete_bounds_from_coords(self, coord_2d_arr: np.ndarray):
         if self.__x_min is None: self.x_min = np.min(coord_2d_arr[:, 0])
@@ -129,6 +170,112 @@ class BoxRegion(object):
         if self.__z_max is None: self.z_max = np.max(coord_2d_arr[:, 2])
         self.__set_calculated_attributes()
 
+    def complete_bounds_from_box_size(self, box_size, unit: str = "Mpc"):
+        """
+        Set any missing bounds to the edges of the box. Avoids reading the particle coordinates.
+        """
+        if np.ndim(box_size) == 0:
+            box_size = [box_size] * 3
+        box_size = [_bound_value(box_size[i], unit, None) for i in range(3)]
+        # Match the type of any bounds already specified
+        if any(hasattr(value, "units") for value in (self.__x_min, self.__x_max, self.__y_min, self.__y_max, self.__z_min, self.__z_max)):
+            make_value = lambda value: unyt_quantity(value, unit)
+        else:
+            make_value = lambda value: value
+        if self.__x_min is None: self.x_min = make_value(0.0)
+        if self.__x_max is None: self.x_max = make_value(box_size[0])
+        if self.__y_min is None: self.y_min = make_value(0.0)
+        if self.__y_max is None: self.y_max = make_value(box_size[1])
+        if self.__z_min is None: self.z_min = make_value(0.0)
+        if self.__z_max is None: self.z_max = make_value(box_size[2])
+        self.__set_calculated_attributes()
+
+    def expanded(self, margin: float, unit: str = "Mpc") -> "BoxRegion":
+        """
+        Create a new region with every finite bound moved outwards by the margin. Bounds of the new region are in the specified unit.
+        """
+        lower, upper = self.__bound_arrays(unit)
+        lower -= margin
+        upper += margin
+        return BoxRegion(x_min = lower[0], x_max = upper[0], y_min = lower[1], y_max = upper[1], z_min = lower[2], z_max = upper[2])
+
+    def translated(self, offset: List[float], unit: str = "Mpc") -> "BoxRegion":
+        """
+        Create a new region with every bound moved by the (x, y, z) offset. Bounds of the new region are in the specified unit.
+
+        Unspecified bounds remain unspecified.
+        """
+        move = lambda value, axis: _bound_value(value, unit, None) + float(offset[axis]) if value is not None else None
+        return BoxRegion(x_min = move(self.__x_min, 0), x_max = move(self.__x_max, 0), y_min = move(self.__y_min, 1), y_max = move(self.__y_max, 1), z_min = move(self.__z_min, 2), z_max = move(self.__z_max, 2))
+
+    def __bound_arrays(self, unit: str):
+        lower = np.array([_bound_value(value, unit, -np.inf) for value in (self.__x_min, self.__y_min, self.__z_min)])
+        upper = np.array([_bound_value(value, unit, np.inf) for value in (self.__x_max, self.__y_max, self.__z_max)])
+        return lower, upper
+
+    def __wrapped_bound_arrays(self, unit: str, box_size: np.ndarray):
+        """
+        Boxes within [0, box_size] that together cover the region. Unbounded sides are limited by the edges of the box.
+        """
+        lower, upper = self.__bound_arrays(unit)
+        lower[lower == -np.inf] = 0.0
+        upper = np.where(upper == np.inf, box_size, upper)
+        return wrapped_bounding_boxes(lower, upper, box_size)
+
+    def classify_cells(self, cells: "SWIFTCellMetadata", length_unit_to_region_unit: float, unit: str = "Mpc", box_size = None):
+        """
+        Find the cells entirely within the region and those only partly within it.
+
+        If the box size (in the region's unit) is specified, bounds that extend outside of the box wrap around to the other side.
+        Returns (inside, boundary) boolean arrays with one element per cell.
+        """
+        cell_min = cells.min_positions * length_unit_to_region_unit
+        cell_max = cells.max_positions * length_unit_to_region_unit
+        populated = cells.counts > 0
+        overlapping = np.full(len(cells), False)
+        inside = np.full(len(cells), False)
+        for lower, upper in (self.__wrapped_bound_arrays(unit, np.broadcast_to(np.asarray(box_size, dtype = np.float64), (3,))) if box_size is not None else [self.__bound_arrays(unit)]):
+            overlapping |= np.all((cell_max >= lower) & (cell_min <= upper), axis = 1)
+            inside |= np.all((cell_min >= lower) & (cell_max <= upper), axis = 1)
+        overlapping &= populated
+        inside &= populated
+        return inside, overlapping & ~inside
+
+    def make_cell_selection(self, particle_data: "sw.SWIFTDataset", part_type: PartType, unit: str = "Mpc") -> ParticleSelection:
+        """
+        Select the particles of one type within the region from an unmasked snapshot.
+
+        Particles in cells entirely within the region are selected without being read.
+        Only the coordinates of particles in cells on the region's boundary are read and tested.
+        Bounds that extend outside of the box wrap around to the other side.
+        """
+        if not SWIFTSIMIO_AVALIBLE:
+            raise NotImplementedError("The swiftsimio and unyt package is required to use this method.")
+
+        filepath = str(particle_data.metadata.filename)
+        cells = SWIFTCellMetadata(filepath, part_type)
+        length_unit_to_region_unit = float(unyt.unyt_quantity(1.0, particle_data.metadata.units.length).to(unit).value)
+        box_size = np.asarray(particle_data.metadata.boxsize.to(unit).value, dtype = np.float64)
+        inside, boundary = self.classify_cells(cells, length_unit_to_region_unit, unit, box_size)
+        # Bounds as plain values in the region's unit, for comparison with the coordinates read from the file
+        in_unit = lambda value: _bound_value(value, unit, None) if value is not None else None
+        region = BoxRegion(x_min = in_unit(self.__x_min), x_max = in_unit(self.__x_max), y_min = in_unit(self.__y_min), y_max = in_unit(self.__y_max), z_min = in_unit(self.__z_min), z_max = in_unit(self.__z_max))
+
+        inside_ranges = SWIFTCellMetadata.merge_ranges(cells.offsets[inside], cells.offsets[inside] + cells.counts[inside])
+        boundary_ranges = SWIFTCellMetadata.merge_ranges(cells.offsets[boundary], cells.offsets[boundary] + cells.counts[boundary])
+
+        boundary_indices = []
+        with h5py.File(filepath, "r") as file:
+            coordinates = file[f"PartType{part_type.value}/Coordinates"]
+            n_particles = coordinates.shape[0]
+            for start, end in boundary_ranges:
+                boundary_indices.append(start + np.where(region.make_array_filter(coordinates[start : end] * length_unit_to_region_unit, box_size))[0])
+
+        selection = ParticleSelection.from_ranges(inside_ranges, n_particles)
+        if len(boundary_indices) > 0:
+            selection = selection.union(ParticleSelection.from_indices(np.concatenate(boundary_indices), n_particles))
+        return selection
+
     @property
     def x_min(self) -> float:
         return self.__x_min
@@ -189,6 +336,13 @@ class BoxRegion(object):
         self.__z_max = value
         self.__set_calculated_attributes()
 
+    @property
+    def bounds(self) -> List[Union[float, None]]:
+        """
+        [x_min, x_max, y_min, y_max, z_min, z_max]
+        """
+        return [float(value) if value is not None else None for value in (self.__x_min, self.__x_max, self.__y_min, self.__y_max, self.__z_min, self.__z_max)]
+
     @property
     def side_length(self) -> Union[float, List[float]]:
         return self.__side_length
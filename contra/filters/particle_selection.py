@@ -0,0 +1,240 @@
+"""
+File: particle_selection.py
+
+Author: Christopher Rowe
+Vesion: 1.2.0
+Date:   19/10/2026
+
+Compact representation of a selection of particles from a dataset.
+
+The selection is stored as whichever of a packed bitmap, a sorted
+index array or a list of [start, end) ranges is smallest for its
+density.
+
+Public API:
+
+    class ParticleSelection
+
+Dependancies:
+
+    numpy
+"""
+
+import numpy as np
+
+class ParticleSelection(object):
+    """
+    Selection of items from an array of a known length.
+
+    Indices are cached when first requested so that many fields may be gathered without recomputing them.
+    """
+
+    BITMAP = "bitmap"
+    INDICES = "indices"
+    RANGES = "ranges"
+
+    def __init__(self, n_total: int, representation: str, data: np.ndarray, n_selected: int):
+        if representation not in (ParticleSelection.BITMAP, ParticleSelection.INDICES, ParticleSelection.RANGES):
+            raise ValueError(f"Unknown selection representation \"{representation}\".")
+        self.__n_total = int(n_total)
+        self.__representation = representation
+        self.__data = data
+        self.__n_selected = int(n_selected)
+        self.__cached_indices = data if representation == ParticleSelection.INDICES else None
+
+    @staticmethod
+    def _index_dtype(n_total: int):
+        return np.int32 if n_total < 2**31 else np.int64
+
+    @staticmethod
+    def from_indices(indices: np.ndarray, n_total: int) -> "ParticleSelection":
+        """
+        Create from a sorted array of unique indices.
+        """
+        indices = np.asarray(indices, dtype = ParticleSelection._index_dtype(n_total))
+        n_selected = indices.shape[0]
+        n_runs = 0 if n_selected == 0 else int((np.diff(indices) != 1).sum()) + 1
+
+        bitmap_bytes = (n_total + 7) // 8
+        indices_bytes = n_selected * indices.itemsize
+        ranges_bytes = n_runs * 2 * indices.itemsize
+
+        if ranges_bytes < indices_bytes and ranges_bytes <= bitmap_bytes:
+            run_breaks = np.where(np.diff(indices) != 1)[0] + 1
+            starts = indices[np.append(0, run_breaks)]
+            ends = indices[np.append(run_breaks - 1, n_selected - 1)] + 1
+            return ParticleSelection(n_total, ParticleSelection.RANGES, np.stack((starts, ends), axis = 1), n_selected)
+        elif indices_bytes <= bitmap_bytes:
+            return ParticleSelection(n_total, ParticleSelection.INDICES, indices, n_selected)
+        else:
+            bool_filter = np.full(n_total, False)
+            bool_filter[indices] = True
+            return ParticleSelection(n_total, ParticleSelection.BITMAP, np.packbits(bool_filter), n_selected)
+
+    @staticmethod
+    def from_bool(bool_filter: np.ndarray) -> "ParticleSelection":
+        bool_filter = np.asarray(bool_filter, dtype = bool)
+        return ParticleSelection.from_indices(np.where(bool_filter)[0], bool_filter.shape[0])
+
+    @staticmethod
+    def from_ranges(ranges: np.ndarray, n_total: int) -> "ParticleSelection":
+        """
+        Create from a sorted (N, 2) array of non-overlapping [start, end) ranges.
+        """
+        ranges = np.asarray(ranges, dtype = ParticleSelection._index_dtype(n_total)).reshape((-1, 2))
+        ranges = ranges[ranges[:, 1] > ranges[:, 0]]
+        n_selected = int((ranges[:, 1] - ranges[:, 0]).sum())
+        if n_selected == 0:
+            return ParticleSelection.none(n_total)
+        return ParticleSelection(n_total, ParticleSelection.RANGES, ranges, n_selected)
+
+    @staticmethod
+    def all(n_total: int) -> "ParticleSelection":
+        if n_total == 0:
+            return ParticleSelection.none(0)
+        return ParticleSelection(n_total, ParticleSelection.RANGES, np.array([[0, n_total]], dtype = ParticleSelection._index_dtype(n_total)), n_total)
+
+    @staticmethod
+    def none(n_total: int) -> "ParticleSelection":
+        return ParticleSelection(n_total, ParticleSelection.INDICES, np.empty(0, dtype = ParticleSelection._index_dtype(n_total)), 0)
+
+    def __len__(self):
+        return self.__n_selected
+
+    @property
+    def n_total(self) -> int:
+        return self.__n_total
+
+    @property
+    def representation(self) -> str:
+        return self.__representation
+
+    @property
+    def nbytes(self) -> int:
+        return self.__data.nbytes
+
+    @property
+    def indices(self) -> np.ndarray:
+        """
+        Sorted indices of the selected items (cached).
+        """
+        if self.__cached_indices is None:
+            if self.__representation == ParticleSelection.BITMAP:
+                self.__cached_indices = np.where(np.unpackbits(self.__data, count = self.__n_total).view(bool))[0].astype(ParticleSelection._index_dtype(self.__n_total))
+            else:
+                lengths = self.__data[:, 1] - self.__data[:, 0]
+                # Offset each item of a run from the start of the run
+                run_offsets = np.repeat(self.__data[:, 0] - np.cumsum(np.append(0, lengths[:-1])), lengths)
+                self.__cached_indices = (np.arange(self.__n_selected, dtype = self.__data.dtype) + run_offsets).astype(ParticleSelection._index_dtype(self.__n_total))
+        return self.__cached_indices
+
+    def clear_cache(self):
+        if self.__representation != ParticleSelection.INDICES:
+            self.__cached_indices = None
+
+    def to_bool(self) -> np.ndarray:
+        if self.__representation == ParticleSelection.BITMAP:
+            return np.unpackbits(self.__data, count = self.__n_total).view(bool)
+        bool_filter = np.full(self.__n_total, False)
+        if self.__representation == ParticleSelection.RANGES:
+            for start, end in self.__data:
+                bool_filter[start : end] = True
+        else:
+            bool_filter[self.__data] = True
+        return bool_filter
+
+    def contains(self, indices: np.ndarray) -> np.ndarray:
+        """
+        Test whether each of the specified indices is selected.
+        """
+        indices = np.asarray(indices)
+        if self.__representation == ParticleSelection.BITMAP:
+            return ((self.__data[indices >> 3] >> (7 - (indices & 7))) & 1).astype(bool)
+        elif self.__representation == ParticleSelection.RANGES:
+            run_indexes = np.searchsorted(self.__data[:, 0], indices, side = "right") - 1
+            valid_runs = run_indexes >= 0
+            result = np.full(indices.shape, False)
+            result[valid_runs] = indices[valid_runs] < self.__data[run_indexes[valid_runs], 1]
+            return result
+        else:
+            if self.__n_selected == 0:
+                return np.full(indices.shape, False)
+            positions = np.searchsorted(self.__data, indices)
+            positions[positions == self.__n_selected] = 0
+            return self.__data[positions] == indices
+
+    def __check_compatible(self, other: "ParticleSelection"):
+        if other.n_total != self.__n_total:
+            raise ValueError(f"Selections are of arrays with different lengths ({self.__n_total} and {other.n_total}).")
+
+    def intersection(self, other: "ParticleSelection") -> "ParticleSelection":
+        self.__check_compatible(other)
+        if self.__representation == ParticleSelection.BITMAP and other.representation == ParticleSelection.BITMAP:
+            return ParticleSelection.from_indices(np.where(np.unpackbits(self.__data & other._data, count = self.__n_total).view(bool))[0], self.__n_total)
+        # Test the smaller selection against the larger one
+        smaller, larger = (self, other) if len(self) <= len(other) else (other, self)
+        smaller_indices = smaller.indices
+        return ParticleSelection.from_indices(smaller_indices[larger.contains(smaller_indices)], self.__n_total)
+
+    def union(self, other: "ParticleSelection") -> "ParticleSelection":
+        self.__check_compatible(other)
+        if self.__representation == ParticleSelection.BITMAP and other.representation == ParticleSelection.BITMAP:
+            return ParticleSelection.from_indices(np.where(np.unpackbits(self.__data | other._data, count = self.__n_total).view(bool))[0], self.__n_total)
+        return ParticleSelection.from_indices(np.union1d(self.indices, other.indices), self.__n_total)
+
+    def __and__(self, other: "ParticleSelection") -> "ParticleSelection":
+        return self.intersection(other)
+
+    def __or__(self, other: "ParticleSelection") -> "ParticleSelection":
+        return self.union(other)
+
+    def subset(self, subset_filter: np.ndarray) -> "ParticleSelection":
+        """
+        Apply a filter with one element per currently selected item.
+        """
+        if subset_filter.shape[0] != self.__n_selected:
+            raise ValueError(f"Subset filter has length {subset_filter.shape[0]} but {self.__n_selected} items are selected.")
+        return ParticleSelection.from_indices(self.indices[subset_filter], self.__n_total)
+
+    def gather(self, dataset: np.ndarray) -> np.ndarray:
+        """
+        Select items from a full length array.
+        """
+        if self.__representation == ParticleSelection.RANGES and self.__data.shape[0] == 1:
+            return dataset[self.__data[0, 0] : self.__data[0, 1]].copy()
+        return dataset[self.indices]
+
+    def chunks(self, chunk_size: int):
+        """
+        Split the selection into consecutive selections of at most chunk_size items (in the same order).
+
+        The full set of indices is not created for range or bitmap selections.
+        """
+        if self.__representation == ParticleSelection.INDICES:
+            for start in range(0, self.__n_selected, chunk_size):
+                yield ParticleSelection.from_indices(self.__data[start : start + chunk_size], self.__n_total)
+
+        elif self.__representation == ParticleSelection.RANGES:
+            run_ends = np.cumsum(self.__data[:, 1] - self.__data[:, 0])
+            for start in range(0, self.__n_selected, chunk_size):
+                end = min(start + chunk_size, self.__n_selected)
+                # Runs containing the first and last items of the chunk
+                first_run = int(np.searchsorted(run_ends, start, side = "right"))
+                last_run = int(np.searchsorted(run_ends, end, side = "left"))
+                ranges = self.__data[first_run : last_run + 1].copy()
+                ranges[-1, 1] = self.__data[last_run, 1] - (run_ends[last_run] - end)
+                ranges[0, 0] = self.__data[first_run, 1] - (run_ends[first_run] - start)
+                yield ParticleSelection.from_ranges(ranges, self.__n_total)
+
+        else:
+            # Blocks of the bitmap hold at most chunk_size items (unless chunk_size is less than 8)
+            block_bytes = max(1, chunk_size // 8)
+            for start_byte in range(0, self.__data.shape[0], block_bytes):
+                block = np.unpackbits(self.__data[start_byte : start_byte + block_bytes], count = min(block_bytes * 8, self.__n_total - start_byte * 8)).view(bool)
+                block_indices = np.where(block)[0] + start_byte * 8
+                for start in range(0, block_indices.shape[0], chunk_size):
+                    yield ParticleSelection.from_indices(block_indices[start : start + chunk_size], self.__n_total)
+
+    @property
+    def _data(self) -> np.ndarray:
+        return self.__data
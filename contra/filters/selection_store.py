@@ -0,0 +1,138 @@
+"""
+File: selection_store.py
+
+Author: Christopher Rowe
+Vesion: 1.2.0
+Date:   19/10/2026
+
+Persistent storage of named particle selections, allowing commands run
+against the same snapshot to reuse a selection instead of re-reading
+and re-evaluating the fields that define it.
+
+Each selection is keyed by the snapshot it was made from (path, size
+and modification time) and a definition of the filters that produced
+it. A stored selection is only reused if both still match.
+
+Selections index either the rows of the snapshot file or the rows of a
+masked dataset. The definition records which (see index_space), and a
+stored selection is rejected if it was made for an array of a
+different length.
+
+Public API:
+
+    class SelectionStore
+
+Dependancies:
+
+    h5py
+    hashlib
+    json
+    numpy
+    os
+    particle_selection.py (local file)
+    swiftsimio
+    typing
+"""
+
+import h5py
+import hashlib
+import json
+import numpy as np
+import os
+import swiftsimio as sw
+from typing import Callable, Union
+
+from .particle_selection import ParticleSelection
+
+# Default sidecar file, created in the working directory
+DEFAULT_SELECTION_FILE = "particle_selections.hdf5"
+class SelectionStore(object):
+    # Index space of selections made over the rows of the snapshot file
+    SNAPSHOT_INDEX_SPACE = "snapshot"
+
+    def __init__(self, filepath: str = DEFAULT_SELECTION_FILE):
+        self.__filepath = filepath
+
+    @property
+    def filepath(self) -> str:
+        return self.__filepath
+
+    @staticmethod
+    def make_definition_string(definition: dict) -> str:
+        return json.dumps(definition, sort_keys = True, default = str)
+
+    @staticmethod
+    def snapshot_key(snapshot_filepath: str) -> dict:
+        """
+        Attributes identifying a snapshot file (path, size and modification time), used by this and the other sidecar stores.
+        """
+        return { "Snapshot": os.path.abspath(snapshot_filepath), "SnapshotSize": os.path.getsize(snapshot_filepath), "SnapshotModificationTime": os.path.getmtime(snapshot_filepath) }
+
+    @staticmethod
+    def snapshot_key_matches(attributes, snapshot_filepath: str) -> bool:
+        """
+        Check whether the attributes (e.g. of an HDF5 group) were saved with the snapshot key of the file as it is now.
+        """
+        return all(key in attributes and attributes[key] == value for key, value in SelectionStore.snapshot_key(snapshot_filepath).items())
+
+    @staticmethod
+    def masked_index_space(rows: np.ndarray) -> str:
+        """
+        Identify the index space of a masked dataset from the row in the snapshot file of each of its particles.
+        """
+        return "masked:" + hashlib.sha1(np.ascontiguousarray(rows, dtype = np.int64).tobytes()).hexdigest()
+
+    def load(self, name: str, snapshot_filepath: str, definition: dict, n_total: Union[int, None] = None) -> Union[ParticleSelection, None]:
+        """
+        Retrive a selection. Returns None if it does not exist or was made from a different snapshot or definition.
+
+        If n_total is specified, selections of an array with a different length are also rejected.
+        """
+        if not os.path.isfile(self.__filepath):
+            return None
+        with h5py.File(self.__filepath, "r") as file:
+            if name not in file:
+                return None
+            group = file[name]
+            if not SelectionStore.snapshot_key_matches(group.attrs, snapshot_filepath):
+                return None
+            if group.attrs["Definition"] != SelectionStore.make_definition_string(definition):
+                return None
+            if n_total is not None and int(group.attrs["NTotal"]) != n_total:
+                return None
+            return ParticleSelection(int(group.attrs["NTotal"]), str(group.attrs["Representation"]), group["Data"][...], int(group.attrs["NSelected"]))
+
+    def save(self, name: str, selection: ParticleSelection, snapshot_filepath: str, definition: dict):
+        with h5py.File(self.__filepath, "a") as file:
+            if name in file:
+                del file[name]
+            group = file.create_group(name)
+            group.create_dataset("Data", data = selection._data)
+            group.attrs["Representation"] = selection.representation
+            group.attrs["NTotal"] = selection.n_total
+            group.attrs["NSelected"] = len(selection)
+            for key, value in SelectionStore.snapshot_key(snapshot_filepath).items():
+                group.attrs[key] = value
+            group.attrs["Definition"] = SelectionStore.make_definition_string(definition)
+
+    def get_or_create(self, name: Union[str, None], particle_data: sw.SWIFTDataset, definition: dict, create_selection: Callable[[], ParticleSelection], n_total: Union[int, None] = None) -> ParticleSelection:
+        """
+        Load the named selection if a valid one exists, otherwise create it and save it under that name.
+
+        The definition should include the selection's index space (SelectionStore.SNAPSHOT_INDEX_SPACE or masked_index_space)
+        and n_total the length of the array it selects from.
+        If no name is specified, the selection is created and not stored.
+        """
+        if name is None:
+            return create_selection()
+
+        snapshot_filepath = str(particle_data.metadata.filename)
+        selection = self.load(name, snapshot_filepath, definition, n_total)
+        if selection is None:
+            selection = create_selection()
+            self.save(name, selection, snapshot_filepath, definition)
+        return selection
+
+    @staticmethod
+    def get_command_params():
+        return [["selection", None, "Name of a saved particle selection to reuse.\nThe selection is created and saved if it does not exist or was\nmade from a different snapshot or with different filters.", False, False, None, None]]
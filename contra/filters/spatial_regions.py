@@ -0,0 +1,276 @@
+"""
+File: spatial_regions.py
+
+Author: Christopher Rowe
+Vesion: 1.0.1
+Date:   19/10/2026
+
+Regions of a periodic cosmological box.
+
+Particles are tested using their minimum image displacement from the
+region's centre, so regions that cross the edge of the box select
+particles from both sides. Coordinates are processed in blocks using a
+single scratch buffer.
+
+Public API:
+
+    class SpatialRegion
+    class PeriodicBoxRegion
+    class SlabRegion
+    class SphereRegion
+    class CylinderRegion
+    select_regions(List[SpatialRegion], numpy.ndarray|unyt.unyt_array, float|numpy.ndarray|unyt.unyt_array)
+
+Dependancies:
+
+    h5py
+    numpy
+    particle_selection.py (local file)
+    periodic_geometry.py (local file)
+    scipy
+    swift_cell_metadata.py (local file)
+    swift_parttype_enum.py (local file)
+    swiftsimio
+    typing
+    unyt
+"""
+
+import h5py
+import numpy as np
+from scipy.spatial import cKDTree
+import swiftsimio as sw
+from typing import List, Union
+import unyt
+
+from ..calculations.periodic_geometry import periodic_displacements, wrap_positions, wrapped_bounding_boxes, _box_size_by_axis
+from ..io.swift_cell_metadata import SWIFTCellMetadata
+from ..io.swift_parttype_enum import PartType
+from .particle_selection import ParticleSelection
+
+# Number of particles tested at once
+DEFAULT_BLOCK_SIZE = 2**20
+
+def _values_in_unit(values, unit: str) -> np.ndarray:
+    if hasattr(values, "to"):
+        return np.asarray(values.to(unit).value, dtype = np.float64)
+    return np.asarray(values, dtype = np.float64)
+
+class SpatialRegion(object):
+    """
+    Base class for a region defined relative to a centre. All values are plain floats in the region's unit (Mpc by default).
+    """
+
+    def __init__(self, centre: np.ndarray, half_extent: np.ndarray, unit: str = "Mpc"):
+        self.__centre = _values_in_unit(centre, unit).reshape(3)
+        self.__half_extent = np.asarray(half_extent, dtype = np.float64).reshape(3)
+        self.__unit = unit
+
+    @property
+    def centre(self) -> np.ndarray:
+        return self.__centre
+
+    @property
+    def half_extent(self) -> np.ndarray:
+        """
+        Half side lengths of the axis aligned box enclosing the region (may be infinite).
+        """
+        return self.__half_extent
+
+    @property
+    def bounding_radius(self) -> float:
+        return float(np.sqrt(np.square(self.__half_extent).sum()))
+
+    @property
+    def unit(self) -> str:
+        return self.__unit
+
+    def _contains_displacements(self, displacements: np.ndarray) -> np.ndarray:
+        """
+        Test minimum image displacements from the centre. The displacements array may be overwritten.
+        """
+        raise NotImplementedError("Region types must implement _contains_displacements.")
+
+    def bounding_boxes(self, box_size: Union[float, np.ndarray]) -> list:
+        """
+        Axis aligned boxes within [0, box_size] that together enclose the region.
+        """
+        return wrapped_bounding_boxes(self.__centre - self.__half_extent, self.__centre + self.__half_extent, box_size)
+
+    def make_array_filter(self, coordinates: Union[np.ndarray, unyt.unyt_array], box_size: Union[float, np.ndarray, unyt.unyt_array], block_size: int = DEFAULT_BLOCK_SIZE) -> np.ndarray:
+        coordinates = _values_in_unit(coordinates, self.__unit)
+        box_size = _box_size_by_axis(_values_in_unit(box_size, self.__unit), 3)
+        n_particles = coordinates.shape[0]
+
+        result = np.empty(n_particles, dtype = bool)
+        scratch = np.empty((min(block_size, n_particles), 3), dtype = np.float64)
+        for start in range(0, n_particles, block_size):
+            end = min(start + block_size, n_particles)
+            displacements = periodic_displacements(coordinates[start : end], self.__centre, box_size, out = scratch[: end - start])
+            result[start : end] = self._contains_displacements(displacements)
+        return result
+
+    def constrain_mask(self, mask):
+        """
+        Restrict a swiftsimio mask to the cells overlapping the region, including those on the far side of any box edge it crosses.
+        """
+        box_size = mask.metadata.boxsize
+        box_size_units = box_size.units
+        for i, (lower, upper) in enumerate(self.bounding_boxes(box_size.to(self.__unit).value)):
+            mask.constrain_spatial([[unyt.unyt_quantity(lower[axis], self.__unit).to(box_size_units), unyt.unyt_quantity(upper[axis], self.__unit).to(box_size_units)] for axis in range(3)], intersect = i > 0)
+        return mask
+
+    def make_cell_selection(self, particle_data: sw.SWIFTDataset, part_type: PartType) -> ParticleSelection:
+        """
+        Select the particles of one type within the region from an unmasked snapshot.
+
+        Only the coordinates of particles in cells overlapping the region are read.
+        """
+        filepath = str(particle_data.metadata.filename)
+        cells = SWIFTCellMetadata(filepath, part_type)
+        length_unit_to_region_unit = float(unyt.unyt_quantity(1.0, particle_data.metadata.units.length).to(self.__unit).value)
+        box_size = _box_size_by_axis(_values_in_unit(particle_data.metadata.boxsize, self.__unit), 3)
+
+        cell_min = cells.min_positions * length_unit_to_region_unit
+        cell_max = cells.max_positions * length_unit_to_region_unit
+        overlapping = np.full(len(cells), False)
+        for lower, upper in self.bounding_boxes(box_size):
+            overlapping |= np.all((cell_max >= lower) & (cell_min <= upper), axis = 1)
+        overlapping &= cells.counts > 0
+
+        ranges = SWIFTCellMetadata.merge_ranges(cells.offsets[overlapping], cells.offsets[overlapping] + cells.counts[overlapping])
+        selected_indices = []
+        with h5py.File(filepath, "r") as file:
+            coordinates = file[f"PartType{part_type.value}/Coordinates"]
+            n_particles = coordinates.shape[0]
+            for start, end in ranges:
+                selected_indices.append(start + np.where(self.make_array_filter(coordinates[start : end] * length_unit_to_region_unit, box_size))[0])
+
+        if len(selected_indices) == 0:
+            return ParticleSelection.none(n_particles)
+        return ParticleSelection.from_indices(np.concatenate(selected_indices), n_particles)
+
+class PeriodicBoxRegion(SpatialRegion):
+    """
+    Axis aligned box. Infinite half side lengths select the whole of that axis.
+    """
+
+    def __init__(self, centre: np.ndarray, half_side_lengths: Union[float, np.ndarray], unit: str = "Mpc"):
+        super().__init__(centre, np.broadcast_to(_values_in_unit(half_side_lengths, unit), (3,)), unit)
+
+    @staticmethod
+    def from_bounds(lower: np.ndarray, upper: np.ndarray, unit: str = "Mpc") -> "PeriodicBoxRegion":
+        """
+        Bounds may extend outside of the box to select a region that crosses its edge.
+        """
+        lower = _values_in_unit(lower, unit)
+        upper = _values_in_unit(upper, unit)
+        return PeriodicBoxRegion((lower + upper) / 2, (upper - lower) / 2, unit)
+
+    def _contains_displacements(self, displacements: np.ndarray) -> np.ndarray:
+        np.abs(displacements, out = displacements)
+        result = displacements[:, 0] <= self.half_extent[0]
+        for axis in (1, 2):
+            result &= displacements[:, axis] <= self.half_extent[axis]
+        return result
+
+class SlabRegion(PeriodicBoxRegion):
+    """
+    All particles within a range along one axis.
+    """
+
+    def __init__(self, axis: int, centre: float, thickness: float, unit: str = "Mpc"):
+        centre_vector = np.zeros(3)
+        centre_vector[axis] = _values_in_unit(centre, unit)
+        half_side_lengths = np.full(3, np.inf)
+        half_side_lengths[axis] = _values_in_unit(thickness, unit) / 2
+        super().__init__(centre_vector, half_side_lengths, unit)
+
+class SphereRegion(SpatialRegion):
+    def __init__(self, centre: np.ndarray, radius: float, unit: str = "Mpc"):
+        self.__radius = float(_values_in_unit(radius, unit))
+        super().__init__(centre, np.full(3, self.__radius), unit)
+
+    @property
+    def radius(self) -> float:
+        return self.__radius
+
+    @property
+    def bounding_radius(self) -> float:
+        return self.__radius
+
+    def _contains_displacements(self, displacements: np.ndarray) -> np.ndarray:
+        np.square(displacements, out = displacements)
+        displacements[:, 0] += displacements[:, 1]
+        displacements[:, 0] += displacements[:, 2]
+        return displacements[:, 0] <= self.__radius**2
+
+class CylinderRegion(SpatialRegion):
+    """
+    Cylinder aligned with one of the box axes. If no half length is specified, the cylinder extends through the whole box.
+    """
+
+    def __init__(self, centre: np.ndarray, radius: float, axis: int = 2, half_length: Union[float, None] = None, unit: str = "Mpc"):
+        self.__radius = float(_values_in_unit(radius, unit))
+        self.__axis = axis
+        self.__half_length = float(_values_in_unit(half_length, unit)) if half_length is not None else np.inf
+        half_extent = np.full(3, self.__radius)
+        half_extent[axis] = self.__half_length
+        super().__init__(centre, half_extent, unit)
+
+    @property
+    def radius(self) -> float:
+        return self.__radius
+
+    @property
+    def axis(self) -> int:
+        return self.__axis
+
+    @property
+    def half_length(self) -> float:
+        return self.__half_length
+
+    def _contains_displacements(self, displacements: np.ndarray) -> np.ndarray:
+        np.square(displacements, out = displacements)
+        first_axis, second_axis = [axis for axis in range(3) if axis != self.__axis]
+        displacements[:, first_axis] += displacements[:, second_axis]
+        result = displacements[:, first_axis] <= self.__radius**2
+        if np.isfinite(self.__half_length):
+            result &= displacements[:, self.__axis] <= self.__half_length**2
+        return result
+
+def select_regions(regions: List[SpatialRegion], coordinates: Union[np.ndarray, unyt.unyt_array], box_size: Union[float, np.ndarray, unyt.unyt_array], unit: str = "Mpc", block_size: int = DEFAULT_BLOCK_SIZE) -> List[np.ndarray]:
+    """
+    Find the particles within each of many regions (such as one sphere per halo) in a single pass over the coordinates.
+
+    Each block of coordinates is indexed once with a periodic KD-tree, and only the candidates within each region's bounding radius are tested exactly.
+    Returns a sorted array of particle indices for each region.
+    """
+    coordinates = _values_in_unit(coordinates, unit)
+    box_size = _box_size_by_axis(_values_in_unit(box_size, unit), 3)
+    n_particles = coordinates.shape[0]
+
+    for region in regions:
+        if region.unit != unit:
+            raise ValueError(f"Region has unit \"{region.unit}\" but \"{unit}\" was specified.")
+
+    centres = wrap_positions(np.array([region.centre for region in regions]).reshape((-1, 3)), box_size)
+    radii = np.array([region.bounding_radius for region in regions])
+    bounded = np.isfinite(radii)
+
+    results = [[] for _ in regions]
+    for start in range(0, n_particles, block_size):
+        end = min(start + block_size, n_particles)
+        block = wrap_positions(coordinates[start : end], box_size)
+        tree = cKDTree(block, boxsize = box_size)
+
+        candidates = np.empty(len(regions), dtype = object)
+        if bounded.any():
+            candidates[bounded] = tree.query_ball_point(centres[bounded], radii[bounded])
+        for i, region in enumerate(regions):
+            region_candidates = np.array(candidates[i], dtype = np.int64) if bounded[i] else np.arange(end - start)
+            if region_candidates.shape[0] == 0:
+                continue
+            displacements = periodic_displacements(block[region_candidates], region.centre, box_size)
+            results[i].append(start + region_candidates[region._contains_displacements(displacements)])
+
+    return [np.sort(np.concatenate(region_results)) if len(region_results) > 0 else np.empty(0, dtype = np.int64) for region_results in results]
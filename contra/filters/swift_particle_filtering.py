@@ -2,8 +2,8 @@
 File: swift_particle_filtering.py
 
 Author: Christopher Rowe
-Vesion: 1.0.0
-Date:   29/03/2023
+Vesion: 1.2.0
+Date:   19/10/2026
 
 Computes filters for SWIFT particle datasets.
 
@@ -13,25 +13,122 @@ Public API:
 
 Dependancies:
 
+    h5py
     numpy
+    particle_selection.py (local file)
     QuasarCode
+    re
     sph_map.py (local file)
     swift_data_expression.py (local file)
     swiftsimio
     typing
+    unyt
 """
 
+import h5py
 import numpy as np
 from QuasarCode.Tools import ScriptWrapper
+import re
 import swiftsimio as sw
-from typing import List, Union
+from typing import List, Tuple, Union
+import unyt
 
 from ..io.swift_data_expression import parse_string
 from ..io.swift_parttype_enum import PartType
+from .particle_selection import ParticleSelection
+
+# Number of rows read at once when evaluating a limit on a subset of particles
+FIELD_READ_BLOCK_SIZE = 2**20
+
+# Number and length of the contiguous blocks sampled when estimating the selectivity of a limit
+SELECTIVITY_SAMPLE_BLOCKS = 16
+SELECTIVITY_SAMPLE_BLOCK_SIZE = 4096
+
+_SIMPLE_FIELD_PATTERN = re.compile(r"^([a-z_]+)\.([a-z0-9_]+)$")
+
+_UNIT_EXPONENT_ATTRIBUTES = (("U_M exponent", "mass"), ("U_L exponent", "length"), ("U_t exponent", "time"), ("U_I exponent", "current"), ("U_T exponent", "temperature"))
+
+def _get_direct_field_info(data_root_node: sw.SWIFTDataset, field: str) -> Union[Tuple[str, str, unyt.unyt_quantity, int], None]:
+    """
+    Locate a field that is a single dataset in an unmasked snapshot file.
+
+    Returns (filename, HDF5 path, units, number of particles) or None if the field can't be read directly.
+    """
+    match = _SIMPLE_FIELD_PATTERN.match(field)
+    if match is None or getattr(data_root_node, "mask", None) is not None:
+        return None
+    try:
+        metadata = data_root_node.metadata
+        properties = getattr(metadata, f"{match.group(1)}_properties")
+        path = properties.field_paths[properties.field_names.index(match.group(2))]
+        n_particles = int(getattr(metadata, f"n_{match.group(1)}"))
+    except (AttributeError, ValueError):
+        return None
+
+    # Units are constructed from the internal unit system in the same way as swiftsimio
+    units = unyt.unyt_quantity(1.0)
+    with h5py.File(metadata.filename, "r") as file:
+        attributes = file[path].attrs
+        for exponent_attribute, unit_name in _UNIT_EXPONENT_ATTRIBUTES:
+            exponent = float(attributes[exponent_attribute][0]) if exponent_attribute in attributes else 0.0
+            if exponent != 0.0:
+                units = units * getattr(metadata.units, unit_name)**exponent
+
+    return str(metadata.filename), path, units, n_particles
+
+def _read_direct_field(field_info: Tuple[str, str, unyt.unyt_quantity, int], rows: Union[np.ndarray, None] = None) -> unyt.unyt_array:
+    """
+    Read a field directly from the snapshot file. If rows (sorted) are specified, only the blocks of the file containing them are read.
+    """
+    filename, path, units, _ = field_info
+    with h5py.File(filename, "r") as file:
+        dataset = file[path]
+        if rows is None:
+            values = dataset[...]
+        else:
+            values = np.empty((rows.shape[0], *dataset.shape[1:]), dtype = dataset.dtype)
+            position = 0
+            while position < rows.shape[0]:
+                block_start = rows[position]
+                end_position = np.searchsorted(rows, block_start + FIELD_READ_BLOCK_SIZE, side = "left")
+                block_end = rows[end_position - 1] + 1
+                values[position : end_position] = dataset[block_start : block_end][rows[position : end_position] - block_start]
+                position = end_position
+
+    return unyt.unyt_array(values * units.value, units.units)
+
+def _limit_filter(values: unyt.unyt_array, unit: str, limit_min: Union[float, None], limit_max: Union[float, None]) -> np.ndarray:
+    values = values.to(unit).value
+    result = np.full(values.shape, True)
+    if limit_min is not None:
+        result &= values >= limit_min
+    if limit_max is not None:
+        result &= values <= limit_max
+    return result
+
+def _estimate_selectivity(field_info: Tuple[str, str, unyt.unyt_quantity, int], unit: str, limit_min: Union[float, None], limit_max: Union[float, None]) -> float:
+    """
+    Fraction of particles that pass a limit, estimated from a small number of evenly spaced blocks.
+    """
+    n_particles = field_info[3]
+    if n_particles == 0:
+        return 0.0
+    block_size = min(SELECTIVITY_SAMPLE_BLOCK_SIZE, n_particles)
+    block_starts = np.unique(np.linspace(0, n_particles - block_size, SELECTIVITY_SAMPLE_BLOCKS).astype(np.int64))
+    rows = (block_starts[:, None] + np.arange(block_size)[None, :]).reshape(-1)
+    rows = np.unique(rows)
+    return _limit_filter(_read_direct_field(field_info, rows), unit, limit_min, limit_max).mean()
 
 class ParticleFilter(object):
     @staticmethod
-    def _calculate_filter(data_root_node: sw.SWIFTDataset, limit_fields: Union[str, List[str]], limit_units: Union[str, List[str]], limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None, **kwargs):
+    def _calculate_filter(data_root_node: sw.SWIFTDataset, limit_fields: Union[str, List[str]], limit_units: Union[str, List[str]], limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None, initial_selection: Union[ParticleSelection, None] = None, **kwargs):
+        """
+        Evaluates the limits in order of estimated selectivity.
+
+        Only the first limit is evaluated for all particles. Each subsequent limit is evaluated only for the particles that passed the previous limits,
+        reading directly from the snapshot file where possible.
+        If an initial selection (such as a spatial region) is specified, no limits are evaluated for particles outside of it.
+        """
         # Handle formatting for there only being one item
         if isinstance(limit_fields, str):
             limit_fields = [limit_fields]
@@ -41,63 +138,110 @@ class ParticleFilter(object):
             if limits_max is not None:
                 limits_max = [limits_max]
 
-        manual_filter = np.full(parse_string(limit_fields[0], data_root_node).shape[0], True)
-
+        n_particles = None
+        limits = []
         for i, field in enumerate(limit_fields):
-            field_value = parse_string(field, data_root_node).to(limit_units[i])
-            if limits_min is not None and limits_min[i] is not None:
-                manual_filter = manual_filter & (field_value >= limits_min[i])
-            if limits_max is not None and limits_max[i] is not None:
-                manual_filter = manual_filter & (field_value <= limits_max[i])
-
-        return manual_filter
-
-    def __init__(self, data_root_node: sw.SWIFTDataset, limit_fields: Union[str, List[str]], limit_units: Union[str, List[str]], limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None):
-        self.__filter = ParticleFilter._calculate_filter(data_root_node, limit_fields, limit_units, limits_min, limits_max)
-        self.__n_items = self.__filter.sum()
+            limit_min = limits_min[i] if limits_min is not None else None
+            limit_max = limits_max[i] if limits_max is not None else None
+            field_info = _get_direct_field_info(data_root_node, field)
+            if field_info is not None:
+                n_particles = field_info[3]
+            if limit_min is None and limit_max is None:
+                continue
+            selectivity = _estimate_selectivity(field_info, limit_units[i], limit_min, limit_max) if field_info is not None else 1.0
+            limits.append((selectivity, field, limit_units[i], limit_min, limit_max, field_info))
+
+        # Stable sort so that limits with the same selectivity keep the order they were given in
+        limits.sort(key = lambda limit: limit[0])
+
+        selected_rows = None
+        if initial_selection is not None:
+            n_particles = initial_selection.n_total
+            if len(limits) == 0:
+                return initial_selection
+            selected_rows = initial_selection.indices
+
+        for _, field, unit, limit_min, limit_max, field_info in limits:
+            if selected_rows is None:
+                field_value = _read_direct_field(field_info) if field_info is not None else parse_string(field, data_root_node)
+                n_particles = field_value.shape[0]
+                selected_rows = np.where(_limit_filter(field_value, unit, limit_min, limit_max))[0]
+            else:
+                field_value = _read_direct_field(field_info, selected_rows) if field_info is not None else parse_string(field, data_root_node)[selected_rows]
+                selected_rows = selected_rows[_limit_filter(field_value, unit, limit_min, limit_max)]
+            del field_value
+
+            if selected_rows.shape[0] == 0:
+                break
+
+        if n_particles is None:
+            n_particles = parse_string(limit_fields[0], data_root_node).shape[0]
+
+        if selected_rows is None:
+            return ParticleSelection.all(n_particles)
+
+        return ParticleSelection.from_indices(selected_rows, n_particles)
+
+    def __init__(self, data_root_node: sw.SWIFTDataset, limit_fields: Union[str, List[str]], limit_units: Union[str, List[str]], limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None, initial_selection: Union[ParticleSelection, None] = None):
+        self.__selection: ParticleSelection = ParticleFilter._calculate_filter(data_root_node, limit_fields, limit_units, limits_min, limits_max, initial_selection)
 
     def __call__(self, dataset):
-        return dataset[self.__filter]
+        return self.__selection.gather(dataset)
     
     def __len__(self):
-        return self.__n_items
+        return len(self.__selection)
+
+    @property
+    def selection(self) -> ParticleSelection:
+        return self.__selection
 
     @property
-    def numpy_filter(self):
-        return self.__filter
+    def indices(self) -> np.ndarray:
+        """
+        Sorted indices of the selected particles. These are cached, so prefer this to numpy_filter when selecting from many fields.
+        """
+        return self.__selection.indices
+
+    @property
+    def numpy_filter(self) -> np.ndarray:
+        """
+        Boolean filter array. This is created each time it is requested.
+        """
+        return self.__selection.to_bool()
     
-    def update(self, additional_filter: np.ndarray):
-        len_new_items = additional_filter.shape[0]
-        len_self_items = self.__filter.shape[0]
+    def update(self, additional_filter: Union[np.ndarray, ParticleSelection]):
+        len_new_items = additional_filter.n_total if isinstance(additional_filter, ParticleSelection) else additional_filter.shape[0]
+        len_self_items = self.__selection.n_total
 
         if len_new_items > len_self_items:
             # New filter is a larger array than the current filter! This is not compattible.
             raise ValueError("The new filter has a length of {}. This is larger than (and therfore, incompatible with) the current filter size of {}.".format(len_new_items, len_self_items))
         elif len_new_items == len_self_items:
-            # Same lengths, just do a simple logical and.
-            #print(self.__filter)
-            #print(type(self.__filter))
-            #print(self.__filter[0])
-            #print(additional_filter)
-            #print(type(additional_filter))
-            #print(additional_filter[0])
-            self.__filter = self.__filter & additional_filter
-            self.__n_items = self.__filter.sum()
+            # Same lengths, just do an intersection.
+            if not isinstance(additional_filter, ParticleSelection):
+                additional_filter = ParticleSelection.from_bool(additional_filter)
+            self.__selection = self.__selection.intersection(additional_filter)
         elif len_new_items != len(self):
             # New filter has a size that isn't consistent with the currently filtered subset.
             raise ValueError("The new filter has a length of {}. This is smaller than the current filter size of {}, but also not the same as (and therfore, incompatible with) the current filtered subset size of {}.".format(len_new_items, len_self_items, len(self)))
-        elif additional_filter.sum() > 0:
-            # Apply to the filtered subset.
-            self.__filter[np.where(self.__filter)[0][additional_filter == False]] = False
-            self.__n_items = self.__filter.sum()
         else:
-            # New filter was valid, but would remove all items. Just overwrite internal filter.
-            self.__filter = np.full_like(self.__filter, False)
-            self.__n_items = 0
+            # Apply to the filtered subset.
+            if isinstance(additional_filter, ParticleSelection):
+                additional_filter = additional_filter.to_bool()
+            self.__selection = self.__selection.subset(np.asarray(additional_filter, dtype = bool))
+
+    @staticmethod
+    def from_selection(selection: ParticleSelection) -> "ParticleFilter":
+        """
+        Create a filter from an existing selection without evaluating any fields.
+        """
+        particle_filter = ParticleFilter.__new__(ParticleFilter)
+        particle_filter.__selection = selection
+        return particle_filter
 
     @staticmethod
     def passthrough_filter(data_file: sw.SWIFTDataset, part_type: PartType):
-        return ParticleFilter(part_type.get_dataset(data_file), "masses", "Msun", None, None)
+        return ParticleFilter(data_file, f"{part_type}.masses", "Msun", None, None)
 
     @staticmethod
     def get_command_params():
@@ -7,4 +7,11 @@ from . import velociraptor_multi_load as vr_file_tools
 from .velociraptor_multi_load import Multifile_VR_Catalogue
 
 from . import save_swift_snap_field as swift_file_tools
-from .save_swift_snap_field import get_cgs_conversions, save_particle_fields
\ No newline at end of file
+from .save_swift_snap_field import get_cgs_conversions, save_particle_fields
+
+from .halo_tracking_results import HaloTrackingResultStore
+from .swift_cell_metadata import SWIFTCellMetadata
+
+from .load_plan import LoadPlan
+from .smoothing_length_store import SmoothingLengthStore
+from .map_array_store import MapArrayStore
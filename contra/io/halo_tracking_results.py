@@ -0,0 +1,119 @@
+"""
+File: halo_tracking_results.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Typed, chunked storage for the results of the halo reverse search.
+
+Public API:
+
+    class HaloTrackingResultStore
+    HaloTrackingResultStore.write(str, List[str], numpy.ndarray, numpy.ndarray, numpy.ndarray)
+
+Dependancies:
+
+    h5py
+    numpy
+    typing
+"""
+
+import h5py
+import numpy as np
+from typing import List, Union
+
+# Number of rows per HDF5 chunk
+DEFAULT_CHUNK_SIZE = 2**20
+
+# Value used for particles with no identified halo
+NO_HALO_SNAPSHOT_NUMBER = -999
+
+class HaloTrackingResultStore(object):
+    """
+    Read access to a halo tracking result file.
+
+    Columns written without compression are stored contiguously and are returned as read-only numpy.memmap
+    objects, so consumers only page in the data they touch. Compressed columns are read in full when accessed.
+    """
+
+    SNAPSHOT_NUMBERS = "SnapshotNumbers"
+    HALO_SNAPSHOT_INDEXES = "HaloSnapshotIndexes"
+    HALO_IDS = "HaloIDs"
+    HALO_MASSES = "HaloMasses"
+
+    def __init__(self, filepath: str, memory_map: bool = True):
+        self.__filepath = filepath
+        self.__memory_map = memory_map
+        self.__file = h5py.File(filepath, "r")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.__file[HaloTrackingResultStore.HALO_IDS].shape[0]
+
+    def close(self):
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+    def read(self, column: str, selection: Union[slice, None] = None) -> np.ndarray:
+        """
+        Read a column. If a selection is provided, only the HDF5 chunks that overlap it are read.
+        """
+        dataset = self.__file[column]
+        if selection is not None:
+            return dataset[selection]
+
+        offset = dataset.id.get_offset() if self.__memory_map and dataset.chunks is None and dataset.compression is None else None
+        if offset is None:
+            return dataset[...]
+        return np.memmap(self.__filepath, mode = "r", dtype = dataset.dtype, shape = dataset.shape, offset = offset)
+
+    @property
+    def snapshot_numbers(self) -> np.ndarray:
+        return self.__file[HaloTrackingResultStore.SNAPSHOT_NUMBERS][...]
+
+    @property
+    def halo_snapshot_indexes(self) -> np.ndarray:
+        return self.read(HaloTrackingResultStore.HALO_SNAPSHOT_INDEXES)
+
+    @property
+    def halo_snapshot_numbers(self) -> np.ndarray:
+        # Append the missing value so that an index of -1 looks it up
+        lookup = np.append(self.snapshot_numbers, np.array([NO_HALO_SNAPSHOT_NUMBER], dtype = np.int16))
+        return lookup[self.halo_snapshot_indexes]
+
+    @property
+    def halo_ids(self) -> np.ndarray:
+        return self.read(HaloTrackingResultStore.HALO_IDS)
+
+    @property
+    def halo_masses(self) -> np.ndarray:
+        return self.read(HaloTrackingResultStore.HALO_MASSES)
+
+    @staticmethod
+    def write(filepath: str, snapshot_numbers: List[str], halo_snapshot_indexes: np.ndarray, halo_ids: np.ndarray, halo_masses: np.ndarray, compression: Union[str, None] = "gzip", chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Write the result columns to a single HDF5 file.
+
+        Set compression to None to store the columns contiguously, allowing them to be memory mapped when read.
+        """
+        n_items = halo_ids.shape[0]
+        if halo_snapshot_indexes.shape[0] != n_items or halo_masses.shape[0] != n_items:
+            raise ValueError("All result columns must have the same length.")
+
+        dataset_kwargs = {}
+        if compression is not None and n_items > 0:
+            dataset_kwargs = { "chunks": (min(chunk_size, n_items),), "compression": compression, "shuffle": True }
+
+        with h5py.File(filepath, "w") as file:
+            file.create_dataset(HaloTrackingResultStore.SNAPSHOT_NUMBERS, data = np.array([int(snap_number) for snap_number in snapshot_numbers], dtype = np.int16))
+            file.create_dataset(HaloTrackingResultStore.HALO_SNAPSHOT_INDEXES, data = np.asarray(halo_snapshot_indexes, dtype = np.int16), **dataset_kwargs)
+            file.create_dataset(HaloTrackingResultStore.HALO_IDS, data = np.asarray(halo_ids, dtype = np.int64), **dataset_kwargs)
+            file.create_dataset(HaloTrackingResultStore.HALO_MASSES, data = np.asarray(halo_masses, dtype = np.float64), **dataset_kwargs)
+            file[HaloTrackingResultStore.HALO_MASSES].attrs["Units"] = "Msun"
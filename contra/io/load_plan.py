@@ -0,0 +1,202 @@
+"""
+File: load_plan.py
+
+Author: Christopher Rowe
+Vesion: 1.1.1
+Date:   19/10/2026
+
+Plans the reads a script makes from a SWIFT snapshot so that each field
+is read once and only for the particles that will be used.
+
+The particles are selected from the region (using the snapshot's cell
+metadata) and any limits, then every field registered with the plan is
+read for just those rows of the snapshot file. Selections are made over
+the rows of the file, so they are compatible with a SelectionStore.
+
+Public API:
+
+    class LoadPlan
+
+Dependancies:
+
+    particle_selection.py (local file)
+    re
+    selection_store.py (local file)
+    swift_data_expression.py (local file)
+    swift_parttype_enum.py (local file)
+    swift_particle_filtering.py (local file)
+    swiftsimio
+    typing
+    unyt
+"""
+
+import re
+import swiftsimio as sw
+from typing import Dict, List, Union
+import unyt
+
+from .swift_data_expression import parse_string
+from .swift_parttype_enum import PartType
+from ..filters.particle_selection import ParticleSelection
+from ..filters.selection_store import SelectionStore
+from ..filters.swift_particle_filtering import ParticleFilter, _get_direct_field_info, _read_direct_field
+
+_FIELD_NAME_PATTERN = re.compile(r"^[a-z0-9_]+$")
+
+# Number of particles read at once by read_chunks
+DEFAULT_CHUNK_SIZE = 2**22
+
+class LoadPlan(object):
+    """
+    Collects the region, limits and fields a script will use and reads them for only the selected particles.
+
+    Fields may be specified relative to the snapshot root (e.g. "gas.densities") or, if part_type_relative is set,
+    relative to the particle type's dataset (e.g. "densities").
+    """
+
+    def __init__(self, particle_data: sw.SWIFTDataset, part_type: PartType = PartType.gas):
+        self.__particle_data = particle_data
+        self.__part_type = part_type
+        self.__region = None
+        self.__region_definition = None
+        self.__limit_fields = None
+        self.__limit_units = None
+        self.__limits_min = None
+        self.__limits_max = None
+        self.__limits_part_type_relative = False
+        self.__fields: Dict[str, tuple] = {}
+        self.__selection: Union[ParticleSelection, None] = None
+
+    @property
+    def particle_data(self) -> sw.SWIFTDataset:
+        return self.__particle_data
+
+    @property
+    def part_type(self) -> PartType:
+        return self.__part_type
+
+    def _resolve_expression(self, expression: str, part_type_relative: bool):
+        """
+        Returns the expression and whether it must be evaluated relative to the particle type's dataset.
+        """
+        if part_type_relative and _FIELD_NAME_PATTERN.match(expression):
+            # Allows the field to be read directly from the file
+            return f"{self.__part_type}.{expression}", False
+        return expression, part_type_relative
+
+    def _evaluation_node(self, part_type_relative: bool):
+        return self.__part_type.get_dataset(self.__particle_data) if part_type_relative else self.__particle_data
+
+    def set_region(self, region, definition = None):
+        """
+        Restrict the selection to a region. This may be a BoxRegion or any SpatialRegion.
+
+        The definition identifies the region when storing the selection and defaults to the region's bounds.
+        """
+        self.__region = region
+        if definition is None:
+            definition = region.bounds if hasattr(region, "bounds") else { "type": type(region).__name__, "centre": [float(value) for value in region.centre], "half_extent": [float(value) for value in region.half_extent] }
+        self.__region_definition = definition
+        self.__selection = None
+
+    def set_limits(self, limit_fields: Union[None, str, List[str]], limit_units: Union[None, str, List[str]], limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None, part_type_relative: bool = False):
+        if isinstance(limit_fields, str):
+            limit_fields = [limit_fields]
+            limit_units = [limit_units]
+            if limits_min is not None:
+                limits_min = [limits_min]
+            if limits_max is not None:
+                limits_max = [limits_max]
+        self.__limits_part_type_relative = part_type_relative and limit_fields is not None and not all(_FIELD_NAME_PATTERN.match(field) for field in limit_fields)
+        self.__limit_fields = [self._resolve_expression(field, part_type_relative)[0] for field in limit_fields] if limit_fields is not None and not self.__limits_part_type_relative else limit_fields
+        self.__limit_units = limit_units
+        self.__limits_min = [(value if value != "" else None) for value in limits_min] if limits_min is not None else None
+        self.__limits_max = [(value if value != "" else None) for value in limits_max] if limits_max is not None else None
+        self.__selection = None
+
+    def add_field(self, name: str, expression: str, unit: Union[str, None] = None, part_type_relative: bool = False):
+        """
+        Register a field to be returned by read.
+        """
+        self.__fields[name] = (expression, unit, part_type_relative)
+
+    @property
+    def definition(self) -> dict:
+        """
+        Description of the selection, used to identify it in a SelectionStore.
+        """
+        return { "index_space": SelectionStore.SNAPSHOT_INDEX_SPACE, "part_type": str(self.__part_type), "region": self.__region_definition, "limit_fields": self.__limit_fields, "limit_units": self.__limit_units, "limits_min": self.__limits_min, "limits_max": self.__limits_max }
+
+    def _create_selection(self) -> ParticleSelection:
+        selection = self.__region.make_cell_selection(self.__particle_data, self.__part_type) if self.__region is not None else None
+        if self.__limit_fields is not None:
+            return ParticleFilter(self._evaluation_node(self.__limits_part_type_relative), self.__limit_fields, self.__limit_units, self.__limits_min, self.__limits_max, initial_selection = selection).selection
+        if selection is None:
+            return ParticleSelection.all(int(getattr(self.__particle_data.metadata, f"n_{self.__part_type}")))
+        return selection
+
+    def select(self, selection_name: Union[str, None] = None, store: Union[SelectionStore, None] = None) -> ParticleSelection:
+        """
+        Select the particles in the region that pass the limits.
+
+        If a name is specified, the selection is reused from (or saved to) a SelectionStore.
+        """
+        if self.__selection is None:
+            self.__selection = (store if store is not None else SelectionStore()).get_or_create(selection_name, self.__particle_data, self.definition, self._create_selection, int(getattr(self.__particle_data.metadata, f"n_{self.__part_type}")))
+        return self.__selection
+
+    def read_field(self, expression: str, unit: Union[str, None] = None, selection: Union[ParticleSelection, None] = None, part_type_relative: bool = False) -> unyt.unyt_array:
+        """
+        Read a field for the selected rows only. If no selection is given, all particles are read.
+
+        Simple fields are read directly from the selected rows of the file. Expressions are evaluated by swiftsimio and then selected.
+        """
+        expression, evaluate_relative = self._resolve_expression(expression, part_type_relative)
+        field_info = _get_direct_field_info(self.__particle_data, expression) if not evaluate_relative else None
+        if field_info is not None:
+            values = _read_direct_field(field_info, selection.indices if selection is not None else None)
+        else:
+            values = parse_string(expression, self._evaluation_node(evaluate_relative))
+            if selection is not None:
+                values = selection.gather(values)
+        return values.to(unit) if unit is not None else values
+
+    def read_chunks(self, expressions: List[str], units: Union[List[Union[str, None]], None] = None, selection: Union[ParticleSelection, None] = None, part_type_relative: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        Read fields for consecutive chunks of the selected rows (all particles if no selection is given).
+
+        Yields a list of arrays (one per expression) for each chunk. Simple fields are read from the file a chunk at a time.
+        Expressions are evaluated by swiftsimio once, and then selected a chunk at a time.
+        """
+        if units is None:
+            units = [None] * len(expressions)
+        if selection is None:
+            selection = ParticleSelection.all(int(getattr(self.__particle_data.metadata, f"n_{self.__part_type}")))
+
+        sources = []
+        for expression in expressions:
+            resolved_expression, evaluate_relative = self._resolve_expression(expression, part_type_relative)
+            field_info = _get_direct_field_info(self.__particle_data, resolved_expression) if not evaluate_relative else None
+            sources.append(("file", field_info) if field_info is not None else ("evaluated", parse_string(resolved_expression, self._evaluation_node(evaluate_relative))))
+
+        for chunk in selection.chunks(chunk_size):
+            values = [(_read_direct_field(source, chunk.indices) if source_type == "file" else chunk.gather(source)) for source_type, source in sources]
+            yield [(field_values.to(unit) if unit is not None else field_values) for field_values, unit in zip(values, units)]
+
+    def read(self, selection_name: Union[str, None] = None) -> Dict[str, unyt.unyt_array]:
+        """
+        Read every registered field for the selected particles.
+        """
+        selection = self.select(selection_name)
+        return { name: self.read_field(expression, unit, selection, part_type_relative) for name, (expression, unit, part_type_relative) in self.__fields.items() }
+
+    @staticmethod
+    def load_masked(filepath: str, region = None) -> sw.SWIFTDataset:
+        """
+        Load a snapshot using a single spatial mask covering the cells that overlap the region.
+        """
+        if region is None:
+            return sw.load(filepath)
+        mask = sw.mask(filepath, spatial_only = True)
+        region.constrain_mask(mask)
+        return sw.load(filepath, mask)
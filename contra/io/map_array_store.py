@@ -0,0 +1,111 @@
+"""
+File: map_array_store.py
+
+Author: Christopher Rowe
+Vesion: 1.1.0
+Date:   19/10/2026
+
+Persistent storage of rendered map pixel arrays, so that a map can be
+re-styled (colour map, title, labels etc.) without reloading and
+re-rendering the particle data.
+
+Each set of arrays is keyed by the snapshot it was rendered from (path,
+size and modification time) and a definition of everything that
+affects the pixel values, such as the region, camera, resolution,
+smoothing expression and filters. Arrays are only reused if both still
+match. Arrays are compressed, and those stored for snapshots that have
+since changed or been removed are deleted whenever new arrays are saved.
+
+Public API:
+
+    class MapArrayStore
+
+Dependancies:
+
+    h5py
+    hashlib
+    json
+    os
+    selection_store.py (local file)
+    typing
+    unyt
+"""
+
+import h5py
+import hashlib
+import json
+import os
+from typing import List, Union
+import unyt
+
+from ..filters.selection_store import SelectionStore
+
+# Default sidecar file, created in the working directory
+DEFAULT_MAP_ARRAY_FILE = "map_arrays.hdf5"
+
+class MapArrayStore(object):
+    def __init__(self, filepath: str = DEFAULT_MAP_ARRAY_FILE):
+        self.__filepath = filepath
+
+    @property
+    def filepath(self) -> str:
+        return self.__filepath
+
+    @staticmethod
+    def make_definition_string(definition: dict) -> str:
+        return json.dumps(definition, sort_keys = True, default = str)
+
+    @staticmethod
+    def make_key(snapshot_filepath: str, definition: dict) -> str:
+        """
+        Name of the group storing the arrays for a snapshot and definition.
+        """
+        key_string = json.dumps(SelectionStore.snapshot_key(snapshot_filepath), sort_keys = True) + MapArrayStore.make_definition_string(definition)
+        return hashlib.sha256(key_string.encode("utf-8")).hexdigest()
+
+    def load(self, snapshot_filepath: str, definition: dict) -> Union[List[unyt.unyt_array], None]:
+        """
+        Retrive the arrays for a map. Returns None if none were stored for the snapshot and definition.
+        """
+        if not os.path.isfile(self.__filepath):
+            return None
+        key = MapArrayStore.make_key(snapshot_filepath, definition)
+        with h5py.File(self.__filepath, "r") as file:
+            if key not in file:
+                return None
+            group = file[key]
+            if group.attrs["Definition"] != MapArrayStore.make_definition_string(definition):
+                return None
+            return [unyt.unyt_array(group[f"Channel{i}"][...], str(group[f"Channel{i}"].attrs["Units"])) for i in range(int(group.attrs["NChannels"]))]
+
+    @staticmethod
+    def __prune(file: h5py.File):
+        """
+        Delete the arrays stored for snapshots that have been modified or removed since.
+        """
+        for key in list(file.keys()):
+            snapshot_filepath = str(file[key].attrs.get("Snapshot", ""))
+            if not os.path.isfile(snapshot_filepath) or not SelectionStore.snapshot_key_matches(file[key].attrs, snapshot_filepath):
+                del file[key]
+
+    def save(self, snapshot_filepath: str, definition: dict, arrays: List[unyt.unyt_array], **attributes):
+        """
+        Store the arrays for a map. Any additional attributes (e.g. the camera parameters) are saved with them for reference.
+
+        Arrays for any snapshot that has since been modified or removed are deleted.
+        """
+        key = MapArrayStore.make_key(snapshot_filepath, definition)
+        with h5py.File(self.__filepath, "a") as file:
+            MapArrayStore.__prune(file)
+            if key in file:
+                del file[key]
+            group = file.create_group(key)
+            for i, array in enumerate(arrays):
+                dataset = group.create_dataset(f"Channel{i}", data = array.value, compression = "gzip", shuffle = True)
+                dataset.attrs["Units"] = str(array.units)
+            group.attrs["NChannels"] = len(arrays)
+            for attribute_key, value in SelectionStore.snapshot_key(snapshot_filepath).items():
+                group.attrs[attribute_key] = value
+            group.attrs["Definition"] = MapArrayStore.make_definition_string(definition)
+            for attribute_key, value in attributes.items():
+                group.attrs[attribute_key] = value
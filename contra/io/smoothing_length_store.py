@@ -0,0 +1,114 @@
+"""
+File: smoothing_length_store.py
+
+Author: Christopher Rowe
+Vesion: 1.0.1
+Date:   19/10/2026
+
+Persistent storage of generated smoothing lengths, so that particle
+types without a smoothing length field only need their neighbour search
+to be run once per snapshot.
+
+Smoothing lengths are stored for rows of the snapshot file, keyed by the
+snapshot (path, size and modification time), the particle type and the
+parameters used to generate them. Only rows that have not been stored
+before are generated, so regions may be added to the store one at a
+time.
+
+Public API:
+
+    class SmoothingLengthStore
+
+Dependancies:
+
+    h5py
+    json
+    numpy
+    os
+    selection_store.py (local file)
+    swift_parttype_enum.py (local file)
+    typing
+"""
+
+import h5py
+import json
+import numpy as np
+import os
+from typing import Callable, Tuple, Union
+
+from .swift_parttype_enum import PartType
+from ..filters.selection_store import SelectionStore
+
+# Default sidecar file, created in the working directory
+DEFAULT_SMOOTHING_LENGTH_FILE = "smoothing_lengths.hdf5"
+
+class SmoothingLengthStore(object):
+    def __init__(self, filepath: str = DEFAULT_SMOOTHING_LENGTH_FILE):
+        self.__filepath = filepath
+
+    @property
+    def filepath(self) -> str:
+        return self.__filepath
+
+    @staticmethod
+    def make_parameters_string(parameters: dict) -> str:
+        return json.dumps(parameters, sort_keys = True, default = str)
+
+    def load(self, snapshot_filepath: str, part_type: PartType, parameters: dict) -> Union[Tuple[np.ndarray, np.ndarray], None]:
+        """
+        Retrive the stored (sorted) rows and their smoothing lengths.
+
+        Returns None if nothing is stored for the particle type or it was generated from a different snapshot or with different parameters.
+        """
+        if not os.path.isfile(self.__filepath):
+            return None
+        with h5py.File(self.__filepath, "r") as file:
+            if str(part_type) not in file:
+                return None
+            group = file[str(part_type)]
+            if not SelectionStore.snapshot_key_matches(group.attrs, snapshot_filepath):
+                return None
+            if group.attrs["Parameters"] != SmoothingLengthStore.make_parameters_string(parameters):
+                return None
+            return group["Rows"][...], group["SmoothingLengths"][...]
+
+    def save(self, snapshot_filepath: str, part_type: PartType, parameters: dict, rows: np.ndarray, smoothing_lengths: np.ndarray):
+        """
+        Store smoothing lengths for sorted rows of the snapshot file, replacing anything stored for the particle type.
+        """
+        with h5py.File(self.__filepath, "a") as file:
+            if str(part_type) in file:
+                del file[str(part_type)]
+            group = file.create_group(str(part_type))
+            group.create_dataset("Rows", data = rows)
+            group.create_dataset("SmoothingLengths", data = smoothing_lengths)
+            for key, value in SelectionStore.snapshot_key(snapshot_filepath).items():
+                group.attrs[key] = value
+            group.attrs["Parameters"] = SmoothingLengthStore.make_parameters_string(parameters)
+
+    def get_or_create(self, snapshot_filepath: str, part_type: PartType, parameters: dict, rows: np.ndarray, create_smoothing_lengths: Callable[[np.ndarray], np.ndarray]) -> np.ndarray:
+        """
+        Smoothing lengths for sorted rows of the snapshot file.
+
+        Any rows not already stored are generated by calling create_smoothing_lengths with their positions in the rows array,
+        and are then added to the store.
+        """
+        stored = self.load(snapshot_filepath, part_type, parameters)
+        stored_rows, stored_smoothing_lengths = stored if stored is not None else (np.empty(0, dtype = np.int64), np.empty(0, dtype = np.float32))
+
+        smoothing_lengths = np.empty(rows.shape[0], dtype = np.float32)
+        stored_positions = np.searchsorted(stored_rows, rows)
+        found = stored_positions < stored_rows.shape[0]
+        found[found] = stored_rows[stored_positions[found]] == rows[found]
+        smoothing_lengths[found] = stored_smoothing_lengths[stored_positions[found]]
+
+        if not found.all():
+            missing = np.where(~found)[0]
+            smoothing_lengths[missing] = create_smoothing_lengths(missing)
+
+            all_rows = np.concatenate([stored_rows, rows[missing]])
+            all_smoothing_lengths = np.concatenate([stored_smoothing_lengths, smoothing_lengths[missing]])
+            order = np.argsort(all_rows, kind = "stable")
+            self.save(snapshot_filepath, part_type, parameters, all_rows[order], all_smoothing_lengths[order])
+
+        return smoothing_lengths
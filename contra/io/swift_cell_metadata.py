@@ -0,0 +1,110 @@
+"""
+File: swift_cell_metadata.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Reads the top-level cell metadata from a SWIFT snapshot.
+
+Public API:
+
+    class SWIFTCellMetadata
+
+Dependancies:
+
+    h5py
+    numpy
+    swift_parttype_enum.py (local file)
+"""
+
+import h5py
+import numpy as np
+
+from .swift_parttype_enum import PartType
+
+# Fraction of a cell's size to pad the cell extent by if the snapshot does not record the particle extent in each cell
+DRIFT_PADDING = 0.1
+
+class SWIFTCellMetadata(object):
+    """
+    Extent, particle count and file offset of each top-level cell for one particle type.
+
+    Cells are sorted by their offset in the file. All lengths are in the snapshot's internal units.
+    """
+
+    def __init__(self, filepath: str, part_type: PartType):
+        with h5py.File(filepath, "r") as file:
+            cells = file["Cells"]
+            group = f"PartType{part_type.value}"
+
+            centres = cells["Centres"][...]
+            cell_size = np.array(cells["Meta-data"].attrs["size"], dtype = np.float64)
+            counts = np.array(cells["Counts"][group][...], dtype = np.int64)
+            offsets = np.array((cells["OffsetsInFile"] if "OffsetsInFile" in cells else cells["Offsets"])[group][...], dtype = np.int64)
+
+            min_positions = centres - 0.5 * cell_size
+            max_positions = centres + 0.5 * cell_size
+            if "MinPositions" in cells and "MaxPositions" in cells and group in cells["MinPositions"]:
+                # Particles may have drifted outside their cell
+                min_positions = np.minimum(min_positions, cells["MinPositions"][group][...])
+                max_positions = np.maximum(max_positions, cells["MaxPositions"][group][...])
+            else:
+                min_positions -= DRIFT_PADDING * cell_size
+                max_positions += DRIFT_PADDING * cell_size
+
+        order = np.argsort(offsets, kind = "stable")
+        self.__filepath = filepath
+        self.__part_type = part_type
+        self.__cell_size = cell_size
+        self.__counts = counts[order]
+        self.__offsets = offsets[order]
+        self.__min_positions = min_positions[order]
+        self.__max_positions = max_positions[order]
+
+    def __len__(self):
+        return self.__counts.shape[0]
+
+    @property
+    def filepath(self) -> str:
+        return self.__filepath
+
+    @property
+    def part_type(self) -> PartType:
+        return self.__part_type
+
+    @property
+    def cell_size(self) -> np.ndarray:
+        return self.__cell_size
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self.__counts
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self.__offsets
+
+    @property
+    def min_positions(self) -> np.ndarray:
+        return self.__min_positions
+
+    @property
+    def max_positions(self) -> np.ndarray:
+        return self.__max_positions
+
+    @property
+    def n_particles(self) -> int:
+        return int(self.__counts.sum())
+
+    @staticmethod
+    def merge_ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        Combine sorted, non-overlapping [start, end) ranges that are adjacent.
+
+        Returns an (N, 2) array.
+        """
+        if starts.shape[0] == 0:
+            return np.empty((0, 2), dtype = np.int64)
+        breaks = np.where(starts[1:] != ends[:-1])[0] + 1
+        return np.stack((starts[np.append(0, breaks)], ends[np.append(breaks - 1, starts.shape[0] - 1)]), axis = 1)
@@ -1,12 +1,15 @@
 import velociraptor as vr
 import os
 import glob
-from typing import Union, List, Tuple, Callable
+from typing import Union, List, Tuple, Callable, Iterator
 from unyt import unyt_array
 import numpy as np
 import h5py
 from QuasarCode import Console
 
+# Default number of particles read per block when streaming the catalogue particle files
+DEFAULT_PARTICLE_BLOCK_SIZE = 2**24
+
 class Multifile_VR_Catalogue_Query(object):
     def __init__(self, parent):
         self.__parent = parent
@@ -185,6 +188,62 @@ class Multifile_VR_Catalogue(object):
 
         return return_list if len(return_list) != 1 else return_list[0]
     
+    def iterate_particle_blocks(self, block_size: int = DEFAULT_PARTICLE_BLOCK_SIZE, parttype: Union[int, None] = None, include_bound: bool = True, include_unbound: bool = True) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        Streams the particles associated with haloes in blocks of at most "block_size" particles.
+
+        Blocks are produced in file and offset order, with the bound particles of each file preceding its unbound particles.
+        Only the offsets for the file currently being read are held in memory, so peak memory is set by the block size.
+
+        Yields tuples of (particle_ids, parttypes, halo_rows) where halo_rows indexes the (concatenated) halo property arrays, e.g. self.ids.id.value[halo_rows].
+        If "parttype" is specified, blocks are filtered to include only that particle type and empty blocks are skipped.
+        """
+        if block_size < 1:
+            raise ValueError(f"block_size must be a positive integer (got {block_size}).")
+
+        sections = []
+        if include_bound:
+            sections.append((self.bound_catalog_particles_filepaths, self.bound_catalog_parttypes_filepaths, "Offset"))
+        if include_unbound:
+            sections.append((self.unbound_catalog_particles_filepaths, self.unbound_catalog_parttypes_filepaths, "Offset_unbound"))
+
+        groups_filepaths = self.catalog_groups_filepaths
+
+        halo_row_offset = 0
+        for file_index in range(self.__n_files):
+            with h5py.File(groups_filepaths[file_index], "r") as groups_file:
+                n_halos_in_file = int(groups_file["Num_of_groups"][0])
+                file_offsets = [np.array(groups_file[offset_field], dtype = np.int64) for _, _, offset_field in sections]
+
+            for (particles_filepaths, parttypes_filepaths, _), offsets in zip(sections, file_offsets):
+                with h5py.File(particles_filepaths[file_index], "r") as particles_file, h5py.File(parttypes_filepaths[file_index], "r") as parttypes_file:
+                    particle_ids_dataset = particles_file["Particle_IDs"]
+                    parttypes_dataset = parttypes_file["Particle_types"]
+                    n_particles = particle_ids_dataset.shape[0]
+
+                    for block_start in range(0, n_particles, block_size):
+                        block_end = min(block_start + block_size, n_particles)
+
+                        particle_ids = np.array(particle_ids_dataset[block_start : block_end], dtype = np.int64)
+                        parttypes = np.array(parttypes_dataset[block_start : block_end], dtype = np.int16)
+
+                        # Each particle belongs to the last halo with an offset at or before its position in the file
+                        # (side = "right" ensures haloes with no particles in this section are skipped over)
+                        halo_rows = np.searchsorted(offsets, np.arange(block_start, block_end, dtype = np.int64), side = "right") - 1
+                        halo_rows += halo_row_offset
+
+                        if parttype is not None:
+                            parttype_filter = parttypes == parttype
+                            if not parttype_filter.any():
+                                continue
+                            particle_ids = particle_ids[parttype_filter]
+                            parttypes = parttypes[parttype_filter]
+                            halo_rows = halo_rows[parttype_filter]
+
+                        yield particle_ids, parttypes, halo_rows
+
+            halo_row_offset += n_halos_in_file
+
     def halo_properties_by_particle(self, fields: Union[List[str], List[Tuple[str, Union[np.ndarray, unyt_array]]], str], parttype: int = None, use_cache = True, write_cache = True, overwrite_cache = False) -> dict:
         if isinstance(fields, str) or isinstance(fields, tuple):
             fields = [fields]
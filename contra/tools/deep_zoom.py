@@ -0,0 +1,247 @@
+"""
+File: deep_zoom.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Multi-resolution tiled image pyramids in the Deep Zoom (.dzi) format,
+for browsing images far larger than a single PNG with a static viewer
+such as OpenSeadragon.
+
+The full resolution level is filled in by the caller (as it is
+rendered) in a file backed array, so it never needs to be held in
+memory. Each coarser level is then built by averaging 2 x 2 blocks of
+pixels from the level below, and every level is cut into tiles that are
+coloured and written as PNG files.
+
+Levels may hold a single channel of pixel values, or two channels of a
+weighted quantity and its weights (the pixel values being their ratio)
+so that coarser levels are weighted means.
+
+Public API:
+
+    class DeepZoomPyramid
+    downsample(numpy.ndarray)
+
+Dependancies:
+
+    concurrent
+    image_writer.py (local file)
+    math
+    numpy
+    os
+    typing
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import math
+import numpy as np
+import os
+from typing import Tuple, Union
+
+from .image_writer import apply_colour_lut, normalise, write_png
+
+# Size in pixels of the (square) tiles
+DEFAULT_TILE_SIZE = 256
+
+# Number of rows of the coarser level calculated at once when downsampling
+DOWNSAMPLE_STRIP_ROWS = 1024
+
+# Viewer page, loading OpenSeadragon from a CDN
+_VIEWER_TEMPLATE = """<!doctype html>
+<html>
+<head>
+    <title>{title}</title>
+    <script src="https://cdn.jsdelivr.net/npm/openseadragon@4.1/build/openseadragon/openseadragon.min.js"></script>
+</head>
+<body style="margin: 0; background: black;">
+    <div id="viewer" style="width: 100vw; height: 100vh;"></div>
+    <script>
+        OpenSeadragon({{ id: "viewer", prefixUrl: "https://cdn.jsdelivr.net/npm/openseadragon@4.1/build/openseadragon/images/", tileSources: "{descriptor}", showNavigator: true, maxZoomPixelRatio: 4 }});
+    </script>
+</body>
+</html>
+"""
+
+def downsample(image: np.ndarray) -> np.ndarray:
+    """
+    Average 2 x 2 blocks of pixels over the last two axes of an array.
+
+    Odd rows or columns at the end are averaged over only the pixels present.
+    """
+    height, width = image.shape[-2:]
+    sums = np.zeros(image.shape[:-2] + ((height + 1) // 2, (width + 1) // 2), dtype = np.float64)
+    counts = np.zeros(sums.shape[-2:], dtype = np.float64)
+    for row_offset in (0, 1):
+        for column_offset in (0, 1):
+            part = image[..., row_offset::2, column_offset::2]
+            sums[..., : part.shape[-2], : part.shape[-1]] += part
+            counts[: part.shape[-2], : part.shape[-1]] += 1
+    return sums / counts
+
+def _pixel_values(channels: np.ndarray, log_values: bool) -> np.ndarray:
+    """
+    Values of the pixels from one channel (the values) or two (a weighted quantity and its weights).
+    """
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        values = channels[0] / channels[1] if channels.shape[0] > 1 else np.array(channels[0], dtype = np.float64)
+        return np.log10(values) if log_values else values
+
+class DeepZoomPyramid(object):
+    """
+    Layout of a Deep Zoom image with the descriptor at the specified filepath (e.g. "map.dzi").
+
+    Tiles are written to "<name>_files/<level>/<column>_<row>.png", with level 0 being a single pixel
+    and the final level the full resolution image. Rows and columns are counted from the top left.
+    """
+
+    def __init__(self, filepath: str, width: int, height: int, tile_size: int = DEFAULT_TILE_SIZE):
+        self.__filepath = filepath
+        self.__width = int(width)
+        self.__height = int(height)
+        self.__tile_size = int(tile_size)
+
+    @property
+    def filepath(self) -> str:
+        return self.__filepath
+
+    @property
+    def tiles_directory(self) -> str:
+        return self.__filepath.rsplit(".", 1)[0] + "_files"
+
+    @property
+    def width(self) -> int:
+        return self.__width
+
+    @property
+    def height(self) -> int:
+        return self.__height
+
+    @property
+    def tile_size(self) -> int:
+        return self.__tile_size
+
+    @property
+    def max_level(self) -> int:
+        return int(math.ceil(math.log2(max(self.__width, self.__height, 1))))
+
+    def level_shape(self, level: int) -> Tuple[int, int]:
+        """
+        (width, height) of a level in pixels.
+        """
+        scale = 2**(self.max_level - level)
+        return -(-self.__width // scale), -(-self.__height // scale)
+
+    def tile_grid(self, level: int) -> Tuple[int, int]:
+        """
+        Number of (columns, rows) of tiles in a level.
+        """
+        width, height = self.level_shape(level)
+        return -(-width // self.__tile_size), -(-height // self.__tile_size)
+
+    def tile_filepath(self, level: int, column: int, row: int) -> str:
+        return os.path.join(self.tiles_directory, str(level), f"{column}_{row}.png")
+
+    def _level_array_filepath(self, level: int) -> str:
+        return os.path.join(self.tiles_directory, f"level_{level}_pixels.npy")
+
+    def create_base_level(self, n_channels: int = 1) -> np.ndarray:
+        """
+        File backed array of shape (n_channels, height, width) for the full resolution pixels, to be filled in before calling build.
+
+        Row 0 is the top of the image.
+        """
+        os.makedirs(self.tiles_directory, exist_ok = True)
+        return np.lib.format.open_memmap(self._level_array_filepath(self.max_level), mode = "w+", dtype = np.float32, shape = (n_channels, self.__height, self.__width))
+
+    def build(self, lut: np.ndarray, bad_colour: Tuple[int, int, int, int] = (0, 0, 0, 0), log_values: bool = False, vmin: Union[float, None] = None, vmax: Union[float, None] = None, workers: int = 1):
+        """
+        Create the coarser levels from the base level, colour every level's tiles using a lookup table and write the descriptor.
+
+        Colours are scaled to the range of the full resolution pixel values (logged if log_values is set) unless limits are given.
+        Tiles are written by a pool of worker processes if workers > 1. The level arrays are deleted once their tiles are written.
+        """
+        base_level = np.load(self._level_array_filepath(self.max_level), mmap_mode = "r")
+        if vmin is None or vmax is None:
+            value_range = self.__value_range(base_level, log_values)
+            vmin = value_range[0] if vmin is None else vmin
+            vmax = value_range[1] if vmax is None else vmax
+        del base_level
+
+        executor = ProcessPoolExecutor(max_workers = workers) if workers > 1 else None
+        try:
+            for level in range(self.max_level, -1, -1):
+                if level < self.max_level:
+                    self.__downsample_level(level + 1)
+                    os.remove(self._level_array_filepath(level + 1))
+
+                # Each task writes one row of tiles
+                n_columns, n_rows = self.tile_grid(level)
+                os.makedirs(os.path.join(self.tiles_directory, str(level)), exist_ok = True)
+                tasks = [(self, level, row, lut, bad_colour, log_values, vmin, vmax) for row in range(n_rows)]
+                if executor is not None:
+                    list(executor.map(_write_tile_row, tasks))
+                else:
+                    for task in tasks:
+                        _write_tile_row(task)
+            os.remove(self._level_array_filepath(0))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        self.write_descriptor()
+
+    def __value_range(self, level_array: np.ndarray, log_values: bool) -> Tuple[float, float]:
+        value_min = np.inf
+        value_max = -np.inf
+        for start in range(0, level_array.shape[1], DOWNSAMPLE_STRIP_ROWS):
+            values = _pixel_values(level_array[:, start : start + DOWNSAMPLE_STRIP_ROWS], log_values)
+            values = values[np.isfinite(values)]
+            if values.shape[0] > 0:
+                value_min = min(value_min, float(values.min()))
+                value_max = max(value_max, float(values.max()))
+        return (value_min, value_max) if value_min <= value_max else (0.0, 1.0)
+
+    def __downsample_level(self, level: int):
+        """
+        Create the array for the level below the specified level.
+        """
+        source = np.load(self._level_array_filepath(level), mmap_mode = "r")
+        width, height = self.level_shape(level - 1)
+        target = np.lib.format.open_memmap(self._level_array_filepath(level - 1), mode = "w+", dtype = np.float32, shape = (source.shape[0], height, width))
+        for start in range(0, height, DOWNSAMPLE_STRIP_ROWS):
+            end = min(start + DOWNSAMPLE_STRIP_ROWS, height)
+            target[:, start : end] = downsample(source[:, 2 * start : 2 * end])
+        target.flush()
+        del source, target
+
+    def write_descriptor(self):
+        with open(self.__filepath, "w") as file:
+            file.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+            file.write(f'<Image xmlns="http://schemas.microsoft.com/deepzoom/2008" Format="png" Overlap="0" TileSize="{self.__tile_size}">\n')
+            file.write(f'    <Size Width="{self.__width}" Height="{self.__height}"/>\n')
+            file.write('</Image>\n')
+
+    def write_viewer(self, filepath: Union[str, None] = None, title: str = "") -> str:
+        """
+        Write a static HTML page for browsing the image (by default next to the descriptor).
+
+        Returns the filepath of the page.
+        """
+        if filepath is None:
+            filepath = self.__filepath.rsplit(".", 1)[0] + ".html"
+        descriptor = os.path.relpath(self.__filepath, os.path.dirname(os.path.abspath(filepath))).replace(os.path.sep, "/")
+        with open(filepath, "w") as file:
+            file.write(_VIEWER_TEMPLATE.format(title = title if title != "" else os.path.basename(self.__filepath), descriptor = descriptor))
+        return filepath
+
+def _write_tile_row(task: Tuple[DeepZoomPyramid, int, int, np.ndarray, Tuple[int, int, int, int], bool, float, float]):
+    pyramid, level, row, lut, bad_colour, log_values, vmin, vmax = task
+    level_array = np.load(pyramid._level_array_filepath(level), mmap_mode = "r")
+    tile_size = pyramid.tile_size
+    strip = np.asarray(level_array[:, row * tile_size : (row + 1) * tile_size])
+    n_columns = pyramid.tile_grid(level)[0]
+    for column in range(n_columns):
+        values = _pixel_values(strip[:, :, column * tile_size : (column + 1) * tile_size], log_values)
+        write_png(pyramid.tile_filepath(level, column, row), apply_colour_lut(normalise(values, vmin, vmax), lut, bad_colour))
@@ -0,0 +1,133 @@
+"""
+File: image_writer.py
+
+Author: Christopher Rowe
+Vesion: 1.0.0
+Date:   19/10/2026
+
+Writes 2D arrays directly to PNG files, without creating a figure.
+
+Values are normalised and coloured using a 256 entry lookup table taken
+from a colour map, so each pixel of the array becomes exactly one pixel
+of the image. Arrays can also be written as 16 bit greyscale images of
+the normalised values for colouring elsewhere.
+
+Public API:
+
+    make_colour_lut(matplotlib.colors.Colormap, int)
+    normalise(numpy.ndarray, float, float)
+    apply_colour_lut(numpy.ndarray, numpy.ndarray, Tuple[int, int, int, int])
+    write_png(str, numpy.ndarray)
+    write_colour_mapped_png(str, numpy.ndarray, matplotlib.colors.Colormap)
+    write_greyscale_png(str, numpy.ndarray)
+
+Dependancies:
+
+    numpy
+    struct
+    typing
+    zlib
+"""
+
+import numpy as np
+import struct
+from typing import Tuple, Union
+import zlib
+
+# Number of colours in a lookup table
+DEFAULT_LUT_SIZE = 256
+
+# Colour type codes used by the PNG header for each number of channels
+_PNG_COLOUR_TYPES = { 1: 0, 3: 2, 4: 6 }
+
+def make_colour_lut(colour_map, n_colours: int = DEFAULT_LUT_SIZE) -> np.ndarray:
+    """
+    Sample a (matplotlib) colour map into an (n_colours, 4) array of RGBA bytes.
+    """
+    return np.asarray(colour_map(np.linspace(0.0, 1.0, n_colours), bytes = True), dtype = np.uint8)
+
+def normalise(image: np.ndarray, vmin: Union[float, None] = None, vmax: Union[float, None] = None) -> np.ndarray:
+    """
+    Linearly rescale the finite values of an image to [0, 1], using their range unless limits are given.
+
+    Non-finite values are returned as NaN.
+    """
+    image = np.asarray(image, dtype = np.float64)
+    finite = np.isfinite(image)
+    if vmin is None:
+        vmin = image[finite].min() if finite.any() else 0.0
+    if vmax is None:
+        vmax = image[finite].max() if finite.any() else 1.0
+    result = np.full(image.shape, np.nan)
+    scale = (vmax - vmin) if vmax > vmin else 1.0
+    np.subtract(image, vmin, out = result, where = finite)
+    np.divide(result, scale, out = result, where = finite)
+    np.clip(result, 0.0, 1.0, out = result, where = finite)
+    return result
+
+def apply_colour_lut(normalised_image: np.ndarray, lut: np.ndarray, bad_colour: Tuple[int, int, int, int] = (0, 0, 0, 0)) -> np.ndarray:
+    """
+    Colour an image of values in [0, 1] (NaN for invalid pixels) using a lookup table.
+
+    Returns an array of RGBA bytes with one more dimension than the image.
+    """
+    n_colours = lut.shape[0]
+    valid = np.isfinite(normalised_image)
+    lut_indices = np.zeros(normalised_image.shape, dtype = np.int64)
+    lut_indices[valid] = np.minimum((normalised_image[valid] * n_colours).astype(np.int64), n_colours - 1)
+    pixels = lut[lut_indices]
+    pixels[~valid] = bad_colour
+    return pixels
+
+def write_png(filepath: str, pixels: np.ndarray):
+    """
+    Write an array of pixels to a PNG file. The first row of the array is the top of the image.
+
+    Pixels may be (height, width) greyscale or (height, width, 3|4) RGB(A), with either uint8 or uint16 values.
+    """
+    if pixels.ndim == 2:
+        pixels = pixels[:, :, None]
+    height, width, n_channels = pixels.shape
+    if n_channels not in _PNG_COLOUR_TYPES:
+        raise ValueError(f"Images must have 1, 3 or 4 channels, not {n_channels}.")
+    if pixels.dtype == np.uint8:
+        bit_depth = 8
+    elif pixels.dtype == np.uint16:
+        bit_depth = 16
+    else:
+        raise ValueError(f"Pixel values must be uint8 or uint16, not {pixels.dtype}.")
+
+    # Each row is preceded by its filter type (0 = no filtering)
+    row_bytes = np.ascontiguousarray(pixels.astype(pixels.dtype.newbyteorder(">"))).view(np.uint8).reshape((height, -1))
+    raw_data = np.empty((height, row_bytes.shape[1] + 1), dtype = np.uint8)
+    raw_data[:, 0] = 0
+    raw_data[:, 1:] = row_bytes
+
+    def chunk(chunk_type: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data) & 0xFFFFFFFF)
+
+    with open(filepath, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, _PNG_COLOUR_TYPES[n_channels], 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(raw_data.tobytes(), 6)))
+        file.write(chunk(b"IEND", b""))
+
+def write_colour_mapped_png(filepath: str, image: np.ndarray, colour_map, vmin: Union[float, None] = None, vmax: Union[float, None] = None, origin: str = "lower"):
+    """
+    Colour an image using a (matplotlib) colour map and write it to a PNG file with one pixel per element.
+
+    With origin = "lower", the first row of the image is placed at the bottom (as with imshow).
+    """
+    bad_colour = tuple(int(round(value * 255)) for value in colour_map.get_bad()) if hasattr(colour_map, "get_bad") else (0, 0, 0, 0)
+    pixels = apply_colour_lut(normalise(image, vmin, vmax), make_colour_lut(colour_map), bad_colour)
+    write_png(filepath, pixels[::-1] if origin == "lower" else pixels)
+
+def write_greyscale_png(filepath: str, image: np.ndarray, vmin: Union[float, None] = None, vmax: Union[float, None] = None, origin: str = "lower"):
+    """
+    Write the normalised values of an image to a 16 bit greyscale PNG file. Invalid pixels are written as 0.
+    """
+    normalised_image = normalise(image, vmin, vmax)
+    pixels = np.zeros(normalised_image.shape, dtype = np.uint16)
+    valid = np.isfinite(normalised_image)
+    pixels[valid] = np.round(normalised_image[valid] * 65535).astype(np.uint16)
+    write_png(filepath, pixels[::-1] if origin == "lower" else pixels)
@@ -60,7 +60,7 @@ critical_gas_density=$(gas-crit-density "$present_day_data" -u "Msun/Mpc**3")
 
 # # Make modified snapshot
 # 
-# if ! [ -f ./gas_particle_ejection_tracking__halo_masses.pickle ]
+# if ! [ -f ./gas_particle_ejection_tracking.hdf5 ]
 # then
 #     echo ""
 #     echo "Trace Gas Halo Interactions"
@@ -80,17 +80,17 @@ critical_gas_density=$(gas-crit-density "$present_day_data" -u "Msun/Mpc**3")
 #     echo "Found updated snapshot. Remove or rename this data to re-generate."
 # fi
 # 
-# #if ! [ -f ./gas_particle_ejection_tracking__present_day_halo_id.pickle ]
+# #if ! python -c "import h5py, sys; sys.exit('PartType0/traced_halo_ids' not in h5py.File('modified_present_day_snap.hdf5', 'r'))"
 # #then
 # #    echo ""
 # #    echo "Tracking Haloes To Present Day"
-# #    get-matched-present-day-haloes modified_present_day_snap.hdf5 "$COLIBRE_DATA_PIPLINE__LAST_SNAPSHOT" "$COLIBRE_DATA_PIPLINE__CATALOGUE_DIRECTORY" "$COLIBRE_DATA_PIPLINE__CATALOGUE_FILE_TEMPLATE" "$COLIBRE_DATA_PIPLINE__CATALOGUE_DIRECTORY" "$COLIBRE_DATA_PIPLINE__CATALOGUE_GROUPS_FILE_TEMPLATE" -v -d
+# #    get-matched-present-day-haloes modified_present_day_snap.hdf5 "$COLIBRE_DATA_PIPLINE__LAST_SNAPSHOT" "$COLIBRE_DATA_PIPLINE__CATALOGUE_DIRECTORY" "$COLIBRE_DATA_PIPLINE__CATALOGUE_FILE_TEMPLATE" -v -d
 # #else
 # #    echo ""
 # #    echo "Found forward tracked haloes. Remove or rename this data to re-generate."
 # #fi
 # 
-# # if ! [ -f ./gas_particle_ejection_tracking__present_day_ejection_distance.pickle ]
+# # if ! python -c "import h5py, sys; sys.exit('PartType0/last_halo_ejection_distance' not in h5py.File('modified_present_day_snap.hdf5', 'r'))"
 # # then
 # #     echo ""
 # #     echo "Calculate Gas Ejection Displacement"
@@ -104,80 +104,104 @@ critical_gas_density=$(gas-crit-density "$present_day_data" -u "Msun/Mpc**3")
 
 # Maps
 #TODO: URGENT why is the box side length hard set to 25 !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+# Maps that are missing are rendered together with a single load of each snapshot
+slice_map_params="--gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z 0 --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP"
+
+present_day_maps=()
+
 # Surface Density Map
-if ! [ -f ./map_surface_density*.png ]
+if ! [ -f ./map_surface_density*_sph.png ]
 then
-    echo ""
     echo "Surface Density Map"
-    sph-map $present_day_data map_surface_density.png -t "\$\Sigma^{\rm gas}\$" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    present_day_maps+=('{"output-file": "map_surface_density.png", "title": "$\\Sigma^{\\rm gas}$"}')
 fi
 
 # Metal Surface Density Map
-#if ! [ -f ./map_mean_mass_weighted_metal_mass*.png ]
-if [ $(ls -1 ./map_mean_mass_weighted_metal_mass*.png 2>/dev/null | wc -l) -eq 0 ]
+#if ! [ -f ./map_mean_mass_weighted_metal_mass*_sph.png ]
+if [ $(ls -1 ./map_mean_mass_weighted_metal_mass*_sph.png 2>/dev/null | wc -l) -eq 0 ]
 then
-    echo ""
     echo "Metal Surface Density Map"
-    sph-map $present_day_data map_mean_mass_weighted_metal_mass.png -t "\$\Sigma^{\rm gas}_{\rm metal}\$" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.metal_mass_fractions*gas.masses -u "Msun" -c gas.masses --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    present_day_maps+=('{"output-file": "map_mean_mass_weighted_metal_mass.png", "title": "$\\Sigma^{\\rm gas}_{\\rm metal}$", "smoothing-attr": "gas.metal_mass_fractions*gas.masses", "smoothing-unit": "Msun", "contour": "gas.masses"}')
 fi
 
 # Metal Mass Fraction Map
-if ! [ -f ./map_mean_mass_weighted_metal_mass_fraction*.png ]
+if ! [ -f ./map_mean_mass_weighted_metal_mass_fraction*_sph.png ]
 then
-    echo ""
     echo "Metal Mass Fraction Map"
-    sph-map $present_day_data map_mean_mass_weighted_metal_mass_fraction.png -t "\$M_Z/M\$ \$\rm Z_{\odot}\$" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s "gas.metal_mass_fractions/$Zsun" -u "" -p --log-pre-intergration -c gas.masses --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    present_day_maps+=('{"output-file": "map_mean_mass_weighted_metal_mass_fraction.png", "title": "$M_Z/M$ $\\rm Z_{\\odot}$", "smoothing-attr": "gas.metal_mass_fractions/'"$Zsun"'", "smoothing-unit": "", "no-density": true, "log-pre-intergration": true, "contour": "gas.masses"}')
 fi
 
 # Mean Metal Mass Weighted Redshift Map
-if ! [ -f ./map_mean_metal_weighted_redshift*.png ]
+if ! [ -f ./map_mean_metal_weighted_redshift*_sph.png ]
 then
-    echo ""
     echo "Mean Metal Mass Weighted Redshift Map"
-    sph-map $present_day_data map_mean_metal_weighted_redshift.png -t "\$z_Z\$+1" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.mean_metal_weighted_redshifts+1 -u "" -p --log-pre-intergration --limit-fields gas.mean_metal_weighted_redshifts --limit-units "" --limits-min 0.0 -c gas.masses --exclude-limits-from-contour --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    present_day_maps+=('{"output-file": "map_mean_metal_weighted_redshift.png", "title": "$z_Z$+1", "smoothing-attr": "gas.mean_metal_weighted_redshifts+1", "smoothing-unit": "", "no-density": true, "log-pre-intergration": true, "limit-fields": ["gas.mean_metal_weighted_redshifts"], "limit-units": [""], "limits-min": [0.0], "contour": "gas.masses", "exclude-limits-from-contour": true}')
 fi
 
-# Last Halo Mass Map
-if ! [ -f ./map_last_enrichment_halo_mass*.png ]
+if [ ${#present_day_maps[@]} -gt 0 ]
 then
     echo ""
+    echo "Rendering ${#present_day_maps[@]} present day map(s)"
+    echo "[$(IFS=,; echo "${present_day_maps[*]}")]" > ./present_day_map_specs.json
+    sph-map $present_day_data map.png --maps ./present_day_map_specs.json $slice_map_params
+fi
+
+modified_snapshot_maps=()
+
+# Last Halo Mass Map
+if ! [ -f ./map_last_enrichment_halo_mass*_sph.png ]
+then
     echo "Last Halo Mass Map"
-    sph-map modified_present_day_snap.hdf5 map_last_enrichment_halo_mass.png -t "\$M_{\rm halo}\$" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.last_halo_masses -u "Msun" -p --log-pre-intergration --limit-fields gas.last_halo_masses --limit-units "Msun" --limits-min "$just_above_zero" -c gas.masses --exclude-limits-from-contour --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    modified_snapshot_maps+=('{"output-file": "map_last_enrichment_halo_mass.png", "title": "$M_{\\rm halo}$", "smoothing-attr": "gas.last_halo_masses", "smoothing-unit": "Msun", "no-density": true, "log-pre-intergration": true, "limit-fields": ["gas.last_halo_masses"], "limit-units": ["Msun"], "limits-min": ['"$just_above_zero"'], "contour": "gas.masses", "exclude-limits-from-contour": true}')
 fi
-if ! [ -f ./map_low_density_last_enrichment_halo_mass*.png ]
+if ! [ -f ./map_low_density_last_enrichment_halo_mass*_sph.png ]
 then
-    echo ""
     echo "(Low Density) Last Halo Mass Map"
-    sph-map modified_present_day_snap.hdf5 map_low_density_last_enrichment_halo_mass.png -t "\$M_{\rm halo}\$" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.last_halo_masses -u "Msun" -p --log-pre-intergration --limit-fields "gas.last_halo_masses;gas.densities/#<$critical_gas_density>#" --limit-units "Msun;" --limits-min "$just_above_zero;" --limits-max ";2.5" -c gas.masses --exclude-limits-from-contour --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    modified_snapshot_maps+=('{"output-file": "map_low_density_last_enrichment_halo_mass.png", "title": "$M_{\\rm halo}$", "smoothing-attr": "gas.last_halo_masses", "smoothing-unit": "Msun", "no-density": true, "log-pre-intergration": true, "limit-fields": ["gas.last_halo_masses", "gas.densities/#<'"$critical_gas_density"'>#"], "limit-units": ["Msun", ""], "limits-min": ['"$just_above_zero"', null], "limits-max": [null, 2.5], "contour": "gas.masses", "exclude-limits-from-contour": true}')
 fi
-if ! [ -f ./map_mid_density_last_enrichment_halo_mass*.png ]
+if ! [ -f ./map_mid_density_last_enrichment_halo_mass*_sph.png ]
 then
-    echo ""
     echo "(Mid Density) Last Halo Mass Map"
-    sph-map modified_present_day_snap.hdf5 map_mid_density_last_enrichment_halo_mass.png -t "\$M_{\rm halo}\$" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.last_halo_masses -u "Msun" -p --log-pre-intergration --limit-fields "gas.last_halo_masses;gas.densities/#<$critical_gas_density>#" --limit-units "Msun;" --limits-min "$just_above_zero;2.5" --limits-max ";7.5" -c gas.masses --exclude-limits-from-contour --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    modified_snapshot_maps+=('{"output-file": "map_mid_density_last_enrichment_halo_mass.png", "title": "$M_{\\rm halo}$", "smoothing-attr": "gas.last_halo_masses", "smoothing-unit": "Msun", "no-density": true, "log-pre-intergration": true, "limit-fields": ["gas.last_halo_masses", "gas.densities/#<'"$critical_gas_density"'>#"], "limit-units": ["Msun", ""], "limits-min": ['"$just_above_zero"', 2.5], "limits-max": [null, 7.5], "contour": "gas.masses", "exclude-limits-from-contour": true}')
 fi
-if ! [ -f ./map_high_density_last_enrichment_halo_mass*.png ]
+if ! [ -f ./map_high_density_last_enrichment_halo_mass*_sph.png ]
 then
-    echo ""
     echo "(High Density) Last Halo Mass Map"
-    sph-map modified_present_day_snap.hdf5 map_high_density_last_enrichment_halo_mass.png -t "\$M_{\rm halo}\$" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.last_halo_masses -u "Msun" -p --log-pre-intergration --limit-fields "gas.last_halo_masses;gas.densities/#<$critical_gas_density>#" --limit-units "Msun;" --limits-min "$just_above_zero;7.5" -c gas.masses --exclude-limits-from-contour --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length $COLIBRE_DATA_PIPLINE__SLICE_WIDTH --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
+    modified_snapshot_maps+=('{"output-file": "map_high_density_last_enrichment_halo_mass.png", "title": "$M_{\\rm halo}$", "smoothing-attr": "gas.last_halo_masses", "smoothing-unit": "Msun", "no-density": true, "log-pre-intergration": true, "limit-fields": ["gas.last_halo_masses", "gas.densities/#<'"$critical_gas_density"'>#"], "limit-units": ["Msun", ""], "limits-min": ['"$just_above_zero"', 7.5], "contour": "gas.masses", "exclude-limits-from-contour": true}')
+fi
+
+if [ ${#modified_snapshot_maps[@]} -gt 0 ]
+then
+    echo ""
+    echo "Rendering ${#modified_snapshot_maps[@]} modified snapshot map(s)"
+    echo "[$(IFS=,; echo "${modified_snapshot_maps[*]}")]" > ./modified_snapshot_map_specs.json
+    sph-map modified_present_day_snap.hdf5 map.png --maps ./modified_snapshot_map_specs.json $slice_map_params
+fi
+
+# Surface Density Map Pyramid (optional)
+if [ -n "$COLIBRE_DATA_PIPLINE__MAP_PYRAMID_SIZE" ] && [ $(ls -1 ./map_surface_density_pyramid*_sph.dzi 2>/dev/null | wc -l) -eq 0 ]
+then
+    echo ""
+    echo "Surface Density Map Pyramid"
+    # Tiles of at most 8192px are rendered in parallel
+    sph-map $present_day_data map_surface_density_pyramid.png -t '$\Sigma^{\rm gas}$' --pyramid -r $COLIBRE_DATA_PIPLINE__MAP_PYRAMID_SIZE --tiles $(( ($COLIBRE_DATA_PIPLINE__MAP_PYRAMID_SIZE + 8191) / 8192 )) --workers $(nproc) $slice_map_params
 fi
 
 # # Ejection Radius Map
-# if ! [ -f ./map_halo_ejection_radius*.png ]
+# if ! [ -f ./map_halo_ejection_radius*_sph.png ]
 # then
 #     echo ""
 #     echo "Halo Ejection Radius Map"
 #     sph-map modified_present_day_snap.hdf5 map_halo_ejection_radius.png -t "Ejection Radius" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.last_halo_ejection_distance -u "Mpc" -p --log-pre-intergration --limit-fields gas.last_halo_ejection_distance --limit-units "Mpc" --limits-min "0" -c gas.masses --exclude-limits-from-contour --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length 25 --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
 # fi
 # 
-# #if ! [ -f ./map_halo_metals_ejection_radius*.png ]
+# #if ! [ -f ./map_halo_metals_ejection_radius*_sph.png ]
 # #then
 # #    echo ""
 # #    echo "Halo Metal Ejection Radius Map"
 # #    sph-map modified_present_day_snap.hdf5 map_halo_metals_ejection_radius.png -t "Ejection Radius" --gas -x $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X -y $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y -z "0" --projection -w $COLIBRE_DATA_PIPLINE__SLICE_WIDTH -s gas.last_halo_ejection_distance -u "Mpc" -p --log-pre-intergration --limit-fields "gas.last_halo_ejection_distance;gas.metal_mass_fractions" --limit-units "Mpc;" --limits-min "0;$just_above_zero" -c gas.masses --exclude-limits-from-contour --centre-x-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_X --centre-y-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Y --centre-z-position $COLIBRE_DATA_PIPLINE__SLICE_CENTRE_Z --side-length 25 --z-side-length $COLIBRE_DATA_PIPLINE__SLICE_DEPTH $COLIBRE_DATA_PIPLINE__MAP_COLOURMAP
 # #fi
-# if ! [ -f ./map_halo_nonzero_ejection_radius*.png ]
+# if ! [ -f ./map_halo_nonzero_ejection_radius*_sph.png ]
 # then
 #     echo ""
 #     echo "Halo Nonzero Ejection Radius Map"
@@ -186,7 +210,7 @@ fi
 # ##TODO: maths dosen't work with floating point?!
 # #for i in 0 1 2 3 4
 # #do
-# #    if ! [ -f ./map_slice_halo_ejection_radius*.png ]
+# #    if ! [ -f ./map_slice_halo_ejection_radius*_sph.png ]
 # #    then
 # #        echo ""
 # #        echo "Halo Ejection Radius Map (slice)"
@@ -198,25 +222,29 @@ fi
 
 # Histograms
 
-# Particle Density Histogram
+# Particle Density Histograms
+# Every weighting is histogrammed from a single read of each snapshot
 if ! [ -f ./particle_density_hist.png ]
 then
     echo ""
     echo "Particle Density Histogram"
 
-    density-hist $present_day_data particle_density_hist.png -l
-    density-hist $present_day_data particle_density_hist__metals.png --hist-metals -l
-    density-hist $present_day_data particle_density_hist__mass.png -m -l --max-y 0.2
-    density-hist $present_day_data particle_density_hist__metal_mass.png -e -l --max-y 0.2
-    density-hist $present_day_data particle_density_hist__volume.png -s -l
-    density-hist $present_day_data particle_density_hist__metal_volume.png -a -l
+    present_day_density_hists=()
+    present_day_density_hists+=('{"output-file": "particle_density_hist.png"}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__metals.png", "hist-metals": true}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__mass.png", "sum-mass": true, "max-y": 0.2}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__metal_mass.png", "sum-metal-mass": true, "max-y": 0.2}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__volume.png", "sum-volume": true}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__metal_volume.png", "sum-metal-volume": true}')
 
-    density-hist $present_day_data particle_density_hist__logged.png --log-y-axis -l
-    density-hist $present_day_data particle_density_hist__logged__metals.png --hist-metals --log-y-axis -l
-    density-hist $present_day_data particle_density_hist__logged__mass.png --log-y-axis -m -l
-    density-hist $present_day_data particle_density_hist__logged__metal_mass.png --log-y-axis -e -l
-    density-hist $present_day_data particle_density_hist__logged__volume.png --log-y-axis -s -l
-    density-hist $present_day_data particle_density_hist__logged__metal_volume.png --log-y-axis -a -l
+    present_day_density_hists+=('{"output-file": "particle_density_hist__logged.png", "log-y-axis": true}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__logged__metals.png", "hist-metals": true, "log-y-axis": true}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__logged__mass.png", "sum-mass": true, "log-y-axis": true}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__logged__metal_mass.png", "sum-metal-mass": true, "log-y-axis": true}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__logged__volume.png", "sum-volume": true, "log-y-axis": true}')
+    present_day_density_hists+=('{"output-file": "particle_density_hist__logged__metal_volume.png", "sum-metal-volume": true, "log-y-axis": true}')
+    echo "[$(IFS=,; echo "${present_day_density_hists[*]}")]" > ./particle_density_hist_specs.json
+    density-hist $present_day_data particle_density_hist.png -l --histograms ./particle_density_hist_specs.json
 fi
 
 # Particle Density Histogram
@@ -225,19 +253,22 @@ then
     echo ""
     echo "(Matched) Particle Density Histogram"
 
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__matched_halo_particles.png -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__matched_halo_particles__metals.png --hist-metals -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__matched_halo_particles__mass.png -m -l --max-y 0.2 --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__matched_halo_particles__metal_mass.png -e -l --max-y 0.2 --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__matched_halo_particles__volume.png -s -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__matched_halo_particles__metal_volume.png -a -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
+    matched_density_hists=()
+    matched_density_hists+=('{"output-file": "particle_density_hist__matched_halo_particles.png"}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__matched_halo_particles__metals.png", "hist-metals": true}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__matched_halo_particles__mass.png", "sum-mass": true, "max-y": 0.2}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__matched_halo_particles__metal_mass.png", "sum-metal-mass": true, "max-y": 0.2}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__matched_halo_particles__volume.png", "sum-volume": true}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__matched_halo_particles__metal_volume.png", "sum-metal-volume": true}')
 
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__logged__matched_halo_particles.png --log-y-axis -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__logged__matched_halo_particles__metals.png --hist-metals --log-y-axis -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__logged__matched_halo_particles__mass.png --log-y-axis -m -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__logged__matched_halo_particles__metal_mass.png --log-y-axis -e -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__logged__matched_halo_particles__volume.png --log-y-axis -s -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
-    density-hist modified_present_day_snap.hdf5 particle_density_hist__logged__matched_halo_particles__metal_volume.png --log-y-axis -a -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered
+    matched_density_hists+=('{"output-file": "particle_density_hist__logged__matched_halo_particles.png", "log-y-axis": true}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__logged__matched_halo_particles__metals.png", "hist-metals": true, "log-y-axis": true}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__logged__matched_halo_particles__mass.png", "sum-mass": true, "log-y-axis": true}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__logged__matched_halo_particles__metal_mass.png", "sum-metal-mass": true, "log-y-axis": true}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__logged__matched_halo_particles__volume.png", "sum-volume": true, "log-y-axis": true}')
+    matched_density_hists+=('{"output-file": "particle_density_hist__logged__matched_halo_particles__metal_volume.png", "sum-metal-volume": true, "log-y-axis": true}')
+    echo "[$(IFS=,; echo "${matched_density_hists[*]}")]" > ./particle_density_hist__matched_halo_particles_specs.json
+    density-hist modified_present_day_snap.hdf5 particle_density_hist__matched_halo_particles.png -l --limit-fields "last_halo_masses" --limit-units "Msun" --limits-min "0" --plot-unfiltered --selection matched_halo_particles --histograms ./particle_density_hist__matched_halo_particles_specs.json
 fi
 
 # # Gas particle Ejection Radius Histogram
@@ -496,31 +527,38 @@ echo ""
 echo "MAKING HTML PAGE"
 
 cp $scripts_directory/_example_pipeline_view.html ./view.html
-search_result=( map_surface_density*.png )
+search_result=( map_surface_density*_sph.png )
 sed -i "s@{sd_map_file}@${search_result[0]}@" ./view.html
-search_result=( map_mean_mass_weighted_metal_mass*.png )
+if [ $(ls -1 ./map_surface_density_pyramid*_sph.html 2>/dev/null | wc -l) -gt 0 ]
+then
+    search_result=( map_surface_density_pyramid*_sph.html )
+    sed -i "s@{sd_map_pyramid_viewer}@${search_result[0]}@" ./view.html
+else
+    sed -i "/{sd_map_pyramid_viewer}/d" ./view.html
+fi
+search_result=( map_mean_mass_weighted_metal_mass*_sph.png )
 sed -i "s@{mmwmm_map_file}@${search_result[0]}@" ./view.html
-search_result=( map_mean_mass_weighted_metal_mass_fraction*.png )
+search_result=( map_mean_mass_weighted_metal_mass_fraction*_sph.png )
 sed -i "s@{mmwmmf_map_file}@${search_result[0]}@" ./view.html
-search_result=( map_mean_mass_weighted_metalicity*.png )
+search_result=( map_mean_mass_weighted_metalicity*_sph.png )
 sed -i "s@{mmwm_map_file}@${search_result[0]}@" ./view.html
-search_result=( map_mean_metal_weighted_redshift*.png )
+search_result=( map_mean_metal_weighted_redshift*_sph.png )
 sed -i "s@{mmwr_map_file}@${search_result[0]}@" ./view.html
-search_result=( map_last_enrichment_halo_mass*.png )
+search_result=( map_last_enrichment_halo_mass*_sph.png )
 sed -i "s@{lhm_map_file}@${search_result[0]}@" ./view.html
 
-search_result=( map_low_density_last_enrichment_halo_mass*.png )
+search_result=( map_low_density_last_enrichment_halo_mass*_sph.png )
 sed -i "s@{ldlhm_map_file}@${search_result[0]}@" ./view.html
-search_result=( map_mid_density_last_enrichment_halo_mass*.png )
+search_result=( map_mid_density_last_enrichment_halo_mass*_sph.png )
 sed -i "s@{mdlhm_map_file}@${search_result[0]}@" ./view.html
-search_result=( map_high_density_last_enrichment_halo_mass*.png )
+search_result=( map_high_density_last_enrichment_halo_mass*_sph.png )
 sed -i "s@{hdlhm_map_file}@${search_result[0]}@" ./view.html
 
-# search_result=( map_halo_ejection_radius*.png )
+# search_result=( map_halo_ejection_radius*_sph.png )
 # sed -i "s@{her_map_file}@${search_result[0]}@" ./view.html
-# #search_result=( map_halo_metals_ejection_radius*.png )
+# #search_result=( map_halo_metals_ejection_radius*_sph.png )
 # #sed -i "s@{hmer_map_file}@${search_result[0]}@" ./view.html
-# #search_result=( map_halo_nonzero_ejection_radius*.png )
+# #search_result=( map_halo_nonzero_ejection_radius*_sph.png )
 # #sed -i "s@{hner_map_file}@${search_result[0]}@" ./view.html
 
 
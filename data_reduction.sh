@@ -48,7 +48,7 @@ cd $COLIBRE_DATA_PIPLINE__PIPELINE_OUTPUT_DIRECTORY
 
 
 
-#if ! [ -f ./stars_particle_ejection_tracking__halo_masses.pickle ]
+#if ! [ -f ./stars_particle_ejection_tracking.hdf5 ]
 #then
 #    echo ""
 #    echo "Trace Gas Halo Interactions"
@@ -62,7 +62,7 @@ cd $COLIBRE_DATA_PIPLINE__PIPELINE_OUTPUT_DIRECTORY
 
 # Make modified snapshot
 
-if ! [ -f ./gas_particle_ejection_tracking__halo_masses.pickle ]
+if ! [ -f ./gas_particle_ejection_tracking.hdf5 ]
 then
     echo ""
     echo "Trace Gas Halo Interactions"
@@ -83,17 +83,17 @@ else
     echo "Found updated snapshot. Remove or rename this data to re-generate."
 fi
 
-#if ! [ -f ./gas_particle_ejection_tracking__present_day_halo_id.pickle ]
+#if ! python -c "import h5py, sys; sys.exit('PartType0/traced_halo_ids' not in h5py.File('modified_present_day_snap.hdf5', 'r'))"
 #then
 #    echo ""
 #    echo "Tracking Haloes To Present Day"
-#    get-matched-present-day-haloes modified_present_day_snap.hdf5 "$COLIBRE_DATA_PIPLINE__LAST_SNAPSHOT" "$COLIBRE_DATA_PIPLINE__CATALOGUE_DIRECTORY" "$COLIBRE_DATA_PIPLINE__CATALOGUE_FILE_TEMPLATE" "$COLIBRE_DATA_PIPLINE__CATALOGUE_DIRECTORY" "$COLIBRE_DATA_PIPLINE__CATALOGUE_GROUPS_FILE_TEMPLATE" -v -d
+#    get-matched-present-day-haloes modified_present_day_snap.hdf5 "$COLIBRE_DATA_PIPLINE__LAST_SNAPSHOT" "$COLIBRE_DATA_PIPLINE__CATALOGUE_DIRECTORY" "$COLIBRE_DATA_PIPLINE__CATALOGUE_FILE_TEMPLATE" -v -d
 #else
 #    echo ""
 #    echo "Found forward tracked haloes. Remove or rename this data to re-generate."
 #fi
 
-# if ! [ -f ./gas_particle_ejection_tracking__present_day_ejection_distance.pickle ]
+# if ! python -c "import h5py, sys; sys.exit('PartType0/last_halo_ejection_distance' not in h5py.File('modified_present_day_snap.hdf5', 'r'))"
 # then
 #     echo ""
 #     echo "Calculate Gas Ejection Displacement"
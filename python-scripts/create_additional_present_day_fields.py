@@ -1,10 +1,8 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "2.0.0"
-DATE = "06/07/2023"
+VERSION = "3.0.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Inserts the last halo mass data into a copy of the latest snapshot."
 
-import numpy as np
-import pickle
 import swiftsimio as sw
 import unyt
 
@@ -12,22 +10,17 @@ from QuasarCode import source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.io import save_particle_fields, get_cgs_conversions, PartType
+from contra.io import save_particle_fields, get_cgs_conversions, PartType, HaloTrackingResultStore
 from contra.io.save_swift_snap_field import SIGNED_INT_64
 
 def __main(data):
     snap_data_present_day = sw.load(data)
 
-    with open("gas_particle_ejection_tracking__halo_snapshot_number_indexes.pickle", "rb") as file:
-        final_halo_snap_number_index = pickle.load(file)
-    with open("gas_particle_ejection_tracking__halo_snapshot_numbers.pickle", "rb") as file:
-        final_halo_snap_numbers = pickle.load(file)
-    with open("gas_particle_ejection_tracking__halo_ids_in_snapshot.pickle", "rb") as file:
-        final_halo_ids = pickle.load(file)
-    with open("gas_particle_ejection_tracking__halo_masses.pickle", "rb") as file:
-        final_halo_masses = pickle.load(file)
-
-    final_halo_snap_numbers = np.array([int(s) for s in final_halo_snap_numbers], dtype = np.int16)
+    with HaloTrackingResultStore("gas_particle_ejection_tracking.hdf5") as tracking_results:
+        final_halo_snap_number_index = tracking_results.halo_snapshot_indexes
+        final_halo_snap_numbers = tracking_results.halo_snapshot_numbers
+        final_halo_ids = tracking_results.halo_ids
+        final_halo_masses = tracking_results.halo_masses
 
     final_halo_masses = final_halo_masses * unyt.physical_constants.Msun_cgs / get_cgs_conversions("Masses", PartType.gas, snap_data_present_day)[0]
 
@@ -57,7 +50,7 @@ if __name__ == "__main__":
                            VERSION,
                            DATE,
                            DESCRIPTION,
-                           ["numpy", "pickle", "QuasarCode", "swiftsimio", "unyt"],
+                           ["h5py", "numpy", "QuasarCode", "swiftsimio", "unyt"],
                            ["/storage/simulations/COLIBRE_ZOOMS/COLIBRE/five_spheres_20211006/volume04/l0/snapshots/snapshot_0007.hdf5"],
                            args_info,
                            kwargs_info)
@@ -1,116 +1,149 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "2.0.0"
-DATE = "06/07/2023"
+VERSION = "2.5.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Creates a histogram for the desnities of gas particles from a SWIFT snapshot."
 
+import json
 from matplotlib import pyplot as plt
 import numpy as np
 import swiftsimio as sw
-from typing import List, Union
+from typing import Dict, List, Tuple, Union
 
 from QuasarCode import source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.filters import BoxRegion
-from contra.calculations import get_critical_gas_density as critical_gas_density
-from contra.io.swift_data_expression import parse_string as make_attribute
-
-def __main(data, output_file, log_y_axis: bool, limit_fields: List[str], limit_units: List[str], limits_min: List[float], limits_max: List[float], hist_metals: bool, sum_mass: bool, sum_metal_mass: bool, sum_volume: bool, sum_metal_volume: bool, use_line: bool, plot_unfiltered: bool, max_y: Union[float, None], **kwargs):
-    nBins = 40
-
+from contra.filters import BoxRegion, ParticleSelection, SelectionStore
+from contra.io import LoadPlan, PartType
+from contra.calculations import get_critical_gas_density as critical_gas_density, Histogram, update_range
+
+# Parameters of a histogram that may be set separately for each figure
+HISTOGRAM_SPEC_PARAMETERS = ("output_file", "log_y_axis", "hist_metals", "sum_mass", "sum_metal_mass", "sum_volume", "sum_metal_volume", "use_line", "plot_unfiltered", "max_y")
+
+# Quantity summed in each bin (by particle density) for each type of histogram
+WEIGHTINGS = ("number", "metals", "mass", "metal_mass", "volume", "metal_volume")
+
+# Histograms that include only the particles with metals
+METAL_ONLY_WEIGHTINGS = ("metals", "metal_volume")
+
+def read_histogram_specs(filepath: str) -> List[dict]:
+    """
+    Read a JSON file containing a list of histogram specifications.
+
+    Keys may use either hyphens (as with the command line options) or underscores.
+    """
+    with open(filepath, "r") as file:
+        specs = json.load(file)
+    if isinstance(specs, dict):
+        specs = [specs]
+    specs = [{ key.replace("-", "_"): value for key, value in spec.items() } for spec in specs]
+    for spec in specs:
+        for key in spec:
+            if key not in HISTOGRAM_SPEC_PARAMETERS:
+                raise ValueError(f"Histogram specification key \"{key}\" is not supported. Valid keys are: {', '.join(HISTOGRAM_SPEC_PARAMETERS)}.")
+    return specs
+
+def get_weighting(hist_metals: bool = False, sum_mass: bool = False, sum_metal_mass: bool = False, sum_volume: bool = False, sum_metal_volume: bool = False) -> str:
+    for flag, weighting in ((hist_metals, "metals"), (sum_mass, "mass"), (sum_metal_mass, "metal_mass"), (sum_volume, "volume"), (sum_metal_volume, "metal_volume")):
+        if flag:
+            return weighting
+    return "number"
+
+def make_histograms(load_plan: LoadPlan, selection: ParticleSelection, weightings: List[str], include_unfiltered: bool, n_bins: int = 40) -> Dict[Tuple[str, bool], Histogram]:
+    """
+    Histogram the log density (relitive to the critical density) of the selected particles with each of the weightings.
+
+    If include_unfiltered is set, every particle is read once and histograms of all the particles are also made.
+    Returns a dictionary of histograms keyed by (weighting, filtered).
+    """
+    weightings = [weighting for weighting in WEIGHTINGS if weighting in weightings]
+    uses_metal_filter = any(weighting in METAL_ONLY_WEIGHTINGS for weighting in weightings)
+    range_fields = ["densities"] + (["metal_mass_fractions"] if uses_metal_filter else [])
+    histogram_fields = list(range_fields)
+    if "metal_mass" in weightings and not uses_metal_filter:
+        histogram_fields.append("metal_mass_fractions")
+    if "mass" in weightings or "metal_mass" in weightings:
+        histogram_fields.append("masses")
+    if "volume" in weightings or "metal_volume" in weightings:
+        histogram_fields.append("smoothing_lengths")
+    field_units = { "densities": "Msun/Mpc**3", "metal_mass_fractions": None, "masses": "Msun", "smoothing_lengths": "Mpc" }
+
+    critical_baryon_density = critical_gas_density(load_plan.particle_data, unit = "Msun/Mpc**3")
+    filter_options = (True, False) if include_unfiltered else (True,)
+
+    def read_chunks(fields: List[str]):
+        """
+        Yields the values of the fields, the log densities, whether each particle has metals and whether it is selected.
+        """
+        offset = 0
+        for chunk in load_plan.read_chunks(fields, [field_units[field] for field in fields], selection if not include_unfiltered else None, part_type_relative = True):
+            values = { field: np.array(field_values) for field, field_values in zip(fields, chunk) }
+            n_particles = chunk[0].shape[0]
+            # When reading every particle, the chunks are consecutive rows
+            selected = selection.contains(np.arange(offset, offset + n_particles)) if include_unfiltered else np.full(n_particles, True)
+            offset += n_particles
+            density_data = np.log10(np.array(chunk[0] / critical_baryon_density))
+            has_metals = values["metal_mass_fractions"] > 0 if uses_metal_filter else None
+            yield values, density_data, has_metals, selected
+
+    def particle_mask(weighting: str, filtered: bool, has_metals: np.ndarray, selected: np.ndarray) -> np.ndarray:
+        mask = selected if filtered else np.full(selected.shape, True)
+        return mask & has_metals if weighting in METAL_ONLY_WEIGHTINGS else mask
+
+    # The bins span the range of the data (as with numpy.histogram), which must be found first
+    value_ranges = { (weighting, filtered): None for weighting in weightings for filtered in filter_options }
+    for _, density_data, has_metals, selected in read_chunks(range_fields):
+        for weighting, filtered in value_ranges:
+            value_ranges[(weighting, filtered)] = update_range(value_ranges[(weighting, filtered)], density_data[particle_mask(weighting, filtered, has_metals, selected)])
+    histograms = { key: Histogram.from_range(n_bins, value_range if value_range is not None else (0.0, 1.0)) for key, value_range in value_ranges.items() }
+
+    for values, density_data, has_metals, selected in read_chunks(histogram_fields):
+        weights = { "number": None, "metals": None }
+        if "masses" in values:
+            weights["mass"] = values["masses"]
+            if "metal_mass_fractions" in values:
+                weights["metal_mass"] = values["masses"] * values["metal_mass_fractions"]
+        if "smoothing_lengths" in values:
+            weights["volume"] = weights["metal_volume"] = values["smoothing_lengths"]**3
+        for (weighting, filtered), histogram in histograms.items():
+            mask = particle_mask(weighting, filtered, has_metals, selected)
+            histogram.add(density_data[mask], weights = weights[weighting][mask] if weights[weighting] is not None else None)
+
+    return histograms
+
+def plot_histogram(histograms: Dict[Tuple[str, bool], Histogram], output_file: str, limit_fields: Union[List[str], None],
+                   log_y_axis: bool = False, hist_metals: bool = False, sum_mass: bool = False, sum_metal_mass: bool = False, sum_volume: bool = False, sum_metal_volume: bool = False,
+                   use_line: bool = False, plot_unfiltered: bool = False, max_y: Union[float, None] = None):
+    """
+    Plot a histogram from those created by make_histograms.
+    """
+    weighting = get_weighting(hist_metals, sum_mass, sum_metal_mass, sum_volume, sum_metal_volume)
     plot_unfiltered = plot_unfiltered and use_line and limit_fields is not None
+    histogram = histograms[(weighting, True)]
+    unfiltered_histogram = histograms[(weighting, False)] if plot_unfiltered else None
 
-    box_region_object = BoxRegion(**kwargs)
-
-    snap_data = sw.load(data)
-
-
-
-    # Calculate spatial and specified filters
-    positions = snap_data.gas.coordinates.to("Mpc")
-
-    box_region_object.complete_bounds_from_coords(positions)
-    array_filter = box_region_object.make_array_filter(positions)
-
-    manual_filter = np.full_like(array_filter, True)
-    if limit_fields is not None:
-        if isinstance(limit_fields, str):
-            limit_fields = [limit_fields]
-            limit_units = [limit_units]
-            if limits_min is not None:
-                limits_min = [limits_min]
-            if limits_max is not None:
-                limits_max = [limits_max]
-
-        for j, field in enumerate(limit_fields):
-            field_value = make_attribute(field, snap_data.gas).to(limit_units[j])
-            if limits_min is not None and limits_min[j] != "":
-                manual_filter &= field_value >= limits_min[j]
-            if limits_max is not None and limits_max[j] != "":
-                manual_filter &= field_value <= limits_max[j]
-
-    combined_data_filter = (array_filter & manual_filter)
-
-    
-
-    # Calculate weights and set nessessary labels
-    unfiltered_weights = None
-    weights = None
-    weighting_data = None
+    # Normalise the weights and set nessessary labels
     plot_title_insert = "Histogram"
     y_label = "Frequency"
+    normalisation = 1.0
 
     if hist_metals:
-        metal_filter = snap_data.gas.metal_mass_fractions > 0
         plot_title_insert = "Histogram of Metals"
-
     elif sum_mass:
-        if plot_unfiltered:
-            unfiltered_weighting_data = snap_data.gas.masses.to("Msun")
-            unfiltered_weights = unfiltered_weighting_data / unfiltered_weighting_data.sum()
-        weighting_data = snap_data.gas.masses.to("Msun")[combined_data_filter]
-        weights = weighting_data / (weighting_data.sum() if not plot_unfiltered else unfiltered_weighting_data.sum())
         plot_title_insert = "Normalised Mass Histogram"
         y_label = "Fraction of Total Mass" if not plot_unfiltered else "Fraction of Total Unfiltered Mass"
-
     elif sum_metal_mass:
-        if plot_unfiltered:
-            unfiltered_weighting_data = snap_data.gas.masses.to("Msun") * snap_data.gas.metal_mass_fractions
-            unfiltered_weights = unfiltered_weighting_data / unfiltered_weighting_data.sum()
-        weighting_data = snap_data.gas.masses.to("Msun")[combined_data_filter] * snap_data.gas.metal_mass_fractions[combined_data_filter]
-        weights = weighting_data / (weighting_data.sum() if not plot_unfiltered else unfiltered_weighting_data.sum())
         plot_title_insert = "Normalised Metal Mass Histogram"
         y_label = "Fraction of Total Metal Mass" if not plot_unfiltered else "Fraction of Total Unfiltered Metal Mass"
-
     elif sum_volume:
-        if plot_unfiltered:
-            unfiltered_weighting_data = snap_data.gas.smoothing_lengths.to("Mpc")**3
-            unfiltered_weights = unfiltered_weighting_data / unfiltered_weighting_data.sum()
-        weighting_data = snap_data.gas.smoothing_lengths.to("Mpc")[combined_data_filter]**3
-        weights = weighting_data / (weighting_data.sum() if not plot_unfiltered else unfiltered_weighting_data.sum())
         plot_title_insert = "Normalised Volume Histogram"
         y_label = "Fraction of Total Volume" if not plot_unfiltered else "Fraction of Total Unfiltered Volume"
-
     elif sum_metal_volume:
-        metal_filter = snap_data.gas.metal_mass_fractions > 0
-        if plot_unfiltered:
-            unfiltered_weighting_data = snap_data.gas.smoothing_lengths.to("Mpc")[metal_filter]**3
-            unfiltered_weights = unfiltered_weighting_data / unfiltered_weighting_data.sum()
-        weighting_data = snap_data.gas.smoothing_lengths.to("Mpc")[metal_filter & combined_data_filter]**3
-        weights = weighting_data / (weighting_data.sum() if not plot_unfiltered else unfiltered_weighting_data.sum())
         plot_title_insert = "Normalised Volume Histogram"
         y_label = "Fraction of Total Metal Enriched Volume" if not plot_unfiltered else "Fraction of Total Unfiltered Metal Enriched Volume"
 
-    
-
-    # Retrive density data
-    critical_baryon_density = critical_gas_density(snap_data, unit = "Msun/Mpc**3")
-    if plot_unfiltered:
-        unfiltered_density_data = np.log10(snap_data.gas.densities.to("Msun/Mpc**3") / critical_baryon_density)
-        if hist_metals or sum_metal_volume:
-            unfiltered_density_data = unfiltered_density_data[metal_filter]
-    density_data = np.log10(snap_data.gas.densities.to("Msun/Mpc**3")[combined_data_filter & metal_filter if hist_metals or sum_metal_volume else combined_data_filter] / critical_baryon_density)
+    if sum_mass or sum_metal_mass or sum_volume or sum_metal_volume:
+        normalisation = (histogram if not plot_unfiltered else unfiltered_histogram).totals.sum()
 
 
 
@@ -120,22 +153,21 @@ def __main(data, output_file, log_y_axis: bool, limit_fields: List[str], limit_u
     #normal_stylesheet = os.path.join(stylesheet_directory, "temp_diagram_stylesheet.mplstyle")
     #plt.style.use(normal_stylesheet)
 
+    plt.figure()
+
     if use_line:
-        if plot_unfiltered and limit_fields is not None:
-            counts, bin_edges = np.histogram(unfiltered_density_data, bins = nBins, weights = unfiltered_weights)
-            bin_centres = (bin_edges[:-1] + bin_edges[1:]) / 2
-            plt.plot(bin_centres, counts, label = "Unfiltered Data" if not sum_metal_volume else "All Metals")
+        if plot_unfiltered:
+            plt.plot(unfiltered_histogram.centres[0], unfiltered_histogram.totals / normalisation, label = "Unfiltered Data" if not sum_metal_volume else "All Metals")
 
-        counts, bin_edges = np.histogram(density_data, bins = nBins, weights = weights)
-        bin_centres = (bin_edges[:-1] + bin_edges[1:]) / 2
-        plt.plot(bin_centres, counts, label = "Filtered Data" if plot_unfiltered and limit_fields is not None else None)
+        plt.plot(histogram.centres[0], histogram.totals / normalisation, label = "Filtered Data" if plot_unfiltered else None)
 
         if log_y_axis:
             plt.semilogy()
     else:
-        plt.hist(density_data,
-                bins = nBins,
-                weights = weights,
+        # Each bin is drawn from its total
+        plt.hist(histogram.centres[0],
+                bins = histogram.edges[0],
+                weights = histogram.totals / normalisation,
                 log = log_y_axis)
 
     if max_y is not None:
@@ -145,9 +177,39 @@ def __main(data, output_file, log_y_axis: bool, limit_fields: List[str], limit_u
     #plt.ylabel("$\\rm log_{10}$ Frequency" if log_y_axis else "Frequency")
     plt.ylabel(y_label)
     plt.title(f"Gas Particle {plot_title_insert} by Particle Density" + ("\nFiltered by field{}: {}".format("s" if len(limit_fields) > 1 else "", " ".join(limit_fields)) if limit_fields is not None else ""))
-    if plot_unfiltered and limit_fields is not None:
+    if plot_unfiltered:
         plt.legend()
     plt.savefig(output_file)
+    plt.close()
+
+def __main(data, output_file, log_y_axis: bool, limit_fields: List[str], limit_units: List[str], limits_min: List[float], limits_max: List[float], hist_metals: bool, sum_mass: bool, sum_metal_mass: bool, sum_volume: bool, sum_metal_volume: bool, use_line: bool, plot_unfiltered: bool, max_y: Union[float, None], selection: Union[str, None], histogram_file: Union[str, None], histograms: Union[str, None], **kwargs):
+    box_region_object = BoxRegion(**kwargs)
+
+    snap_data = sw.load(data)
+    load_plan = LoadPlan(snap_data, PartType.gas)
+
+    # Calculate spatial and specified filters
+    load_plan.set_region(box_region_object)
+    if limit_fields is not None:
+        load_plan.set_limits(limit_fields, limit_units, limits_min, limits_max, part_type_relative = True)
+        if isinstance(limit_fields, str):
+            limit_fields = [limit_fields]
+    combined_selection = load_plan.select(selection)
+
+    # Every histogram is made from a single read of the snapshot
+    default_spec = { "output_file": output_file, "log_y_axis": log_y_axis, "hist_metals": hist_metals, "sum_mass": sum_mass, "sum_metal_mass": sum_metal_mass, "sum_volume": sum_volume, "sum_metal_volume": sum_metal_volume,
+                     "use_line": use_line, "plot_unfiltered": plot_unfiltered, "max_y": max_y }
+    specs = [{ **default_spec, **spec } for spec in (read_histogram_specs(histograms) if histograms is not None else [{}])]
+    weightings = { get_weighting(spec["hist_metals"], spec["sum_mass"], spec["sum_metal_mass"], spec["sum_volume"], spec["sum_metal_volume"]) for spec in specs }
+    include_unfiltered = limit_fields is not None and any(spec["plot_unfiltered"] and spec["use_line"] for spec in specs)
+    density_histograms = make_histograms(load_plan, combined_selection, list(weightings), include_unfiltered)
+
+    if histogram_file is not None:
+        for i, ((weighting, filtered), histogram) in enumerate(density_histograms.items()):
+            histogram.save(histogram_file, f"{'filtered' if filtered else 'unfiltered'}/{weighting}", mode = "w" if i == 0 else "a")
+
+    for spec in specs:
+        plot_histogram(density_histograms, limit_fields = limit_fields, **spec)
 
 if __name__ == "__main__":
     args_info = [["data",        "File name/path of the source SWIFT snapshot.",               None],
@@ -170,6 +232,9 @@ if __name__ == "__main__":
                    ["use-line", "l", "Use a line plot instead of bars.", False, True, None, None],
                    ["plot-unfiltered", None, "Plot a line for the unfiltered data.\nRequires the --use-line flag to be set and\nfor at least one filter to be specified.", False, True, None, None],
                    ["max-y", None, "Set the upper limit of the Y-axis.", False, False, float, None],
+                   ["histogram-file", None, "Also save the (un-normalised) histograms to this HDF5 file so they can be reused or merged with others.", False, False, None, None],
+                   ["histograms", None, "JSON file containing a list of histogram specifications to plot from a single read of the snapshot.\nEach specification is an object with any of the keys: " + ", ".join(HISTOGRAM_SPEC_PARAMETERS) + "\n(hyphens may be used in place of underscores). Unspecified values are taken from the other options.", False, False, None, None],
+                   *SelectionStore.get_command_params(),
                    *BoxRegion.get_command_params()
                   ]
     
@@ -178,7 +243,7 @@ if __name__ == "__main__":
                            VERSION,
                            DATE,
                            DESCRIPTION,
-                           ["matplotlib", "numpy", "os", "QuasarCode", "swiftsimio", "typing"],
+                           ["json", "matplotlib", "numpy", "os", "QuasarCode", "swiftsimio", "typing"],
                            [],
                            args_info,
                            kwargs_info)
@@ -1,10 +1,9 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "7.0.0"
-DATE = "06/07/2023"
+VERSION = "8.0.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Identifies the last halo a gas particle was found in and records the mass of the largest halo in the structure."
 
 import os
-import pickle
 import swiftsimio as sw
 from typing import List
 
@@ -12,7 +11,7 @@ from QuasarCode import source_file_relitive_add_to_path, Console
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.io import PartType
+from contra.io import PartType, HaloTrackingResultStore
 from contra.algorithms import reverse_search
 
 def __main(particle_type: PartType, snap_numbers: List[str], snap_directory: str, snap_file_template: str, cat_directory: str, cat_file_template: str):
@@ -26,14 +25,11 @@ def __main(particle_type: PartType, snap_numbers: List[str], snap_directory: str
     
     Console.print_verbose_info(f"All data retrived. Saving to files.")
 
-    with open(f"{particle_type}_particle_ejection_tracking__halo_snapshot_number_indexes.pickle", "wb") as file:
-        pickle.dump(final_halo_snap_number_index, file)
-    with open(f"{particle_type}_particle_ejection_tracking__halo_snapshot_numbers.pickle", "wb") as file:
-        pickle.dump(final_halo_snap_numbers, file)
-    with open(f"{particle_type}_particle_ejection_tracking__halo_ids_in_snapshot.pickle", "wb") as file:
-        pickle.dump(final_halo_ids, file)
-    with open(f"{particle_type}_particle_ejection_tracking__halo_masses.pickle", "wb") as file:
-        pickle.dump(final_halo_masses, file)
+    HaloTrackingResultStore.write(f"{particle_type}_particle_ejection_tracking.hdf5",
+                                  snapshot_numbers = snap_numbers,
+                                  halo_snapshot_indexes = final_halo_snap_number_index,
+                                  halo_ids = final_halo_ids,
+                                  halo_masses = final_halo_masses)
         
 
 
@@ -313,7 +309,7 @@ if __name__ == "__main__":
                            VERSION,
                            DATE,
                            DESCRIPTION,
-                           ["h5py", "numpy", "os", "pickle", "QuasarCode", "swiftsimio", "sys", "time", "velociraptor"],
+                           ["h5py", "numpy", "os", "QuasarCode", "swiftsimio", "sys", "time", "velociraptor"],
                            ["0000;0001;0002;0003;0004;0005;0006;0007 /storage/simulations/COLIBRE_ZOOMS/COLIBRE/five_spheres_20211006/volume04/l0/snapshots snapshot_{}.hdf5 /storage/simulations/COLIBRE_ZOOMS/COLIBRE/five_spheres_20211006/volume04/l0/haloes_sig_1p00 halo_{}.properties.0 /storage/simulations/COLIBRE_ZOOMS/COLIBRE/five_spheres_20211006/volume04/l0/haloes_sig_1p00 halo_{}.catalog_groups.0"],
                            args_info,
                            kwargs_info)
@@ -1,6 +1,6 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "2.0.0"
-DATE = "07/07/2023"
+VERSION = "2.2.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Creates line graphs (with errors) for binned data from SWIFT gas particles."
 
 from argparse import ArgumentError
@@ -17,7 +17,8 @@ from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
 from contra.filters import BoxRegion
-from contra.io import parse_swift_string as make_attribute
+from contra.io import LoadPlan, PartType
+from contra.calculations import Histogram, update_range
 
 
 
@@ -41,57 +42,67 @@ def make_graph(particle_data_list, data_name_list, output_file_path, x_axis_fiel
     line_data = []
     error_data = []
     for i, data in enumerate(particle_data_list):
-        coords = np.array(data.gas.coordinates)
-        box_region.complete_bounds_from_coords(coords)
-        Console.print_verbose_info(f"Final bounds: {box_region.x_min}-{box_region.x_min}, {box_region.y_min}-{box_region.y_max}, {box_region.z_min}-{box_region.z_max}")
-        array_filter = box_region.make_array_filter(coords)
-
-        manual_filter = np.full_like(array_filter, True)
+        load_plan = LoadPlan(data, PartType.gas)
+        load_plan.set_region(box_region)
         if limit_fields is not None:
-            if isinstance(limit_fields, str):
-                limit_fields = [limit_fields]
-                limit_units = [limit_units]
-                if limits_min is not None:
-                    limits_min = [limits_min]
-                if limits_max is not None:
-                    limits_max = [limits_max]
-
-            for j, field in enumerate(limit_fields):
-#                field_value = make_attribute(field, data.gas)[array_filter].to(limit_units[j])
-                field_value = make_attribute(field, data.gas).to(limit_units[j])
-                if limits_min is not None and limits_min[j] != "":
-                    manual_filter &= field_value >= limits_min[j]
-                if limits_max is not None and limits_max[j] != "":
-                    manual_filter &= field_value <= limits_max[j]
-
-        y_axis_filter = None
-        Console.print_verbose_info("Reading Y-axis data.")
-        y_axis_data = make_attribute(y_axis_field[i] if len(y_axis_field) > 1 else y_axis_field[0], data.gas)[array_filter & manual_filter].to(y_axis_unit)
-        if keep_outliers:
-            if min_y_field_value is not None:
-                y_axis_data[y_axis_data < min_y_field_value] = min_y_field_value
-            if max_y_field_value is not None:
-                y_axis_data[y_axis_data > max_y_field_value] = max_y_field_value
-        else:
-            y_axis_filter = (y_axis_data >= (min_y_field_value if min_y_field_value is not None else -np.Infinity)) & (y_axis_data <= (max_y_field_value if max_y_field_value is not None else np.Infinity))
-            y_axis_data = y_axis_data[y_axis_filter]
-
-        combined_data_filter = (array_filter & manual_filter)
-        combined_data_filter[np.where(combined_data_filter)[0][y_axis_filter == False]] = False
-        
+            load_plan.set_limits(limit_fields, limit_units, limits_min, limits_max, part_type_relative = True)
+        combined_selection = load_plan.select()
+        Console.print_verbose_info(f"{len(combined_selection)} particles selected.")
+
+        x_axis_expression = x_axis_field[i] if len(x_axis_field) > 1 else x_axis_field[0]
+        y_axis_expression = y_axis_field[i] if len(y_axis_field) > 1 else y_axis_field[0]
+
+        def read_chunks(include_weights: bool):
+            """
+            Yields the (unscaled) X-axis values, Y-axis values and (if requested) weights of a chunk of particles.
+            """
+            expressions = [x_axis_expression, y_axis_expression] + ([y_axis_weight_field] if include_weights else [])
+            for chunk in load_plan.read_chunks(expressions, [x_axis_unit, y_axis_unit] + ([None] if include_weights else []), combined_selection, part_type_relative = True):
+                x_axis_data, y_axis_data = np.array(chunk[0]), np.array(chunk[1])
+                y_axis_weights = np.array(chunk[2]) if include_weights else None
+                if keep_outliers:
+                    if min_y_field_value is not None:
+                        y_axis_data[y_axis_data < min_y_field_value] = min_y_field_value
+                    if max_y_field_value is not None:
+                        y_axis_data[y_axis_data > max_y_field_value] = max_y_field_value
+                else:
+                    y_axis_filter = (y_axis_data >= (min_y_field_value if min_y_field_value is not None else -np.inf)) & (y_axis_data <= (max_y_field_value if max_y_field_value is not None else np.inf))
+                    x_axis_data = x_axis_data[y_axis_filter]
+                    y_axis_data = y_axis_data[y_axis_filter]
+                    if include_weights:
+                        y_axis_weights = y_axis_weights[y_axis_filter]
+                yield x_axis_data, y_axis_data, y_axis_weights
+
+        def scale_x_axis(x_axis_data, x_axis_mean):
+            if fraction_x_axis:
+                x_axis_data = x_axis_data / x_axis_mean
+            if log_x_axis:
+                with np.errstate(divide = "ignore", invalid = "ignore"):
+                    x_axis_data = np.log10(x_axis_data)
+            return x_axis_data
+
+        # The range (and mean, if needed) of the X-axis data sets the bins, so must be found first
+        Console.print_verbose_info("Finding range of X-axis data.")
+        x_axis_range = None
+        x_axis_sum = 0.0
+        x_axis_count = 0
+        for x_axis_data, _, _ in read_chunks(include_weights = False):
+            x_axis_range = update_range(x_axis_range, x_axis_data)
+            x_axis_sum += x_axis_data.sum()
+            x_axis_count += x_axis_data.shape[0]
+        x_axis_mean = x_axis_sum / x_axis_count if x_axis_count > 0 else 1.0
+        # Scaling the X-axis preserves the order of the values
+        bin_range = update_range(None, scale_x_axis(np.array(x_axis_range if x_axis_range is not None else (0.0, 1.0)), x_axis_mean))
+        histogram = Histogram.from_range(nBins, bin_range if bin_range is not None else (0.0, 1.0), track_values = True)
+
         Console.print_verbose_info("Reading in data.")
-        x_axis_data = make_attribute(x_axis_field[i] if len(x_axis_field) > 1 else x_axis_field[0], data.gas)[combined_data_filter].to(x_axis_unit)
-        if fraction_x_axis:
-            x_axis_data = np.array(x_axis_data) / np.mean(np.array(x_axis_data))
-        if log_x_axis:
-            x_axis_data = np.log10(x_axis_data)
-        y_axis_weights = make_attribute(y_axis_weight_field, data.gas)[combined_data_filter]
-        
-        hist, bin_edges = np.histogram(x_axis_data, bins = nBins, weights = y_axis_data * np.array(y_axis_weights))
-        hist[hist != 0] /= np.histogram(x_axis_data, bins = nBins, weights = np.array(y_axis_weights))[0][hist != 0]
-        bin_centres = (bin_edges[:len(bin_edges) - 1] + bin_edges[1:]) / 2
-        bin_value_lists = [y_axis_data[(x_axis_data >= bin_edges[i]) & ((x_axis_data < bin_edges[i + 1]) if i + 1 < len(bin_edges) - 1 else (x_axis_data <= bin_edges[i + 1]))] for i in range(len(bin_edges) - 1)]
-        errors = np.array([(np.std(data) if len(data) > 0 else 0) for data in bin_value_lists])
+        for x_axis_data, y_axis_data, y_axis_weights in read_chunks(include_weights = True):
+            histogram.add(scale_x_axis(x_axis_data, x_axis_mean), weights = y_axis_weights, values = y_axis_data)
+
+        bin_centres = histogram.centres[0]
+        occupied = histogram.counts > 0
+        hist = np.where(occupied, histogram.mean(), 0.0)
+        errors = np.where(occupied, histogram.std(), 0.0)
 
         line_data.append((bin_centres, hist))
         error_data.append(errors)
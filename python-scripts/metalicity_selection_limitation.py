@@ -1,6 +1,6 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "1.0.0"
-DATE = "11/07/2023"
+VERSION = "1.1.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Plots the particle selection fraction for a range of metalicity lower bounds."
 
 import numpy as np
@@ -9,14 +9,17 @@ import swiftsimio as sw
 from matplotlib import pyplot as plt
 from typing import Union, List
 
-from QuasarCode import Console
+from QuasarCode import Console, source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
+source_file_relitive_add_to_path(__file__, "..")
+from contra.calculations import ThresholdSweep
+
 def get_tracked_fractions(metalicity_cuttoffs, metalicities, tracking_filter):
     #return [(tracking_filter & (metalicities >= cuttoff)).sum() / (metalicities >= cuttoff).sum() for cuttoff in metalicity_cuttoffs]
 
-    metalicity_filters = metalicity_cuttoffs[:, None] <= metalicities
-    return [(tracking_filter & metalicity_filters[i, :]).sum() / metalicity_filters[i, :].sum() for i in range(metalicity_filters.shape[0])]
+    # The metalicities are sorted once, rather than compared against every cuttoff
+    return ThresholdSweep(np.array(metalicities), filters = { "tracked": np.array(tracking_filter) }).fraction_above(metalicity_cuttoffs, "tracked")
 
 def __main(filename: str, snapshot_files: List[str], labels: Union[List[str], None], title: Union[str, None]):
     n_datapoints = 1000
@@ -1,18 +1,17 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "2.0.0"
-DATE = "07/07/2023"
+VERSION = "2.1.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Plots the cumulitive sum of metal masses for particles in assending order of last halo mass."
 
-import swiftsimio as sw
+from matplotlib import pyplot as plt
 import numpy as np
 import swiftsimio as sw
-from matplotlib import pyplot as plt
 
 from QuasarCode import source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.calculations import get_critical_gas_density as critical_gas_density
+from contra.calculations import get_critical_gas_density as critical_gas_density, CumulativeDistribution
 
 def __main(data: str, filename: str, include_non_metals: bool, include_non_metal_mass: bool, self_normalise_comparisons: bool):
     # Read data
@@ -30,56 +29,39 @@ def __main(data: str, filename: str, include_non_metals: bool, include_non_metal
         metalicities = metalicities[metal_filter]
         densities = densities[metal_filter]
 
-    first_reliable_data_index = m200[m200 > 0].argmin()
-
     # Set minimum halo values for untracked data
     #m200[m200 <= 0] = 10**np.array(np.log10(m200[m200 > 0].min())) + np.linspace(0, 100, (m200 <= 0).sum(), dtype = int)
     m200[m200 <= 0] = m200[m200 > 0].min() / 10
 
-    log_m200 = np.log10(m200)
+    log_m200 = np.log10(np.array(m200))
 
-    # Compute halo mass order of particles
-    sorted_indexes = np.argsort(log_m200)
-    first_reliable_data_sorted_index = np.linspace(0, sorted_indexes.shape[0] - 1, sorted_indexes.shape[0], dtype = int)[sorted_indexes == first_reliable_data_index][0]
-    #TODO: print and check this!!!
-    
-    # Calculate the cumulitive sum for all particles
-    target_masses = masses if include_non_metal_mass else masses * metalicities
-    cumulitive_target_masses = np.cumsum(target_masses[sorted_indexes])
-    y_max = cumulitive_target_masses[-1]
+    # Sum the target masses for each distinct halo mass (in halo mass order) for all particles and each filter
+    target_masses = np.array(masses if include_non_metal_mass else masses * metalicities)
 
-    particle_densities_sorted = densities[sorted_indexes]
     density_cuttoffs = (0, 2.5, 7.5)
-    density_filters = [particle_densities_sorted >= cuttof for cuttof in density_cuttoffs]
-
-    particle_metalicities_sorted = metalicities[sorted_indexes]
     metalicity_cuttoffs = (4e-05, 0.001, 0.0134, 0.1, 0.3)# Z_sun = ~0.0134
     metalicity_cuttoff_label_values = (4e-05, 0.001, "Z_\\odot", 0.1, 0.3)# Z_sun = ~0.0134
-    metalicity_filters = [particle_metalicities_sorted >= cuttof for cuttof in metalicity_cuttoffs]
+    filters = { **{ f"$\\rho >= {cuttoff}$": np.array(densities >= cuttoff) for cuttoff in density_cuttoffs },
+                **{ f"$Z >= {label_value}$": np.array(metalicities >= cuttoff) for cuttoff, label_value in zip(metalicity_cuttoffs, metalicity_cuttoff_label_values) } }
 
-    plotted_x_values = log_m200[sorted_indexes]
-    plotted_y_values = cumulitive_target_masses / y_max
+    distribution = CumulativeDistribution(log_m200, target_masses, filters)
+    y_max = distribution.total()
 
-    plt.plot(plotted_x_values, plotted_y_values, label = "All Data")
+    plt.plot(*distribution.curve(normalisation = y_max), label = "All Data")
 
-    for i, density_filter in enumerate(density_filters):
-        filtered_cululitive_sum = np.cumsum(target_masses[sorted_indexes][density_filter])
-        if filtered_cululitive_sum.shape[0] > 0:
-            plt.plot(plotted_x_values[density_filter], filtered_cululitive_sum / (filtered_cululitive_sum[-1] if self_normalise_comparisons else y_max), label = f"$\\rho >= {density_cuttoffs[i]}$")
-    for i, metalicity_filter in enumerate(metalicity_filters):
-        filtered_cululitive_sum = np.cumsum(target_masses[sorted_indexes][metalicity_filter])
-        if filtered_cululitive_sum.shape[0] > 0:
-            plt.plot(plotted_x_values[metalicity_filter], filtered_cululitive_sum / (filtered_cululitive_sum[-1] if self_normalise_comparisons else y_max), label = f"$Z >= {metalicity_cuttoff_label_values[i]}$")
+    for label in distribution.filters:
+        if distribution.count(label) > 0:
+            plt.plot(*distribution.curve(label, normalisation = distribution.total(label) if self_normalise_comparisons else y_max), label = label)
     plt.legend()
 
     plt.title("Cumulitive Partical {}Mass Fraction\n(for particles with an identified last halo)".format("" if include_non_metal_mass else "Metal-"))
     
     ax = plt.gca()
 
-    x_limits = (plotted_x_values[0], plotted_x_values[-1])
+    x_limits = (distribution.keys[0], distribution.keys[-1])
 
     def plot_division_line(m):
-        x = log_m200[sorted_indexes][cumulitive_target_masses >= m][0]
+        x = distribution.key_at(m)
         y = m / y_max
         ax.plot(x_limits, (y, y), color = "red", alpha = 0.3, linestyle = "--")
         ax.plot((x, x), (0, y), color = "red", alpha = 0.3, linestyle = "--")
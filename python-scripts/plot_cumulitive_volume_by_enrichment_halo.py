@@ -1,19 +1,18 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "2.0.0"
-DATE = "07/07/2023"
+VERSION = "2.1.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Plots the cumulitive sum of particle volume (as a fraction of the total) for particles in assending order of last halo mass."
 
-import swiftsimio as sw
+from matplotlib import pyplot as plt
 import numpy as np
 import swiftsimio as sw
-from matplotlib import pyplot as plt
 
 
 from QuasarCode import source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.calculations import get_critical_gas_density as critical_gas_density
+from contra.calculations import get_critical_gas_density as critical_gas_density, CumulativeDistribution
 
 def __main(data: str, filename: str, include_non_metals: bool, self_normalise_comparisons: bool):
     # Read data
@@ -44,53 +43,40 @@ def __main(data: str, filename: str, include_non_metals: bool, self_normalise_co
         densities = densities[record_filter]
         metal_masses = metal_masses[record_filter]
 
-    # Compute halo mass order of particles
-    sorted_indexes = np.argsort(log_m200)
-
-    cumulitive_volume_residuals = np.cumsum(volume_residuals[sorted_indexes])
-    y_max = cumulitive_volume_residuals[-1]
-
-    particle_densities_sorted = densities[sorted_indexes]
+    # Sum the volumes for each distinct halo mass (in halo mass order) for all particles and each filter
     density_cuttoffs = (0, 2.5, 7.5)
-    density_filters = [particle_densities_sorted >= cuttof for cuttof in density_cuttoffs]
-
-    particle_metalicities_sorted = metalicities[sorted_indexes]
     metalicity_cuttoffs = (4e-05, 0.001, 0.0134, 0.1, 0.3)# Z_sun = ~0.0134
     metalicity_cuttoff_label_values = (4e-05, 0.001, "Z_\\odot", 0.1, 0.3)# Z_sun = ~0.0134
-    metalicity_filters = [particle_metalicities_sorted >= cuttof for cuttof in metalicity_cuttoffs]
+    filters = { **{ f"$\\rho >= {cuttoff}$": np.array(densities >= cuttoff) for cuttoff in density_cuttoffs },
+                **{ f"$Z >= {label_value}$": np.array(metalicities >= cuttoff) for cuttoff, label_value in zip(metalicity_cuttoffs, metalicity_cuttoff_label_values) } }
 
-    plotted_x_values = log_m200[sorted_indexes]
-    plotted_y_values = cumulitive_volume_residuals / y_max
+    distribution = CumulativeDistribution(np.array(log_m200), np.array(volume_residuals), filters)
+    y_max = distribution.total()
 
-    plt.plot(plotted_x_values, plotted_y_values, label = "All Data")
+    plt.plot(*distribution.curve(normalisation = y_max), label = "All Data")
 
-    for i, density_filter in enumerate(density_filters):
-        filtered_cululitive_sum = np.cumsum(volume_residuals[sorted_indexes][density_filter])
-        if filtered_cululitive_sum.shape[0] > 0:
-            plt.plot(plotted_x_values[density_filter], filtered_cululitive_sum / (filtered_cululitive_sum[-1] if self_normalise_comparisons else y_max), label = f"$\\rho >= {density_cuttoffs[i]}$")
-    for i, metalicity_filter in enumerate(metalicity_filters):
-        filtered_cululitive_sum = np.cumsum(volume_residuals[sorted_indexes][metalicity_filter])
-        if filtered_cululitive_sum.shape[0] > 0:
-            plt.plot(plotted_x_values[metalicity_filter], filtered_cululitive_sum / (filtered_cululitive_sum[-1] if self_normalise_comparisons else y_max), label = f"$Z >= {metalicity_cuttoff_label_values[i]}$")
+    for label in distribution.filters:
+        if distribution.count(label) > 0:
+            plt.plot(*distribution.curve(label, normalisation = distribution.total(label) if self_normalise_comparisons else y_max), label = label)
     plt.legend()
 
     plt.title("Cumulitive Partical Volume Fraction\n(for particles with an identified last halo{})".format("" if include_non_metals else " & a metal component"))
 
     ax = plt.gca()
     
-    x_limits = (plotted_x_values[0], plotted_x_values[-1])
+    x_limits = (distribution.keys[0], distribution.keys[-1])
 
 
     #def sigmoid(x, centre_x = 0, height_scale = 1):
     #    return 1 / (1 + np.exp(-(x - centre_x) * height_scale))
     #curve_x = np.linspace(*x_limits, 1000)
-    #curve_halfway_point = plotted_x_values[cumulitive_volume_residuals >= y_max * 0.5][0]
+    #curve_halfway_point = distribution.key_at(y_max * 0.5)
     #plt.plot(curve_x, sigmoid(curve_x, curve_halfway_point, 4), label = "Sigmoid")
     #plt.legend()
 
 
     def plot_division_line(v):
-        x = log_m200[sorted_indexes][cumulitive_volume_residuals >= v][0]
+        x = distribution.key_at(v)
         y = v / y_max
         ax.plot(x_limits, (y, y), color = "red", alpha = 0.3, linestyle = "--")
         ax.plot((x, x), (0, y), color = "red", alpha = 0.3, linestyle = "--")
@@ -1,17 +1,18 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "3.0.1"
-DATE = "15/08/2023"
+VERSION = "3.11.2"
+DATE = "19/10/2026"
 DESCRIPTION = "Renders SWIFT SPH data."
 
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from matplotlib import pyplot as plt
+from matplotlib.colors import Colormap, LinearSegmentedColormap
+import json
 import numpy as np
 import os
-from sphviewer import Particles, Camera, Scene, Render
 import swiftsimio as sw
-from swiftsimio.visualisation import generate_smoothing_lengths as generate_SWIFT_smoothing_lengths
-from typing import List, Union
-from unyt import Mpc
+from typing import Callable, List, Tuple, Union
+from unyt import Mpc, unyt_array
 
 TOL_AVAILABLE = False
 try:
@@ -23,14 +24,21 @@ from QuasarCode import Console, source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.filters import BoxRegion, ParticleFilter
-from contra.io import parse_swift_string as parse_string, PartType
+from contra.algorithms import SPHProjection
+from contra.calculations import calculate_kernel_gamma, generate_smoothing_lengths, periodic_displacements
+from contra.filters import BoxRegion, ParticleFilter, ParticleSelection, SelectionStore
+from contra.io import parse_swift_string as parse_string, MapArrayStore, PartType, SmoothingLengthStore
+from contra.tools.deep_zoom import DeepZoomPyramid
+from contra.tools.image_writer import make_colour_lut, write_colour_mapped_png, write_greyscale_png
 
 
 
 # Value of 1K resolution
 RESOLUTION_BASE_MESUREMENT = 1080
 
+# Appended to output filenames to identify maps rendered with SPHProjection (maps from py-sphviewer used "_py-sphviewer")
+OUTPUT_FILE_SUFFIX = "_sph"
+
 # Enum for render type
 class RenderType(Enum):
     projection = 0
@@ -38,45 +46,138 @@ class RenderType(Enum):
 
 
 
-def create_smoothing_lengths(data_file: sw.SWIFTDataset, parttype: PartType):
+# Smoothing length generation uses swiftsimio's default number of neighbours
+SMOOTHING_LENGTH_NEIGHBOURS = 32
+SMOOTHING_LENGTH_SPEEDUP_FACTOR = 2
+
+def has_smoothing_lengths(metadata, parttype: PartType) -> bool:
+    return "smoothing_lengths" in getattr(metadata, f"{parttype}_properties").field_names
+
+def _snapshot_rows(data_file: sw.SWIFTDataset, parttype: PartType) -> np.ndarray:
+    """
+    Row in the snapshot file of each particle in a (possibly masked) dataset.
+    """
+    n_particles = parttype.get_dataset(data_file).coordinates.shape[0]
+    mask = getattr(data_file, "mask", None)
+    if mask is None:
+        return np.arange(n_particles)
+    part_type_mask = np.asarray(getattr(mask, str(parttype)))
+    if part_type_mask.dtype == bool:
+        return np.where(part_type_mask)[0]
+    return np.concatenate([np.arange(start, end) for start, end in part_type_mask.reshape((-1, 2))]) if n_particles > 0 else np.empty(0, dtype = np.int64)
+
+def create_smoothing_lengths(data_file: sw.SWIFTDataset, parttype: PartType, target_indices: Union[np.ndarray, None] = None, store: Union[SmoothingLengthStore, None] = None):
+    """
+    Generate smoothing lengths for the particles indexed by target_indices (all particles if not specified).
+
+    Every particle in the dataset is used as a neighbour, so a masked dataset should include a margin around the targets.
+    If a store is given, smoothing lengths are reused from (and added to) it.
+    """
     particle_data = parttype.get_dataset(data_file)
+    coordinates = particle_data.coordinates
+    if target_indices is None:
+        target_indices = np.arange(coordinates.shape[0])
 
     # Parameters required to generate smoothing lengths
     number_of_neighbours = int(round(particle_data.metadata.hydro_scheme["Kernel target N_ngb"][0]))
     kernel_eta = particle_data.metadata.hydro_scheme["Kernel eta"][0]
 
-    kernel_gamma = ((3.0 * number_of_neighbours) / (4.0 * 3.14159))**(1/3) / kernel_eta
+    kernel_gamma = calculate_kernel_gamma(number_of_neighbours, kernel_eta)
 
-    return generate_SWIFT_smoothing_lengths(particle_data.coordinates, boxsize = particle_data.metadata.boxsize, kernel_gamma = kernel_gamma)
+    box_size = particle_data.metadata.boxsize.to(coordinates.units).value
+    generate = lambda indices: generate_smoothing_lengths(coordinates.value, box_size, kernel_gamma, SMOOTHING_LENGTH_NEIGHBOURS, SMOOTHING_LENGTH_SPEEDUP_FACTOR, targets = target_indices[indices])
 
-def _render_pixels(particle_data: sw.SWIFTDataset, parttype: PartType, spatial_filter: np.ndarray, smooth_over: sw.SWIFTDataset, camera_settings: dict, return_camera = False):
+    if store is None:
+        smoothing_lengths = generate(np.arange(target_indices.shape[0]))
+    else:
+        parameters = { "kernel_gamma": float(kernel_gamma), "neighbours": SMOOTHING_LENGTH_NEIGHBOURS, "speedup_factor": SMOOTHING_LENGTH_SPEEDUP_FACTOR, "units": str(coordinates.units) }
+        smoothing_lengths = store.get_or_create(str(data_file.metadata.filename), parttype, parameters, _snapshot_rows(data_file, parttype)[target_indices], generate)
+
+    return unyt_array(smoothing_lengths, coordinates.units)
+
+def _sum_bins(values: np.ndarray, bin_indices: np.ndarray, n_bins: int, axis: int) -> np.ndarray:
+    """
+    Sum along an axis over runs of consecutive elements in the same bin. Bin indices must be sorted.
+    """
+    bin_starts = np.searchsorted(bin_indices, np.arange(n_bins))
+    populated = bin_starts < bin_indices.shape[0]
+    populated[populated] = bin_indices[bin_starts[populated]] == np.arange(n_bins)[populated]
+    result_shape = list(values.shape)
+    result_shape[axis] = n_bins
+    result = np.zeros(result_shape, dtype = values.dtype)
+    result[(slice(None),) * axis + (populated,)] = np.add.reduceat(values, bin_starts[populated], axis = axis)
+    return result
+
+def bin_pixels(image: np.ndarray, n_bins: int):
+    """
+    Sum the pixels of an image (rows of constant y) into n_bins x n_bins bins.
+
+    Bins are the same as for a 2D histogram of the pixel indices, so the edges are in units of pixels.
+    Returns the binned image (with the same orientation), the x edges and the y edges.
+    """
+    y_pixels, x_pixels = image.shape
+    x_edges = np.linspace(0, x_pixels - 1, n_bins + 1)
+    y_edges = np.linspace(0, y_pixels - 1, n_bins + 1)
+    x_bins = np.minimum(np.searchsorted(x_edges, np.arange(x_pixels), side = "right") - 1, n_bins - 1)
+    y_bins = np.minimum(np.searchsorted(y_edges, np.arange(y_pixels), side = "right") - 1, n_bins - 1)
+    return _sum_bins(_sum_bins(image, x_bins, n_bins, 1), y_bins, n_bins, 0), x_edges, y_edges
+
+def _prepare_projection(particle_data: sw.SWIFTDataset, parttype: PartType, box_region: BoxRegion, x: float, y: float, projection_width: float, image_size: int):
+    """
+    Select the particles in the region and project them once so that any number of maps can be rendered from them.
+
+    Returns the sorted indices of the region's particles and the projection.
+    """
     dataset = parttype.get_dataset(particle_data)
 
-    length_units = dataset.coordinates.units
-    smooth_units = smooth_over.units / (length_units**2)
-    
-    smoothing_lengths = None
-    try:
-        smoothing_lengths = dataset.smoothing_lengths.value[spatial_filter]
-    except:
-        smoothing_lengths = create_smoothing_lengths(particle_data, parttype)[spatial_filter]
-    particles = Particles(pos = dataset.coordinates.value[spatial_filter], hsml = smoothing_lengths, mass = smooth_over.value[spatial_filter])
-
-    camera = Camera()
-    camera.set_autocamera(particles)
-    camera.set_params(**camera_settings)
+    Console.print_verbose_info("Converting units of spatial fields.")
+    coordinates = dataset.coordinates.to("Mpc")
 
-    scene = Scene(particles, camera)
+    box_size = particle_data.metadata.boxsize.to("Mpc").value
 
-    render = Render(scene)
+    # Needed as masking may have only been spatial and would not be exact
+    Console.print_verbose_info("Making spatial array filter.")
+    region_indices = np.where(box_region.make_array_filter(coordinates.value, box_size))[0]
 
-    image = render.get_image() * smooth_units
-    #extent = render.get_extent() * length_units
+    # Use the periodic copy of each particle nearest to the camera, so regions crossing the edge of the box are drawn in one piece
+    camera = np.array([x, y])
+    positions = coordinates.value[region_indices, :2]
+    positions = periodic_displacements(positions, camera, box_size[:2], out = positions)
+    positions += camera
 
-    if return_camera:
-        return image, camera
+    if has_smoothing_lengths(particle_data.metadata, parttype):
+        smoothing_lengths = dataset.smoothing_lengths.to("Mpc").value[region_indices]
     else:
-        return image
+        # Only the region's particles are needed, and the result is kept for later maps of the same snapshot
+        Console.print_verbose_info("Generating smoothing lengths.")
+        smoothing_lengths = create_smoothing_lengths(particle_data, parttype, region_indices, SmoothingLengthStore()).to("Mpc").value
+
+    Console.print_verbose_info("Projecting particles.")
+    projection = SPHProjection(positions, smoothing_lengths,
+                               (x - projection_width / 2, x + projection_width / 2), (y - projection_width / 2, y + projection_width / 2),
+                               image_size)
+
+    return region_indices, projection
+
+def _render_pixels(projection: SPHProjection, region_indices: np.ndarray, channels: List[Tuple[unyt_array, np.ndarray]], tiles: int = 1, workers: int = 1):
+    """
+    Render one or more quantities, each for a sorted subset of the region's particles, in a single pass over the particles.
+
+    Channels are specified as (quantity, particle indices) pairs.
+    Large images can be split into tiles x tiles tiles, rendered by a pool of worker processes.
+    """
+    return [image * (smooth_over.units / Mpc**2) for image, (smooth_over, _) in zip(projection.render_channels(_channel_weights(region_indices, channels), tiles, workers), channels)]
+
+def _channel_weights(region_indices: np.ndarray, channels: List[Tuple[unyt_array, np.ndarray]]) -> List[np.ndarray]:
+    """
+    Value of each channel's quantity for every particle in the region (zero for those not selected by the channel).
+    """
+    weights = []
+    for smooth_over, particle_indices in channels:
+        channel_weights = np.zeros(region_indices.shape[0], dtype = np.float64)
+        channel_weights[np.searchsorted(region_indices, particle_indices)] = smooth_over.value[particle_indices]
+        weights.append(channel_weights)
+    return weights
 
 #def _render_pixels(particle_data: sw.SWIFTDataset, parttype: PartType, spatial_filter: np.ndarray, smooth_over: sw.SWIFTDataset, camera_settings: dict, return_camera = False):
 #    Console.print_debug(f"Rendering map for {smooth_over}.")
@@ -95,6 +196,30 @@ def _render_pixels(particle_data: sw.SWIFTDataset, parttype: PartType, spatial_f
 #    else:
 #        return wrapper.image
 
+# Parameters of make_plot that may be set separately for each map
+MAP_SPEC_PARAMETERS = ("output_file", "smoothing_attr", "smoothing_unit",
+                       "limit_fields", "limit_units", "limits_min", "limits_max",
+                       "contour", "contour_percentiles", "exclude_limits_from_contour",
+                       "title", "no_density", "no_log", "log_pre_intergration",
+                       "colour_map", "colour_limits", "image_only", "raw_16bit", "raw_array", "selection")
+
+def read_map_specs(filepath: str) -> List[dict]:
+    """
+    Read a JSON file containing a list of map specifications.
+
+    Keys may use either hyphens (as with the command line options) or underscores.
+    """
+    with open(filepath, "r") as file:
+        specs = json.load(file)
+    if isinstance(specs, dict):
+        specs = [specs]
+    specs = [{ key.replace("-", "_"): value for key, value in spec.items() } for spec in specs]
+    for spec in specs:
+        for key in spec:
+            if key not in MAP_SPEC_PARAMETERS:
+                raise ValueError(f"Map specification key \"{key}\" is not supported. Valid keys are: {', '.join(MAP_SPEC_PARAMETERS)}.")
+    return specs
+
 def make_plot(particle_data: sw.SWIFTDataset, output_file: str,
               box_region: BoxRegion, parttype: PartType,
               x: float, y: float, z: float, render_type: RenderType, projection_width = 5,
@@ -103,102 +228,235 @@ def make_plot(particle_data: sw.SWIFTDataset, output_file: str,
               limit_fields: Union[None, str, List[str]] = None, limit_units: Union[None, str, List[str]] = None, limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None,
               contour: str = None, contour_percentiles: List[float] = [10.0, 25.0, 50.0, 75.0, 90.0], exclude_limits_from_contour: bool = False,
               title: str = "", no_density: bool = False, no_log: bool = False, log_pre_intergration: bool = False, image_size: int = 1080,
-              colour_map: List[str] = None, image_only: bool = False):
-
-    Console.print_debug(("Making plot. Params are:" + ("\n{}" * 23)).format(particle_data, output_file, box_region, parttype, x, y, z, render_type, projection_width, smoothing_attr, smoothing_unit, limit_fields, limit_units, limits_min, limits_max, contour, contour_percentiles, exclude_limits_from_contour, title, no_density, no_log, image_size, colour_map))
-    
-    # Needed as masking may have only been spatial and would not be exact
-    Console.print_verbose_info("Making spatial array filter.")
-#    spatial_filter = box_region.make_array_filter(particle_data.gas.coordinates)
-    spatial_filter = box_region.make_array_filter(parttype.get_dataset(particle_data).coordinates)
-
-#    combined_filter = spatial_filter.copy()
-#    if filter_attr is not None:
-#        filter_dataset = parse_string(filter_attr, particle_data).to(filter_unit)
-#        lower_bound_filter = True
-#        if filter_min is not None:
-#            lower_bound_filter = filter_dataset >= unyt_quantity(filter_min, filter_unit)
-#        upper_bound_filter = True
-#        if filter_max is not None:
-#            upper_bound_filter = filter_dataset <= unyt_quantity(filter_max, filter_unit)
-#        other_filter = lower_bound_filter & upper_bound_filter
-#
-#        combined_filter = combined_filter & other_filter
-
-    particle_filter = ParticleFilter(particle_data, limit_fields, limit_units, limits_min, limits_max) if ParticleFilter.check_limits_present(limit_fields) else ParticleFilter.passthrough_filter(particle_data, parttype)
-    particle_filter.update(spatial_filter)
-    
-    # Set the units for coordinates and smothing lengths (this shouldn't actualy read the file so easier to do this for all 3 possible part types)
-    Console.print_verbose_info("Converting units of spatial fields.")
-    coordinate_units = "Mpc"
-
-    particle_data.gas.coordinates.convert_to_units(coordinate_units)
-    particle_data.dark_matter.coordinates.convert_to_units(coordinate_units)
-    particle_data.stars.coordinates.convert_to_units(coordinate_units)
-
-    particle_data.gas.smoothing_lengths.convert_to_units(coordinate_units)
-    #particle_data.dark_matter.smoothing_lengths.convert_to_units(coordinate_units)#TODO: handle
-    particle_data.stars.smoothing_lengths.convert_to_units(coordinate_units)
-
-    # Create the camera settings
-    Console.print_verbose_info("Assembling camera settings.")
-    if render_type == RenderType.projection:
-        camera_settings = { "r": "infinity", "extent": [-projection_width * Mpc / 2, projection_width * Mpc / 2, -projection_width * Mpc / 2, projection_width * Mpc / 2] }
-    else:
+              colour_map: List[str] = None, colour_limits: Union[None, List[float]] = None, image_only: bool = False, raw_16bit: bool = False, raw_array: bool = False, selection: Union[str, None] = None,
+              map_specs: Union[None, List[dict]] = None, tiles: int = 1, workers: int = 1, map_store: Union[MapArrayStore, None] = None,
+              pyramid_tile_size: Union[int, None] = None):
+    """
+    Render one or more maps of the same region.
+
+    Each map specification is a dictionary of any of the parameters in MAP_SPEC_PARAMETERS, with unspecified values taken from the arguments.
+    The particles are projected once and only the quantity being rendered changes between maps.
+    If a map array store is specified, the rendered pixel arrays are saved to it and reused by maps that differ only in their styling.
+    If a pyramid tile size is specified, each map is written as a Deep Zoom image pyramid instead (see _make_pyramid).
+    """
+
+    if render_type != RenderType.projection:
         raise NotImplementedError()
 
-    camera_settings["xsize"] = image_size
-    camera_settings["ysize"] = image_size
-    camera_settings["x"] = x
-    camera_settings["y"] = y
-    if z is not None:#TODO: does this approach need altering?
-        camera_settings["z"] = z
-
-    # Identify the particle node for the selected parttype
-    selected_dataset = parttype.get_dataset(particle_data)
+    default_spec = { "output_file": output_file, "smoothing_attr": smoothing_attr, "smoothing_unit": smoothing_unit,
+                     "limit_fields": limit_fields, "limit_units": limit_units, "limits_min": limits_min, "limits_max": limits_max,
+                     "contour": contour, "contour_percentiles": contour_percentiles, "exclude_limits_from_contour": exclude_limits_from_contour,
+                     "title": title, "no_density": no_density, "no_log": no_log, "log_pre_intergration": log_pre_intergration,
+                     "colour_map": colour_map, "colour_limits": colour_limits, "image_only": image_only, "raw_16bit": raw_16bit, "raw_array": raw_array, "selection": selection }
+    if map_specs is None:
+        map_specs = [{}]
+
+    # The projection is only created if a map isn't already in the map array store
+    projection_data = []
+    def get_projection():
+        if len(projection_data) == 0:
+            region_indices, projection = _prepare_projection(particle_data, parttype, box_region, x, y, projection_width, image_size)
+            projection_data.extend([region_indices, ParticleSelection.from_indices(region_indices, parttype.get_dataset(particle_data).coordinates.shape[0]), projection])
+        return projection_data
+
+    for i, spec in enumerate(map_specs):
+        Console.print_verbose_info(f"Making map {i + 1} of {len(map_specs)}.")
+        _make_map(particle_data, box_region, parttype, get_projection, map_store,
+                  x, y, z, render_type, projection_width, image_size, tiles, workers, pyramid_tile_size,
+                  **{ **default_spec, **{ key.replace("-", "_"): value for key, value in spec.items() } })
+
+def _select_map_channels(particle_data: sw.SWIFTDataset, box_region: BoxRegion, parttype: PartType,
+                         region_indices: np.ndarray, region_selection: ParticleSelection,
+                         smoothing_attr: str, smoothing_unit: str,
+                         limit_fields: Union[None, str, List[str]], limit_units: Union[None, str, List[str]], limits_min: Union[None, float, List[float]], limits_max: Union[None, float, List[float]],
+                         contour: Union[str, None], exclude_limits_from_contour: bool,
+                         no_density: bool, log_pre_intergration: bool, selection: Union[str, None]) -> List[Tuple[unyt_array, np.ndarray]]:
+    """
+    Select the particles for a map and create its data, surface density (if no_density is set) and contour (if specified) channels.
+
+    Returns (quantity, particle indices) pairs as used by _render_pixels.
+    """
+
+    def create_selection():
+        Console.print_verbose_info("Calculating particle selection.")
+        if ParticleFilter.check_limits_present(limit_fields):
+            return ParticleFilter(particle_data, limit_fields, limit_units, limits_min, limits_max, initial_selection = region_selection).selection
+        return region_selection
+
+    # Selections index the particles of the masked dataset
+    selection_definition = { "index_space": SelectionStore.masked_index_space(_snapshot_rows(particle_data, parttype)), "part_type": str(parttype), "region": box_region.bounds, "limit_fields": limit_fields, "limit_units": limit_units, "limits_min": limits_min, "limits_max": limits_max }
+    particle_filter = ParticleFilter.from_selection(SelectionStore().get_or_create(selection, particle_data, selection_definition, create_selection, region_selection.n_total))
 
     # Parsing the smothing attribute expression
     Console.print_verbose_info("Parsing smothing expression.")
-    selected_dataset.smothing_attribute = parse_string(smoothing_attr, particle_data)
+    smoothing_attribute = parse_string(smoothing_attr, particle_data)
 
-    Console.print_debug("Raw smoothing attr min value: {}".format(np.array(selected_dataset.smothing_attribute[:][particle_filter.numpy_filter]).min()))
-    Console.print_debug("Raw smoothing attr max value: {}".format(np.array(selected_dataset.smothing_attribute[:][particle_filter.numpy_filter]).max()))
-    Console.print_debug("Raw smoothing attr mean value: {}".format(np.array(selected_dataset.smothing_attribute[:][particle_filter.numpy_filter]).mean()))
+    Console.print_debug("Raw smoothing attr min value: {}".format(np.array(smoothing_attribute[particle_filter.indices]).min()))
+    Console.print_debug("Raw smoothing attr max value: {}".format(np.array(smoothing_attribute[particle_filter.indices]).max()))
+    Console.print_debug("Raw smoothing attr mean value: {}".format(np.array(smoothing_attribute[particle_filter.indices]).mean()))
 
     # Set the units as requested
-    selected_dataset.smothing_attribute.convert_to_units(smoothing_unit)
+    smoothing_attribute = smoothing_attribute.to(smoothing_unit)
 
-    Console.print_debug("Unit converted smoothing attr min value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].min()))
-    Console.print_debug("Unit converted smoothing attr max value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].max()))
-    Console.print_debug("Unit converted smoothing attr mean value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].mean()))
+    Console.print_debug("Unit converted smoothing attr min value: {}".format(smoothing_attribute[particle_filter.indices].min()))
+    Console.print_debug("Unit converted smoothing attr max value: {}".format(smoothing_attribute[particle_filter.indices].max()))
+    Console.print_debug("Unit converted smoothing attr mean value: {}".format(smoothing_attribute[particle_filter.indices].mean()))
     
-    if log_pre_intergration and not no_log:
+    if log_pre_intergration:
         Console.print_verbose_info("Logging the data values.")
-        selected_dataset.smothing_attribute[selected_dataset.smothing_attribute != 0] = np.log10(selected_dataset.smothing_attribute[selected_dataset.smothing_attribute != 0])
-        Console.print_debug("Logged smoothing attr min value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].min()))
-        Console.print_debug("Logged smoothing attr max value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].max()))
-        Console.print_debug("Logged smoothing attr mean value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].mean()))
+        smoothing_attribute[smoothing_attribute != 0] = np.log10(smoothing_attribute[smoothing_attribute != 0])
+        Console.print_debug("Logged smoothing attr min value: {}".format(smoothing_attribute[particle_filter.indices].min()))
+        Console.print_debug("Logged smoothing attr max value: {}".format(smoothing_attribute[particle_filter.indices].max()))
+        Console.print_debug("Logged smoothing attr mean value: {}".format(smoothing_attribute[particle_filter.indices].mean()))
 
     # Make modifications to remove the surface density term from the result
+    masses = None
     if no_density:
         Console.print_verbose_info("Preparing to account for surface density.")
         # Add a mass unit to the smothing unit to account for the mass weighting of the data
-#        smoothing_unit += ("*" if smoothing_unit != "" else "") + "Msun"
-        selected_dataset.masses.convert_to_units("Msun")
-        Console.print_debug("Masses min value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].min()))
-        Console.print_debug("Masses max value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].max()))
-        Console.print_debug("Masses mean value: {}".format(selected_dataset.smothing_attribute[particle_filter.numpy_filter].mean()))
-        selected_dataset.smothing_attribute = selected_dataset.smothing_attribute * selected_dataset.masses
+        masses = parttype.get_dataset(particle_data).masses.to("Msun")
+        smoothing_attribute = smoothing_attribute * masses
         Console.print_verbose_info("New units of initial map are {}.".format(smoothing_unit))
 
-    # Generate the mapp of the data (or mass weighted data)
-    Console.print_verbose_info("Generating initial map.")
-    data_image, camera = _render_pixels(particle_data, parttype, particle_filter.numpy_filter, selected_dataset.smothing_attribute, camera_settings, return_camera = True)
+    # The map of the data (or mass weighted data), the surface density and the contoured field are all rendered together
+    channels = [(smoothing_attribute, particle_filter.indices)]
+    if no_density:
+        channels.append((masses, particle_filter.indices))
+    if contour is not None:
+        channels.append((parse_string(contour, particle_data), region_indices if exclude_limits_from_contour else particle_filter.indices))
+
+    return channels
+
+def _render_pyramid(projection: SPHProjection, region_indices: np.ndarray, channels: List[Tuple[unyt_array, np.ndarray]], pyramid: DeepZoomPyramid, tiles: int = 1, workers: int = 1):
+    """
+    Render channels (as for _render_pixels) directly into the full resolution level of an image pyramid, one tile at a time.
+    """
+    base_level = pyramid.create_base_level(len(channels))
+    height = base_level.shape[1]
+    for (x_pixels, y_pixels), tile_images in projection.render_tiles(_channel_weights(region_indices, channels), projection.tile_pixel_ranges(tiles), workers):
+        # Pyramid rows start from the top of the image
+        base_level[:, height - y_pixels[1] : height - y_pixels[0], x_pixels[0] : x_pixels[1]] = tile_images[:, ::-1]
+    base_level.flush()
+    del base_level
+
+def get_colour_map(colour_map: Union[None, List[str]]) -> Colormap:
+    """
+    Colour map from the --colour-map option: a matplotlib or Paul Tol colour map name, or a list of "#RRGGBB" colours.
+
+    Defaults to the colour map set by the active stylesheet.
+    """
+    if colour_map is None or len(colour_map) == 0 or colour_map[0] is None:
+        return plt.get_cmap(plt.rcParams["image.cmap"])
+    if len(colour_map) > 1:
+        return LinearSegmentedColormap.from_list("custom-map", colour_map)
+    if TOL_AVAILABLE and colour_map[0] in tol_colors.tol_cmap():
+        return tol_colors.tol_cmap(colour_map[0])
+    return plt.get_cmap(colour_map[0])
+
+def _get_stylesheets() -> Tuple[str, str]:
+    """
+    Filepaths of the normal and small text stylesheets.
+    """
+    stylesheet_directory = os.path.join(__file__.rsplit(os.path.sep, 1)[0], "..", "stylesheets")
+    return os.path.join(stylesheet_directory, "sph_map_stylesheet.mplstyle"), os.path.join(stylesheet_directory, "sph_map_smalltext_stylesheet.mplstyle")
+
+def _map_target_file(output_file: str, render_type: RenderType, projection_width: float, box_region: BoxRegion, image_size: int, extension: Union[str, None] = None) -> str:
+    """
+    Output filepath with the camera settings and resolution inserted before the extension (replaced if specified).
+    """
+    box_side_length = box_region.side_length
+    if isinstance(box_side_length, list):
+        box_side_length = box_side_length[2]
+    cameraSettingsInsert = f"{float(projection_width):.1f}Mpc2_{float(box_side_length):.1f}Mpc" if render_type == RenderType.projection else f""#TODO: perspective log text
+    filepath_sections = output_file.rsplit(".", 1)
+    return f"{filepath_sections[0]}__{cameraSettingsInsert}_{image_size / RESOLUTION_BASE_MESUREMENT}K{OUTPUT_FILE_SUFFIX}.{extension if extension is not None else filepath_sections[1]}"
+
+def _make_pyramid(particle_data: sw.SWIFTDataset, box_region: BoxRegion, parttype: PartType, get_projection: Callable[[], list],
+                  render_type: RenderType, projection_width: float, image_size: int, tiles: int, workers: int, tile_size: int,
+                  output_file: str, smoothing_attr: str, smoothing_unit: str,
+                  limit_fields: Union[None, str, List[str]], limit_units: Union[None, str, List[str]], limits_min: Union[None, float, List[float]], limits_max: Union[None, float, List[float]],
+                  title: str, no_density: bool, no_log: bool, log_pre_intergration: bool,
+                  colour_map: List[str], colour_limits: Union[None, List[float]], selection: Union[str, None]):
+    """
+    Render a map at full resolution as a Deep Zoom image pyramid, with a static HTML page for viewing it.
+
+    The image is rendered as tiles x tiles tiles (in parallel if workers > 1) straight into the pyramid's file backed base level,
+    so only about one tile per worker is held in memory at a time. Coarser levels are averages of the level below (mass weighted if no_density is set).
+    """
+    pyramid = DeepZoomPyramid(_map_target_file(output_file, render_type, projection_width, box_region, image_size, "dzi"), image_size, image_size, tile_size)
+
+    region_indices, region_selection, projection = get_projection()
+    channels = _select_map_channels(particle_data, box_region, parttype, region_indices, region_selection,
+                                    smoothing_attr, smoothing_unit, limit_fields, limit_units, limits_min, limits_max,
+                                    None, False,
+                                    no_density, log_pre_intergration and not no_log, selection)
+
+    Console.print_verbose_info(f"Rendering {image_size}px pyramid base level with {len(channels)} channel(s).")
+    _render_pyramid(projection, region_indices, channels, pyramid, tiles, workers)
+
+    plt.style.use(_get_stylesheets()[0])
+    cmap = get_colour_map(colour_map)
+    Console.print_verbose_info(f"Writing {pyramid.max_level + 1} pyramid levels to {pyramid.tiles_directory}")
+    pyramid.build(make_colour_lut(cmap), tuple(int(round(value * 255)) for value in cmap.get_bad()), not log_pre_intergration and not no_log,
+                  *(colour_limits if colour_limits is not None else (None, None)), workers = workers)
+    viewer_file = pyramid.write_viewer(title = title)
+    Console.print_verbose_info(f"Pyramid can be viewed with {viewer_file}")
+
+def _make_map(particle_data: sw.SWIFTDataset, box_region: BoxRegion, parttype: PartType, get_projection: Callable[[], list], map_store: Union[MapArrayStore, None],
+              x: float, y: float, z: float, render_type: RenderType, projection_width: float, image_size: int, tiles: int, workers: int, pyramid_tile_size: Union[int, None],
+              output_file: str, smoothing_attr: str, smoothing_unit: str,
+              limit_fields: Union[None, str, List[str]], limit_units: Union[None, str, List[str]], limits_min: Union[None, float, List[float]], limits_max: Union[None, float, List[float]],
+              contour: str, contour_percentiles: List[float], exclude_limits_from_contour: bool,
+              title: str, no_density: bool, no_log: bool, log_pre_intergration: bool,
+              colour_map: List[str], colour_limits: Union[None, List[float]], image_only: bool, raw_16bit: bool, raw_array: bool, selection: Union[str, None]):
+
+    Console.print_debug(("Making plot. Params are:" + ("\n{}" * 23)).format(particle_data, output_file, box_region, parttype, x, y, z, render_type, projection_width, smoothing_attr, smoothing_unit, limit_fields, limit_units, limits_min, limits_max, contour, contour_percentiles, exclude_limits_from_contour, title, no_density, no_log, image_size, colour_map))
+
+    coordinate_units = "Mpc"
+
+    # If contours are requested, they are only avalible on a projection map
+    #TODO: surely contours should be ok on a perspective map???
+    draw_contours = (contour is not None) and render_type == RenderType.projection
+
+    # Everything that affects the pixel values (but not the styling of the figure)
+    map_definition = { "part_type": str(parttype), "region": box_region.bounds, "camera": [x, y, z], "projection_width": projection_width, "image_size": image_size,
+                       "smoothing_attr": smoothing_attr, "smoothing_unit": smoothing_unit, "no_density": no_density, "log_pre_intergration": log_pre_intergration and not no_log,
+                       "limit_fields": limit_fields, "limit_units": limit_units, "limits_min": limits_min, "limits_max": limits_max,
+                       "contour": contour if draw_contours else None, "exclude_limits_from_contour": exclude_limits_from_contour and draw_contours }
+    snapshot_filepath = str(particle_data.metadata.filename)
+
+    if pyramid_tile_size is not None:
+        if draw_contours:
+            Console.print_warning("Contours are not drawn on image pyramids.")
+        _make_pyramid(particle_data, box_region, parttype, get_projection,
+                      render_type, projection_width, image_size, tiles, workers, pyramid_tile_size,
+                      output_file, smoothing_attr, smoothing_unit, limit_fields, limit_units, limits_min, limits_max,
+                      title, no_density, no_log, log_pre_intergration, colour_map, colour_limits, selection)
+        return
+
+    images = map_store.load(snapshot_filepath, map_definition) if map_store is not None else None
+    if images is not None:
+        Console.print_verbose_info(f"Using stored map arrays from {map_store.filepath}.")
+    else:
+        region_indices, region_selection, projection = get_projection()
+        channels = _select_map_channels(particle_data, box_region, parttype, region_indices, region_selection,
+                                        smoothing_attr, smoothing_unit, limit_fields, limit_units, limits_min, limits_max,
+                                        contour if draw_contours else None, exclude_limits_from_contour,
+                                        no_density, log_pre_intergration and not no_log, selection)
+
+        # Generate the mapp of the data (or mass weighted data)
+        Console.print_verbose_info(f"Generating map with {len(channels)} channel(s).")
+        images = _render_pixels(projection, region_indices, channels, tiles, workers)
+        if map_store is not None:
+            Console.print_verbose_info(f"Saving map arrays to {map_store.filepath}.")
+            map_store.save(snapshot_filepath, map_definition, images, Camera = [x, y, z if z is not None else 0.0], ProjectionWidth = projection_width, Extent = [x - projection_width / 2, x + projection_width / 2, y - projection_width / 2, y + projection_width / 2])
+
+    data_image = images[0]
 
     if no_density:
         # Remove the surface density dependance and make each pixel a mass weighted mean
-        Console.print_verbose_info("Generating and dividing map by surface density map.")
-        data_image /= _render_pixels(particle_data, parttype, particle_filter.numpy_filter, selected_dataset.masses, camera_settings)
+        Console.print_verbose_info("Dividing map by surface density map.")
+        data_image /= images[1]
 
     # Log the pixel values for image-like maps (unless specified otherwise)
     if not log_pre_intergration and not no_log:
@@ -209,49 +467,34 @@ def make_plot(particle_data: sw.SWIFTDataset, output_file: str,
     Console.print_debug("Final pixel max value: {}".format(data_image.max()))
     Console.print_debug("Final pixel mean value: {}".format(data_image.mean()))
 
-    # If contours are requested, plot them, but only one a projection map
-    #TODO: surely contours should be ok on a perspective map???
-    draw_contours = False
-    if (contour is not None) and render_type == RenderType.projection:
+    # If contours are requested, plot them
+    if draw_contours:
         Console.print_verbose_info("Generating contours.")
-        draw_contours = True
-            
-        selected_dataset.contour_attribute = parse_string(contour, particle_data)
-        contour_map_image = _render_pixels(particle_data, parttype, spatial_filter if exclude_limits_from_contour else particle_filter.numpy_filter, selected_dataset.contour_attribute, camera_settings)
-
-        contour_pixels_1D = contour_map_image.reshape((image_size**2,))
-
-        image_pixel_axis_positions = np.linspace(0, image_size - 1, image_size)
-
-        a = [image_pixel_axis_positions[i % image_size] for i in range(image_size**2)]
-        b = [image_pixel_axis_positions[i // image_size] for i in range(image_size**2)]
+        contour_map_image = images[-1]
 
         nBins = 50
-        h, xedges, yedges = np.histogram2d(a, b, nBins, weights = contour_pixels_1D)
-        total_contour_value = np.sum(contour_pixels_1D)
+        h, xedges, yedges = bin_pixels(np.asarray(contour_map_image, dtype = np.float64), nBins)
+        total_contour_value = h.sum()
         h /= total_contour_value
-        check_values = h.reshape(((len(xedges) - 1) * (len(yedges) - 1),))
+        check_values = h.reshape(-1)
         percentiles = np.percentile(check_values[check_values != 0], contour_percentiles)
         
+    if raw_array:
+        target_file = _map_target_file(output_file, render_type, projection_width, box_region, image_size, "npy")
+        Console.print_verbose_info(f"Saving pixel values to {target_file}")
+        np.save(target_file, np.asarray(data_image))
+        return
+
     # Get the stylesheets
     Console.print_verbose_info("Fetching stylesheets.")
-    stylesheet_directory = os.path.join(__file__.rsplit(os.path.sep, 1)[0], "..", "stylesheets")
-    normal_stylesheet = os.path.join(stylesheet_directory, "sph_map_stylesheet.mplstyle")
-    smalltext_stylesheet = os.path.join(stylesheet_directory, "sph_map_smalltext_stylesheet.mplstyle")
+    normal_stylesheet, smalltext_stylesheet = _get_stylesheets()
 
     # Start using the base stylesheet
     plt.style.use(normal_stylesheet)
 
-    # Set extra params and create figure object
-    inches = plt.rcParams["figure.figsize"][0]
-    dpi = image_size / inches
-    plt.figure(dpi = dpi)
-    plt.axis("off")
-
-    Console.print_verbose_info("Rendering final map.")
     if colour_map is None:
         colour_map = [None]
-    if not TOL_AVAILABLE and (len(colour_map) > 1 or colour_map[0] in ('sunset_discrete', 'sunset',
+    if not TOL_AVAILABLE and (len(colour_map) == 1 and colour_map[0] in ('sunset_discrete', 'sunset',
                                             'nightfall_discrete', 'nightfall',
                                             'BuRd_discrete', 'BuRd',
                                             'PRGn_discrete', 'PRGn',
@@ -259,9 +502,31 @@ def make_plot(particle_data: sw.SWIFTDataset, output_file: str,
                                             'WhOrBr', 'iridescent',
                                             'rainbow_PuRd', 'rainbow_PuBr', 'rainbow_WhRd', 'rainbow_WhBr', 'rainbow_discrete')):
         Console.print_warning(f"Paul Tol's colours are not avalible. This is likley required for colourmap: {colour_map} and this process may fail as a result!\nSee --help for instalation instructions.")
+    cmap = get_colour_map(colour_map)
+    vmin, vmax = colour_limits if colour_limits is not None else (None, None)
+
+    target_file = _map_target_file(output_file, render_type, projection_width, box_region, image_size)
+
+    # Maps without any figure elements are written directly, with one pixel per pixel of the map
+    if raw_16bit or (image_only and not draw_contours):
+        if raw_16bit and (not image_only or draw_contours):
+            Console.print_warning("Raw 16 bit images contain only the pixel values - labels, colourbar and contours will be omitted.")
+        Console.print_verbose_info(f"Saving {'16 bit greyscale' if raw_16bit else 'colour mapped'} image to {target_file}")
+        if raw_16bit:
+            write_greyscale_png(target_file, np.asarray(data_image), vmin, vmax, origin = plt.rcParams["image.origin"])
+        else:
+            write_colour_mapped_png(target_file, np.asarray(data_image), cmap, vmin, vmax, origin = plt.rcParams["image.origin"])
+        return
+
+    # Set extra params and create figure object
+    inches = plt.rcParams["figure.figsize"][0]
+    dpi = image_size / inches
+    plt.figure(dpi = dpi)
+    plt.axis("off")
+
+    Console.print_verbose_info("Rendering final map.")
     # Render the map
-    #plt.imshow(data_image, cmap = tol_colors.LinearSegmentedColormap.from_list("test", ["#125A56", "#FD9A44", "#A01813"]))
-    plt.imshow(data_image, cmap = (tol_colors.tol_cmap(colour_map[0]) if len(colour_map) == 1 else tol_colors.LinearSegmentedColormap.from_list("custom-map", colour_map)) if TOL_AVAILABLE and (len(colour_map) > 1 or colour_map[0] in tol_colors.tol_cmap()) else colour_map[0])
+    plt.imshow(data_image, cmap = cmap, vmin = vmin, vmax = vmax)
     #plt.imshow(data_image, cmap = tol_colors.tol_cmap("rainbow_discrete"))
     #plt.imshow(data_image, cmap = tol_colors.tol_cmap("nightfall"))
     #plt.imshow(data_image, cmap = tol_colors.LinearSegmentedColormap.from_list("test", ["#FF0000", "#FFFF00", "#0000FF"]))
@@ -282,7 +547,7 @@ def make_plot(particle_data: sw.SWIFTDataset, output_file: str,
         # Data converted to arrays due to issues with the countour function and unyt arrays
         contours = plt.contour(np.array((xedges[:-1] + ((xedges[1] - xedges[0])/2)) * Mpc, dtype = np.float64),
                                np.array((yedges[:-1] + ((yedges[1] - yedges[0])/2)) * Mpc, dtype = np.float64),
-                               np.array(h.T, dtype = np.float64),
+                               np.array(h, dtype = np.float64),
                                levels = np.array(percentiles, dtype = np.float64),
                                colors = "k",
                                alpha = 0.5,
@@ -299,16 +564,15 @@ def make_plot(particle_data: sw.SWIFTDataset, output_file: str,
     # Position
     if not image_only:
         Console.print_verbose_info("Adding camera position.")
-        camera_params = camera.get_params()
         plt.text(0, image_size * (1 - 0.040),
-                "(${0:.3f}$, ${1:.3f}$, ${2:.3f}$) ${{\\rm {3}}}$".format(camera_params["x"], camera_params["y"], camera_params["z"], coordinate_units),
+                "(${0:.3f}$, ${1:.3f}$, ${2:.3f}$) ${{\\rm {3}}}$".format(x, y, z if z is not None else 0.0, coordinate_units),
                 #usetex = False,#True,
                 bbox = dict(facecolor = "black", alpha = 0.4, edgecolor = "black"))
 
     if render_type == RenderType.projection:
         # Viewport
         Console.print_verbose_info("Adding projection viewport.")
-        viewport = camera_settings["extent"][1] - camera_settings["extent"][0]
+        viewport = projection_width
         if not image_only:
             #plt.text(0, image_size * (1 - 0.093),
             plt.text(0, image_size * (1 - 0.102),# dh = 0.009 for adding ^
@@ -343,13 +607,94 @@ def make_plot(particle_data: sw.SWIFTDataset, output_file: str,
     #             bbox = dict(facecolor = "black", alpha = 0.4, edgecolor = "black"))
 
     #plt.rcParams["figure.figsize"] = (inches, inches)
-    cameraSettingsInsert = f"{float(viewport):.1f}Mpc2_{box_side_length.value:.1f}Mpc" if render_type == RenderType.projection else f""#TODO: perspective log text
-    filepath_sections = output_file.rsplit(".", 1)
-    target_file = f"{filepath_sections[0]}__{cameraSettingsInsert}_{image_size / RESOLUTION_BASE_MESUREMENT}K_py-sphviewer.{filepath_sections[1]}"
     Console.print_verbose_info(f"Saving image to {target_file}")
     plt.savefig(target_file, dpi = dpi)
+    plt.close()
+
 
 
+def load_region(data: str, parttype: PartType, box_region: BoxRegion) -> sw.SWIFTDataset:
+    """
+    Load a snapshot, reading only the cells needed for the region (and a margin if smoothing lengths must be generated).
+    """
+    mask = sw.mask(data, spatial_only = True)
+    box_region.complete_bounds_from_box_size(mask.metadata.boxsize)
+    if has_smoothing_lengths(mask.metadata, parttype):
+        box_region.constrain_mask(mask)
+    else:
+        # Include the neighbouring cells so that smoothing lengths can be generated for particles at the edge of the region
+        box_region.expanded(float(np.max(mask.cell_size.to("Mpc").value))).constrain_mask(mask)
+
+    return sw.load(data, mask)
+
+def prefetch_fields(particle_data: sw.SWIFTDataset, parttype: PartType, expressions: List[str]):
+    """
+    Read the fields used by maps of a dataset, so that they are already in memory when the maps are made.
+    """
+    dataset = parttype.get_dataset(particle_data)
+    dataset.coordinates
+    if has_smoothing_lengths(particle_data.metadata, parttype):
+        dataset.smoothing_lengths
+    dataset.masses
+    for expression in expressions:
+        parse_string(expression, particle_data)
+
+def _frame_filepath(output_file: str, frame: int) -> str:
+    filepath_sections = output_file.rsplit(".", 1)
+    return f"{filepath_sections[0]}_{frame:04d}.{filepath_sections[1]}"
+
+def make_sequence(data_files: List[str], output_file: str, box_region: BoxRegion, parttype: PartType,
+                  x: float, y: float, z: float, render_type: RenderType, projection_width: float = 5,
+                  end_position: Union[None, List[float]] = None, end_projection_width: Union[None, float] = None,
+                  map_specs: Union[None, List[dict]] = None, **kwargs):
+    """
+    Render the same map(s) for each of a sequence of snapshots, such as the frames of a movie.
+
+    Frames are numbered by appending "_<frame>" to each output file. If an end position or projection width is specified,
+    the camera (and the region with it) moves linearly from the initial values to these over the sequence.
+    While each frame is rendered, the next snapshot is loaded by a background thread.
+    Any other keyword arguments are passed to make_plot. Set colour_limits to keep the colour scale the same for every frame.
+    """
+    if map_specs is None:
+        map_specs = [{}]
+    expressions = []
+    for spec_source in [kwargs, *map_specs]:
+        # Map specs fall back on the keyword arguments, which fall back on make_plot's default
+        default_smoothing_attr = "gas.masses" if spec_source is kwargs else None
+        spec = { key.replace("-", "_"): value for key, value in spec_source.items() }
+        expressions.extend(value for value in (spec.get("smoothing_attr", default_smoothing_attr), spec.get("contour", None)) if value is not None)
+        limit_fields = spec.get("limit_fields", None)
+        if limit_fields is not None:
+            expressions.extend([limit_fields] if isinstance(limit_fields, str) else [field for field in limit_fields if field is not None])
+
+    start_camera = np.array([x, y, z if z is not None else 0.0], dtype = np.float64)
+    end_camera = np.array(end_position, dtype = np.float64) if end_position is not None else start_camera
+    end_projection_width = end_projection_width if end_projection_width is not None else projection_width
+
+    def frame_settings(frame: int):
+        fraction = frame / (len(data_files) - 1) if len(data_files) > 1 else 0.0
+        camera = start_camera + fraction * (end_camera - start_camera)
+        return camera, projection_width + fraction * (end_projection_width - projection_width), box_region.translated(camera - start_camera)
+
+    def load_frame(frame: int):
+        _, _, frame_region = frame_settings(frame)
+        particle_data = load_region(data_files[frame], parttype, frame_region)
+        prefetch_fields(particle_data, parttype, expressions)
+        return particle_data, frame_region
+
+    with ThreadPoolExecutor(max_workers = 1) as executor:
+        next_frame = executor.submit(load_frame, 0)
+        for frame in range(len(data_files)):
+            particle_data, frame_region = next_frame.result()
+            if frame + 1 < len(data_files):
+                next_frame = executor.submit(load_frame, frame + 1)
+
+            Console.print_info(f"Rendering frame {frame + 1} of {len(data_files)} ({data_files[frame]}).")
+            camera, frame_projection_width, _ = frame_settings(frame)
+            frame_specs = [{ **spec, **({ "output_file": _frame_filepath(spec.get("output_file", spec.get("output-file")), frame) } if "output_file" in spec or "output-file" in spec else {}) } for spec in map_specs]
+            make_plot(particle_data, _frame_filepath(output_file, frame), frame_region, parttype,
+                      *camera, render_type, frame_projection_width, map_specs = frame_specs, **kwargs)
+            del particle_data
 
 def __main(data: str, output_file: str,
            gas: bool, star: bool, dark_matter: bool,
@@ -358,31 +703,39 @@ def __main(data: str, output_file: str,
            limit_fields: Union[None, str, List[str]], limit_units: Union[None, str, List[str]], limits_min: Union[None, float, List[float]], limits_max: Union[None, float, List[float]],
            contour: str, contour_percentiles: List[float], exclude_limits_from_contour: bool,
            title: str, no_density: bool, no_log: bool, log_pre_intergration: bool, image_size: int,
-           colour_map: List[str], image_only: bool,
+           colour_map: List[str], colour_limits: Union[None, List[float]], image_only: bool, raw_16bit: bool, raw_array: bool, selection: Union[str, None], maps: Union[str, None],
+           tiles: int, workers: int, map_cache: bool, pyramid: bool, pyramid_tile_size: int,
+           sequence: Union[None, List[str]], template_placeholder: str, camera_end_position: Union[None, List[float]], projection_width_end: Union[None, float],
            **kwargs):
 
     parttype = PartType.gas if gas else PartType.dark_matter if dark_matter else PartType.star
            
     box_region = BoxRegion(**kwargs)
 
-    particle_data: sw.SWIFTDataset = sw.load(data)
-    box_region.complete_bounds_from_coords(particle_data.gas.coordinates)
+    render_type = RenderType.projection if projection else RenderType.perspective
 
-    mask = sw.mask(data, spatial_only = True)
-    box_region.constrain_mask(mask)
+    plot_kwargs = dict(smoothing_attr = smoothing_attr, smoothing_unit = smoothing_unit,
+                       limit_fields = limit_fields, limit_units = limit_units, limits_min = limits_min, limits_max = limits_max,
+                       contour = contour, contour_percentiles = contour_percentiles, exclude_limits_from_contour = exclude_limits_from_contour,
+                       title = title, no_density = no_density, no_log = no_log, log_pre_intergration = log_pre_intergration, image_size = image_size,
+                       colour_map = colour_map, colour_limits = colour_limits, image_only = image_only, raw_16bit = raw_16bit, raw_array = raw_array, selection = selection,
+                       tiles = tiles, workers = workers,
+                       map_store = MapArrayStore() if map_cache and not pyramid else None,
+                       pyramid_tile_size = pyramid_tile_size if pyramid else None)
+    map_specs = read_map_specs(maps) if maps is not None else None
 
-    particle_data: sw.SWIFTDataset = sw.load(data, mask)
+    if sequence is not None:
+        make_sequence([data.replace(template_placeholder, snapshot) for snapshot in sequence], output_file, box_region, parttype,
+                      camera_x_position, camera_y_position, camera_z_position, render_type, projection_width,
+                      camera_end_position, projection_width_end, map_specs, **plot_kwargs)
+        return
 
-    render_type = RenderType.projection if projection else RenderType.perspective
+    particle_data: sw.SWIFTDataset = load_region(data, parttype, box_region)
 
     make_plot(particle_data, output_file,
               box_region, parttype,
               camera_x_position, camera_y_position, camera_z_position, render_type, projection_width,
-              smoothing_attr, smoothing_unit,
-              limit_fields, limit_units, limits_min, limits_max,
-              contour, contour_percentiles, exclude_limits_from_contour,
-              title, no_density, no_log, log_pre_intergration, image_size,
-              colour_map, image_only)
+              map_specs = map_specs, **plot_kwargs)
 
 
 
@@ -420,9 +773,23 @@ if __name__ == "__main__":
                    ["no-log", "l", "Do not log the pixel values before applying colours.", False, True, None, None],
                    ["log-pre-intergration", None, "Do not log the pixel values before applying colours.", False, True, None, None],
                    ["image-size", "r", "Size of the (square) image in pixels (defaults to 1080px).", False, False, int, 1080],
+                   ["tiles", None, "Render the image as a grid of N by N tiles, allowing very large images to be rendered in parallel (see --workers).\nThe result is identical to rendering the image whole. Defaults to 1.", False, False, int, 1],
+                   ["workers", None, "Number of processes used to render tiles (defaults to 1).", False, False, int, 1],
+                   ["pyramid", None, "Write each map as a Deep Zoom image pyramid (\"<output>.dzi\" and tiles in \"<output>_files\") with a viewer page (\"<output>.html\"),\nrather than a single PNG. --image-size sets the full resolution size, which may be far larger than fits in memory.\nThe image is rendered as --tiles by --tiles tiles (using --workers processes), so use enough tiles for each to fit in memory.\nLabels, colourbar and contours are omitted.", False, True, None, None],
+                   ["pyramid-tile-size", None, "Size in pixels of each pyramid tile (defaults to 256px).", False, False, int, 256],
+                   ["map-cache", None, "Reuse and save the rendered pixel arrays using \"map_arrays.hdf5\", so that changing only the styling of a map\n(colour map, title, labels, contour percentiles) does not require it to be rendered again.\nArrays stored for snapshots that have since changed or been removed are deleted when new arrays are saved.", False, True, None, None],
 
                    ["colour-map", None, "Name of the colour map to use. Supports the avalible matplotlib colourmaps" + (", as well as those designed by Paul Tol (https://personal.sron.nl/~pault/).\nTo use a custom map, specify the colours in the format \"#RRGGBB\" as a semicolon seperated list (must have at least 2 values)." if TOL_AVAILABLE else ".\nTo add support for Paul Tol's colours, download the python file from https://personal.sron.nl/~pault/ and install using \"add-py tol_colors\".") + "\nDefaults to whatever is set by the stylesheet - usually \"twilight_shifted\".", False, False, ScriptWrapper.make_list_converter(";"), None],
-                   ["image-only", "o", "Hide labels and colourbar.", False, True, None, None],
+                   ["colour-limits", None, "Semicolon seperated minimum and maximum (logged, unless --no-log is set) pixel values of the colour scale.\nDefaults to the range of each map's pixel values. Set this to keep the colours of a --sequence consistent.", False, False, ScriptWrapper.make_list_converter(";", float), None],
+                   ["image-only", "o", "Hide labels and colourbar.\nUnless contours are drawn, the image is coloured and written directly rather than with a matplotlib figure,\nso each pixel of the map is exactly one pixel of the image.", False, True, None, None],
+                   ["raw-16bit", None, "Write the (normalised) pixel values as a 16 bit greyscale PNG instead of a coloured map.\nLabels, colourbar and contours are omitted.", False, True, None, None],
+                   ["raw-array", None, "Save the final pixel values as a numpy array (\".npy\") instead of an image.", False, True, None, None],
+                   ["maps", None, "JSON file containing a list of map specifications to render from a single load of the snapshot.\nEach specification is an object with any of the keys: " + ", ".join(MAP_SPEC_PARAMETERS) + "\n(hyphens may be used in place of underscores). Unspecified values are taken from the other options.", False, False, None, None],
+                   ["sequence", None, "Render the map(s) for each of a semicolon seperated list of snapshots (e.g. \"0000;0001;0002\"), such as the frames of a movie.\nThe data argument is then a template with the --template-placeholder replaced by each value.\nFrames are numbered by appending \"_<frame>\" to the output filename(s) and the next snapshot is loaded while each frame is rendered.", False, False, ScriptWrapper.make_list_converter(";"), None],
+                   ["template-placeholder", None, "Placeholder in the data template that is replaced by each --sequence value (defaults to \"{}\").", False, False, None, "{}"],
+                   ["camera-end-position", None, "Semicolon seperated x, y and z position of the camera (in Mpc) for the last frame of a --sequence.\nThe camera and region move linearly between frames. Defaults to the initial camera position.", False, False, ScriptWrapper.make_list_converter(";", float), None],
+                   ["projection-width-end", None, "Projection width (in Mpc) for the last frame of a --sequence, changing linearly between frames.\nDefaults to the initial projection width.", False, False, float, None],
+                    *SelectionStore.get_command_params(),
 
                    *BoxRegion.get_command_params(use_abbriviation = False)
                   ]
@@ -432,7 +799,7 @@ if __name__ == "__main__":
                            VERSION,
                            DATE,
                            DESCRIPTION,
-                           ["box_region.py (local file)", "console_log_printing.py (local file)", "enum", "matplotlib", "numpy", "os", "py-sphviewer", "script_wrapper.py (local file)", "swift_data_expression.py (local file)", "swiftsimio", "sys", "typing", "unyt"],
+                           ["box_region.py (local file)", "console_log_printing.py (local file)", "deep_zoom.py (local file)", "enum", "image_writer.py (local file)", "json", "map_array_store.py (local file)", "matplotlib", "numpy", "os", "particle_selection.py (local file)", "script_wrapper.py (local file)", "smoothing_length_store.py (local file)", "smoothing_lengths.py (local file)", "sph_projection.py (local file)", "swift_data_expression.py (local file)", "swiftsimio", "sys", "typing", "unyt"],
                            ["snapshot_file.hdf5 test.png --gas -r 1080 -x 10 -y 200"],
                            args_info,
                            kwargs_info)
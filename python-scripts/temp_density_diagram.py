@@ -1,11 +1,13 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "4.0.0"
-DATE = "07/07/2023"
+VERSION = "4.4.1"
+DATE = "19/10/2026"
 DESCRIPTION = "Creates a temprature vs. density diagram from SWIFT particle data."
 
 from argparse import ArgumentError
 from matplotlib import pyplot as plt
+from matplotlib.collections import PolyCollection
 from matplotlib.colors import LogNorm, ListedColormap
+from matplotlib.transforms import AffineDeltaTransform
 import numpy as np
 import os
 import swiftsimio as sw
@@ -21,28 +23,60 @@ from QuasarCode import Console, source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.filters import BoxRegion, ParticleFilter
-from contra.io import parse_swift_string as parse_string, PartType
-from contra.calculations import get_critical_gas_density as critical_gas_density
+from contra.filters import BoxRegion, ParticleFilter, SelectionStore
+from contra.io import LoadPlan, PartType
+from contra.calculations import get_critical_gas_density as critical_gas_density, HexagonalGrid, binned_statistic
 from contra.tools import format_unit_string
 
-def make_diagram(particle_data, output_file_path, colour_variable_name = "gas.masses", colour_unit = "Msun", colour_name = None, fraction_colour = False, fraction_mean_colour = False, log_colour = False, colour_weight = "gas.masses", contour_variable_name = None, contour_unit = None, box_region = BoxRegion(), min_colour_value = None, max_colour_value = None, keep_outliers = False, limit_fields: Union[None, str, List[str]] = None, limit_units: Union[None, str, List[str]] = None, limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None, exclude_limits_from_contour: bool = False, colour_map = None):
+# Number of hexagons across the diagram
+HEXAGON_GRIDSIZE = 500
+
+def draw_hexagons(ax, grid: HexagonalGrid, values: np.ndarray, vmin = None, vmax = None, cmap = None):
+    """
+    Draw precomputed values for each bin of a hexagonal grid in the same way as hexbin. Bins with NaN values are omitted.
+    """
+    shown = ~np.isnan(values)
+    collection = PolyCollection([grid.polygon], edgecolors = "face", linewidths = [plt.rcParams["patch.linewidth"]],
+                                offsets = grid.centres[shown], offset_transform = AffineDeltaTransform(ax.transData), cmap = cmap)
+    collection.set_array(values[shown])
+    collection.set_clim(vmin, vmax)
+    x_min, x_max, y_min, y_max = grid.extent
+    ax.update_datalim(((x_min, y_min), (x_max, y_max)))
+    ax.autoscale_view(tight = True)
+    ax.add_collection(collection, autolim = False)
+    return collection
+
+def make_diagram(particle_data, output_file_path, colour_variable_name = "gas.masses", colour_unit = "Msun", colour_name = None, fraction_colour = False, fraction_mean_colour = False, log_colour = False, colour_weight = "gas.masses", contour_variable_name = None, contour_unit = None, box_region = BoxRegion(), min_colour_value = None, max_colour_value = None, keep_outliers = False, limit_fields: Union[None, str, List[str]] = None, limit_units: Union[None, str, List[str]] = None, limits_min: Union[None, float, List[float]] = None, limits_max: Union[None, float, List[float]] = None, exclude_limits_from_contour: bool = False, colour_map = None, selection: Union[str, None] = None):
     Console.print_debug(f"make_diagram arguments: {particle_data} {output_file_path} {colour_variable_name} {contour_variable_name} {box_region.x_min} {box_region.x_max} {box_region.y_min} {box_region.y_max} {box_region.z_min} {box_region.z_max} {min_colour_value} {max_colour_value} {keep_outliers} {limit_fields} {limit_units} {limits_min} {limits_max} {colour_map}")
     
-    coords = np.array(particle_data.gas.coordinates)
-    box_region.complete_bounds_from_coords(coords)
-    Console.print_verbose_info(f"Final bounds: {box_region.x_min}-{box_region.x_max}, {box_region.y_min}-{box_region.y_max}, {box_region.z_min}-{box_region.z_max}")
-    spatial_filter = box_region.make_array_filter(coords)
+    # Use the region as specified (before any bounds are completed from the data) to identify the selection
+    region_definition = box_region.bounds
 
-    particle_filter = ParticleFilter(particle_data, limit_fields, limit_units, limits_min, limits_max) if ParticleFilter.check_limits_present(limit_fields) else ParticleFilter.passthrough_filter(particle_data, PartType.gas)
-    particle_filter.update(spatial_filter)
+    load_plan = LoadPlan(particle_data, PartType.gas)
+
+    spatial_selection = None
+    def make_spatial_selection():
+        box_region.complete_bounds_from_box_size(particle_data.metadata.boxsize)
+        Console.print_verbose_info(f"Final bounds: {box_region.x_min}-{box_region.x_max}, {box_region.y_min}-{box_region.y_max}, {box_region.z_min}-{box_region.z_max}")
+        return box_region.make_cell_selection(particle_data, PartType.gas)
+    if exclude_limits_from_contour:
+        spatial_selection = make_spatial_selection()
+
+    def create_selection():
+        region_selection = spatial_selection if spatial_selection is not None else make_spatial_selection()
+        if ParticleFilter.check_limits_present(limit_fields):
+            return ParticleFilter(particle_data, limit_fields, limit_units, limits_min, limits_max, initial_selection = region_selection).selection
+        return region_selection
+
+    selection_definition = { "index_space": SelectionStore.SNAPSHOT_INDEX_SPACE, "part_type": str(PartType.gas), "region": region_definition, "limit_fields": limit_fields, "limit_units": limit_units, "limits_min": limits_min, "limits_max": limits_max }
+    particle_filter = ParticleFilter.from_selection(SelectionStore().get_or_create(selection, particle_data, selection_definition, create_selection, int(particle_data.metadata.n_gas)))
 
     colour_weights = None
     colour_filter = None
     divide_agg_colour = fraction_colour or fraction_mean_colour
     colour_field_divisor_value = None
     if colour_variable_name is not None:
-        colour_weights = parse_string(colour_variable_name, particle_data)[particle_filter.numpy_filter].to(colour_unit)
+        colour_weights = load_plan.read_field(colour_variable_name, colour_unit, particle_filter.selection)
 
         if keep_outliers:
             if min_colour_value is not None:
@@ -62,34 +96,33 @@ def make_diagram(particle_data, output_file_path, colour_variable_name = "gas.ma
 
     particle_filter.update(colour_filter)
 
-    Console.print_verbose_info(f"{len(particle_filter.numpy_filter)} particles selected.")
-    Console.print_debug(particle_filter.numpy_filter.sum())#TODO: WHY IS THIS WRONG?!?!?!
-    if len(particle_filter.numpy_filter) == 0:
+    Console.print_verbose_info(f"{len(particle_filter)} particles selected.")
+    if len(particle_filter) == 0:
         raise ValueError("No data left after applying filter(s)!")
 
     contour_values = None
     if contour_variable_name is not None:
         Console.print_verbose_info("Reading contour data.")
         if exclude_limits_from_contour:
-            contour_values = parse_string(contour_variable_name, particle_data)[spatial_filter].to(contour_unit)
-            x_no_manual_filters = parse_string("gas.densities", particle_data)[spatial_filter]
+            contour_values = load_plan.read_field(contour_variable_name, contour_unit, spatial_selection)
+            x_no_manual_filters = load_plan.read_field("gas.densities", selection = spatial_selection)
             x_no_manual_filters = x_no_manual_filters / critical_gas_density(particle_data, x_no_manual_filters.units)
             x_no_manual_filters = np.log10(np.array(x_no_manual_filters))
-            t_no_manual_filters = np.log10(particle_data.gas.temperatures[spatial_filter].to("K"))
+            t_no_manual_filters = np.log10(load_plan.read_field("gas.temperatures", "K", spatial_selection))
         else:
-            contour_values = parse_string(contour_variable_name, particle_data)[particle_filter.numpy_filter].to(contour_unit)
+            contour_values = load_plan.read_field(contour_variable_name, contour_unit, particle_filter.selection)
 
     Console.print_verbose_info("Reading in data.")
-    x = parse_string("gas.densities", particle_data)[particle_filter.numpy_filter]
+    x = load_plan.read_field("gas.densities", selection = particle_filter.selection)
     x = x / critical_gas_density(particle_data, x.units)
     #x = x / unyt_quantity.from_astropy(particle_data.metadata.cosmology.Ob(particle_data.metadata.z) * particle_data.metadata.cosmology.critical_density(particle_data.metadata.z)).to(x.units)
     #x = x / critical_gas_density(particle_data, x.units)
     #x = np.log10(x / np.mean(np.array(x)))
     #x = np.log10(np.array(x) / np.mean(np.array(x)))
     x = np.log10(np.array(x))
-    t = np.log10(particle_data.gas.temperatures[particle_filter.numpy_filter].to("K"))
+    t = np.log10(load_plan.read_field("gas.temperatures", "K", particle_filter.selection))
     if colour_variable_name is not None:
-        w = parse_string(colour_weight, particle_data)[particle_filter.numpy_filter]
+        w = load_plan.read_field(colour_weight, selection = particle_filter.selection)
 
     Console.print_verbose_info("Making plot.")
     stylesheet_directory = os.path.join(__file__.rsplit(os.path.sep, 1)[0], "..", "stylesheets")
@@ -98,24 +131,18 @@ def make_diagram(particle_data, output_file_path, colour_variable_name = "gas.ma
     fig = plt.figure()
     ax = fig.gca()
     
-    kwargs = {}
-    if colour_variable_name is not None:
-        def colour_reduction(indices):
-            filtered_w = np.take(w, indices, 0)
-            c = np.sum(np.take(colour_weights, indices, 0) * filtered_w) / np.sum(filtered_w)
-            if divide_agg_colour: c = c / colour_field_divisor_value
-            if log_colour: c = np.log10(c)
-            return c
-        kwargs["reduce_C_function"] = colour_reduction
-        kwargs["C"] = np.linspace(0, colour_weights.shape[0] - 1, colour_weights.shape[0], dtype = int)
-
-    throwaway_fig = plt.figure()
-    throwaway_ax = throwaway_fig.gca()
-    raw_hex_out = throwaway_ax.hexbin(x, t, gridsize = 500, **kwargs)
+    # Bin the particles once and calculate the value of every hexagon together
     Console.print_debug(x)
     Console.print_debug(t)
-    colour_percentiles = np.percentile(np.array(raw_hex_out.get_array()), [5, 95])
-    plt.close(throwaway_fig)
+    hexagon_grid = HexagonalGrid.from_data(x, np.array(t), HEXAGON_GRIDSIZE)
+    hexagon_indices = hexagon_grid.bin_indices(x, np.array(t))
+    if colour_variable_name is not None:
+        # Weighted mean of the colour values in each hexagon
+        hexagon_values = binned_statistic(hexagon_indices, hexagon_grid.n_bins, "mean", np.array(colour_weights), np.array(w),
+                                          divisor = colour_field_divisor_value if divide_agg_colour else None, log = log_colour)
+    else:
+        hexagon_values = binned_statistic(hexagon_indices, hexagon_grid.n_bins, "count")
+    colour_percentiles = np.percentile(hexagon_values[~np.isnan(hexagon_values)], [5, 95])
 
     # Handle colour map
     if colour_map is None:
@@ -129,7 +156,7 @@ def make_diagram(particle_data, output_file_path, colour_variable_name = "gas.ma
                                             'rainbow_PuRd', 'rainbow_PuBr', 'rainbow_WhRd', 'rainbow_WhBr', 'rainbow_discrete')):
         Console.print_warning(f"Paul Tol's colours are not avalible. This is likley required for colourmap: {colour_map} and this process may fail as a result!\nSee --help for instalation instructions.")
 
-    hex_out = ax.hexbin(x, t, gridsize = 500, vmin = colour_percentiles[0], vmax = colour_percentiles[1], cmap = (tol_colors.tol_cmap(colour_map[0]) if len(colour_map) == 1 else tol_colors.LinearSegmentedColormap.from_list("custom-map", colour_map)) if TOL_AVAILABLE and (len(colour_map) > 1 or colour_map[0] in tol_colors.tol_cmap()) else colour_map[0], **kwargs)
+    hex_out = draw_hexagons(ax, hexagon_grid, hexagon_values, vmin = colour_percentiles[0], vmax = colour_percentiles[1], cmap = (tol_colors.tol_cmap(colour_map[0]) if len(colour_map) == 1 else tol_colors.LinearSegmentedColormap.from_list("custom-map", colour_map)) if TOL_AVAILABLE and (len(colour_map) > 1 or colour_map[0] in tol_colors.tol_cmap()) else colour_map[0])
 
     ax.set_xlabel("${\\rm log_{10}}$ $\\rho$/<$\\rho$>")
     ax.set_ylabel("${\\rm log_{10}}$ $T$ (${\\rm K}$)")
@@ -186,7 +213,7 @@ def make_diagram(particle_data, output_file_path, colour_variable_name = "gas.ma
     
 
 def __main(data, output_file, colour, colour_unit, colour_name, fraction_colour, fraction_mean_colour, log_colour, colour_weight,
-           contour, contour_unit, colour_min, colour_max, keep_outliers, limit_fields, limit_units, limits_min, limits_max, exclude_limits_from_contour, colour_map, **kwargs):
+           contour, contour_unit, colour_min, colour_max, keep_outliers, limit_fields, limit_units, limits_min, limits_max, exclude_limits_from_contour, colour_map, selection, **kwargs):
     box_region_object = BoxRegion(**BoxRegion.filter_command_params(**kwargs))
 
     Console.print_debug("Paramiters:\ndata: {}\noutput_file: {}\ncolour: {}\ncolour_unit: {}\ncolour_name: {}\nfraction_colour: {}\nfraction_mean_colour: {}\nlog_colour: {}\ncolour_weight: {}\ncontour: {}\ncontour_unit: {}\ncentre_x_position: {}\ncentre_y_position: {}\ncentre_z_position: {}\nside_length: {}\nx_min: {}\nx_max: {}\ny_min: {}\ny_max: {}\nz_min: {}\nz_max: {}\ncolour_min: {}\ncolour_max: {}\nkeep_outliers: {}".format(
@@ -224,6 +251,8 @@ def __main(data, output_file, colour, colour_unit, colour_name, fraction_colour,
 
     if colour_map is not None: kwargs["colour_map"] = colour_map
 
+    if selection is not None: kwargs["selection"] = selection
+
     make_diagram(particle_data, output_file, box_region = box_region_object, **kwargs)
 
 if __name__ == "__main__":
@@ -260,7 +289,8 @@ if __name__ == "__main__":
                    ["exclude-limits-from-contour", None, "Specified limits should NOT apply to the contoured data.",
                                                                                     False, True, None, None],
                    ["colour-map",           None, "Name of the colour map to use. Supports the avalible matplotlib colourmaps" + (", as well as those designed by Paul Tol (https://personal.sron.nl/~pault/).\nTo use a custom map, specify the colours in the format \"#RRGGBB\" as a semicolon seperated list (must have at least 2 values)." if TOL_AVAILABLE else ".\nTo add support for Paul Tol's colours, download the python file from https://personal.sron.nl/~pault/ and install using \"add-py tol_colors\".") + "\nDefaults to whatever is set by the stylesheet - usually \"viridis\".",
-                                                                                    False, False, ScriptWrapper.make_list_converter(";"), None]
+                                                                                    False, False, ScriptWrapper.make_list_converter(";"), None],
+                    *SelectionStore.get_command_params()
                   ]
     
     script = ScriptWrapper("temp_density_diagram.py",
@@ -268,7 +298,7 @@ if __name__ == "__main__":
                            VERSION,
                            DATE,
                            DESCRIPTION,
-                           ["argparse", "BoxRegion.py  (local file)", "console_log_printing.py (local file)", "get_gas_crit_density.py (local file)", "matplotlib", "numpy", "os", "scipy", "swift_data_expression.py (local file)", "swiftsimio", "script_wrapper.py (local file)", "sys", "typing", "unyt"],
+                           ["argparse", "binned_statistics.py (local file)", "BoxRegion.py  (local file)", "console_log_printing.py (local file)", "get_gas_crit_density.py (local file)", "matplotlib", "numpy", "os", "scipy", "swift_data_expression.py (local file)", "swiftsimio", "script_wrapper.py (local file)", "sys", "typing", "unyt"],
                            ["--pressure --data ~/datafile.hdf5 -o result.png", "--density --data ~/datafile.hdf5 -o result.png --node gas --colour mean_metal_weighted_redshifts", "--pressure --data ~/datafile.hdf5 -o result.png -x 5 -y 253 -w 20", "--density --data ~/datafile.hdf5 -o result.png --z-min 10 --z-max 20"],
                            args_info,
                            kwargs_info)
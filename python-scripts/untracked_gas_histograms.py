@@ -1,33 +1,50 @@
 AUTHOR = "Christopher Rowe"
-VERSION = "1.0.0"
-DATE = "12/07/2023"
+VERSION = "1.1.0"
+DATE = "19/10/2026"
 DESCRIPTION = "Plots the cumulitive sum of metal masses for particles in assending order of last halo mass."
 
-import swiftsimio as sw
+from matplotlib import pyplot as plt
 import numpy as np
 import swiftsimio as sw
-from matplotlib import pyplot as plt
 
 from QuasarCode import source_file_relitive_add_to_path
 from QuasarCode.Tools import ScriptWrapper
 
 source_file_relitive_add_to_path(__file__, "..")
-from contra.calculations import get_critical_gas_density as critical_gas_density
+from contra.calculations import get_critical_gas_density as critical_gas_density, Histogram, update_range
+from contra.io import LoadPlan, PartType
 
 def __main(data: str, only_metals: bool):
     n_bins = 40
     filename_base = "untracked_gas_distribution" if not only_metals else "untracked_metal_gas_distribution"
 
-    # Read data
-    snap = sw.load(data)
-    data_filter = (snap.gas.last_halo_ids == -1) if not only_metals else ((snap.gas.last_halo_ids == -1) & (snap.gas.mean_metal_weighted_redshifts > 0))
-    metalicities = np.log10(snap.gas.metal_mass_fractions[data_filter] + 1)
-    densities = np.log10(snap.gas.densities.to("Msun/Mpc**3") / critical_gas_density(snap, "Msun/Mpc**3"))[data_filter]
-    zZ = np.log10(snap.gas.mean_metal_weighted_redshifts[data_filter] + 1)
-    temperatures = np.log10(snap.gas.temperatures[data_filter])
+    # Read data a chunk of particles at a time
+    load_plan = LoadPlan(sw.load(data), PartType.gas)
+    critical_density = critical_gas_density(load_plan.particle_data, "Msun/Mpc**3")
+    quantities = ("metalicity", "density", "redshift", "temperature")
+
+    def read_chunks():
+        for last_halo_ids, redshifts, metal_mass_fractions, densities, temperatures in load_plan.read_chunks(["last_halo_ids", "mean_metal_weighted_redshifts", "metal_mass_fractions", "densities", "temperatures"], [None, None, None, "Msun/Mpc**3", None], part_type_relative = True):
+            data_filter = np.array(last_halo_ids == -1) if not only_metals else np.array((last_halo_ids == -1) & (redshifts > 0))
+            # Infinite values (e.g. log10 of 1 + z_Z for particles with no metals) are excluded from the histograms
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                yield (np.log10(np.array(metal_mass_fractions[data_filter]) + 1),
+                       np.log10(np.array(densities[data_filter] / critical_density)),
+                       np.log10(np.array(redshifts[data_filter]) + 1),
+                       np.log10(np.array(temperatures[data_filter])))
+
+    # The bins span the range of each quantity, which must be found first
+    value_ranges = [None] * len(quantities)
+    for chunk_values in read_chunks():
+        value_ranges = [update_range(value_range, values) for value_range, values in zip(value_ranges, chunk_values)]
+    histograms = [Histogram.from_range(n_bins, value_range if value_range is not None else (0.0, 1.0)) for value_range in value_ranges]
+    for chunk_values in read_chunks():
+        for histogram, values in zip(histograms, chunk_values):
+            histogram.add(values)
+    histograms = dict(zip(quantities, histograms))
 
-    hist, bin_edges = np.histogram(metalicities, n_bins)
-    bin_centres = (bin_edges[1:] + bin_edges[:-1]) / 2
+    hist = histograms["metalicity"].counts
+    bin_centres = histograms["metalicity"].centres[0]
     plt.plot(bin_centres, hist)
     plt.xlabel("$\\rm log_{10}$ 1 + Metalicity (metal mass fraction)")
     plt.ylabel("N")
@@ -35,8 +52,8 @@ def __main(data: str, only_metals: bool):
     plt.savefig(f"{filename_base}_metalicity.png")
     plt.clf()
 
-    hist, bin_edges = np.histogram(densities, n_bins)
-    bin_centres = (bin_edges[1:] + bin_edges[:-1]) / 2
+    hist = histograms["density"].counts
+    bin_centres = histograms["density"].centres[0]
     plt.plot(bin_centres, hist)
     plt.xlabel("$\\rm log_{10}$ $\\rho$ / <$\\rm \\rho$>")
     plt.ylabel("N")
@@ -44,8 +61,8 @@ def __main(data: str, only_metals: bool):
     plt.savefig(f"{filename_base}_density.png")
     plt.clf()
 
-    hist, bin_edges = np.histogram(zZ[zZ != -np.inf], n_bins)
-    bin_centres = (bin_edges[1:] + bin_edges[:-1]) / 2
+    hist = histograms["redshift"].counts
+    bin_centres = histograms["redshift"].centres[0]
     plt.plot(bin_centres, hist)
     plt.xlabel("$\\rm log_{10}$ 1 + $z_{\\rm Z}$")
     plt.ylabel("N")
@@ -53,8 +70,8 @@ def __main(data: str, only_metals: bool):
     plt.savefig(f"{filename_base}_redshift.png")
     plt.clf()
 
-    hist, bin_edges = np.histogram(temperatures, n_bins)
-    bin_centres = (bin_edges[1:] + bin_edges[:-1]) / 2
+    hist = histograms["temperature"].counts
+    bin_centres = histograms["temperature"].centres[0]
     plt.plot(bin_centres, hist)
     plt.xlabel("$\\rm log_{10}$ Temperature (K)")
     plt.ylabel("N")
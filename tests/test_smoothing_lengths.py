@@ -0,0 +1,19 @@
+import numpy as np
+
+from contra.calculations import generate_smoothing_lengths, wrap_positions
+
+def test_wrap_positions_excludes_box_size():
+    box_size = np.array([10.0, 20.0, 30.0])
+    wrapped = wrap_positions(np.array([[-1e-15, -1e-17, 30.0], [10.5, -0.5, 12.0]]), box_size)
+    assert np.all(wrapped >= 0)
+    assert np.all(wrapped < box_size)
+    np.testing.assert_allclose(wrapped[1], [0.5, 19.5, 12.0])
+
+def test_tiny_negative_coordinates():
+    rng = np.random.default_rng(0)
+    coordinates = rng.uniform(0, 10, (1000, 3))
+    coordinates[0, 0] = -1e-17
+    smoothing_lengths = generate_smoothing_lengths(coordinates, 10.0, 1.8)
+    shifted_smoothing_lengths = generate_smoothing_lengths(np.where(coordinates < 0, 0.0, coordinates), 10.0, 1.8)
+    assert np.all(np.isfinite(smoothing_lengths))
+    np.testing.assert_allclose(smoothing_lengths, shifted_smoothing_lengths, rtol = 1e-6)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from contra.algorithms import SPHProjection
+
+def _cubic_spline_2d(r: np.ndarray, h: float) -> np.ndarray:
+    """
+    Normalised 2D cubic spline kernel with compact support at r = h.
+    """
+    q = r / h
+    result = np.where(q < 0.5, 1 - 6 * q**2 + 6 * q**3, 2 * np.clip(1 - q, 0, None)**3)
+    return result * 40 / (7 * np.pi * h**2)
+
+@pytest.fixture
+def particles():
+    rng = np.random.default_rng(0)
+    n_particles = 2000
+    positions = rng.uniform(0.3, 0.7, (n_particles, 2))
+    smoothing_lengths = 10**rng.uniform(-3.5, -0.8, n_particles)
+    masses = rng.uniform(1, 2, n_particles)
+    return positions, smoothing_lengths, masses
+
+@pytest.mark.parametrize("max_footprint_radius", [None, 32, 4])
+def test_total_mass_conserved(particles, max_footprint_radius):
+    positions, smoothing_lengths, masses = particles
+    # Footprints all lie within the image
+    smoothing_lengths = np.minimum(smoothing_lengths, 0.25)
+    projection = SPHProjection(positions, smoothing_lengths, (0, 1), (0, 1), 200, max_footprint_radius = max_footprint_radius)
+    image = projection.render(masses)
+    assert image.sum() * projection.pixel_area == pytest.approx(masses.sum(), rel = 1e-12)
+
+def test_single_particle_matches_kernel():
+    resolution = 101
+    smoothing_length = 0.3
+    projection = SPHProjection(np.array([[0.5, 0.5]]), np.array([smoothing_length]), (0, 1), (0, 1), resolution, max_footprint_radius = None)
+    image = projection.render(np.array([2.0]))
+    pixel_centres = (np.arange(resolution) + 0.5) / resolution
+    radii = np.sqrt((pixel_centres[None, :] - 0.5)**2 + (pixel_centres[:, None] - 0.5)**2)
+    np.testing.assert_allclose(image, 2.0 * _cubic_spline_2d(radii, smoothing_length), rtol = 1e-3, atol = 1e-3 * image.max())
+
+def _reference_image(positions: np.ndarray, smoothing_lengths: np.ndarray, masses: np.ndarray, resolution: int) -> np.ndarray:
+    """
+    Deposit each particle separately, normalising its kernel over the pixel centres. Footprints must lie within the unit square.
+    """
+    pixel_centres = (np.arange(resolution) + 0.5) / resolution
+    image = np.zeros((resolution, resolution))
+    for (x, y), smoothing_length, mass in zip(positions, smoothing_lengths, masses):
+        kernel = _cubic_spline_2d(np.sqrt((pixel_centres[None, :] - x)**2 + (pixel_centres[:, None] - y)**2), smoothing_length)
+        image += mass * kernel / kernel.sum()
+    return image * resolution**2
+
+@pytest.mark.parametrize("n_particles, smoothing_length_range", [(1, (0.4, 0.4)), (200, (0.01, 0.3))])
+def test_large_footprints_rendered_exactly(n_particles, smoothing_length_range):
+    rng = np.random.default_rng(1)
+    resolution = 200
+    smoothing_lengths = rng.uniform(*smoothing_length_range, n_particles)
+    positions = rng.uniform(smoothing_lengths[:, None], 1 - smoothing_lengths[:, None], (n_particles, 2))
+    masses = rng.uniform(1, 2, n_particles)
+    image = SPHProjection(positions, smoothing_lengths, (0, 1), (0, 1), resolution).render(masses)
+    reference = _reference_image(positions, smoothing_lengths, masses, resolution)
+    covered = reference > 0
+    np.testing.assert_allclose(image[covered], reference[covered], rtol = 1e-8)
+    assert np.all(image[~covered] == 0)
+
+@pytest.mark.parametrize("resolution", [200, (201, 157)])
+def test_tiles_match_whole_image(particles, resolution):
+    positions, smoothing_lengths, masses = particles
+    projection = SPHProjection(positions, smoothing_lengths, (0, 1), (0, 1), resolution, max_footprint_radius = 8)
+    whole = projection.render_channels([masses, np.ones_like(masses)])
+    tiled = projection.render_channels([masses, np.ones_like(masses)], tiles = 5)
+    for whole_image, tiled_image in zip(whole, tiled):
+        assert np.array_equal(whole_image, tiled_image)